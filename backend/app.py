@@ -1,21 +1,46 @@
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request
 from flask_cors import CORS
 import requests
+import httpx
 import os
 from dotenv import load_dotenv
 import json
 import re
+import time
+import queue
+import threading
+import base64
+from urllib.parse import quote, urlencode
+from concurrent.futures import ThreadPoolExecutor
 import phonenumbers
-from phonenumbers import geocoder, carrier
 import logging
 from datetime import datetime
 import asyncio
 from llm_service import llm_service
+from org_crawler import OrgCrawler, CrawlStats
+from directory_index import DirectoryIndex
+from geocode_cache import GeocodeCache
+from location_store import LocationStore
+from photo_cache import PhotoCache
+from hierarchy_cache import HierarchyCache
+from team_context_store import TeamContextStore
+from spatial_index import SpatialIndexCache
+from cluster_index import ClusterIndexCache
+from offline_locator import OfflineLocator
+from gazetteer import Gazetteer, LocalGeocoder, load_office_locations
+from wire_format import FORMATS, MSGPACK_MIMETYPE, COMPRESSIBLE_MIMETYPES, compress, data_etag, encode_msgpack, msgpack_available, parse_fields, project_record, to_columnar
+from team_tools import TeamQueryTools, TeamToolsCache
+from graph_transport import AsyncGraphTransport, GraphTransport, RateLimiter, TokenProvider, THROTTLE_STATUSES, create_session, parse_retry_after
+from async_runtime import AsyncRuntime
+from photo_sprites import PhotoSpriteBuilder, graph_photo_size, resize_photo
+from telemetry import metrics, start_request_timings, current_request_timings, timed_phase
+from collections import Counter
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+app.json.compact = True
 
 # Configure CORS - Let Azure App Service handle CORS configuration
 # For local development, allow all origins
@@ -56,70 +81,184 @@ def after_request(response):
         response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     return response
 
+@app.before_request
+def start_timings():
+    start_request_timings()
+
+@app.after_request
+def record_request_metrics(response):
+    """Server-Timing breakdown (crawl, geocode, llm, total) and request metrics for every response
+    
+    Streamed responses report only the time spent before their first byte.
+    """
+    timings = current_request_timings()
+    if timings is None or request.method == 'OPTIONS':
+        return response
+    endpoint = request.url_rule.rule if request.url_rule else 'unmatched'
+    response.headers['Server-Timing'] = timings.server_timing()
+    # Lets the frontend read the breakdown through the Resource Timing API across origins
+    response.headers['Timing-Allow-Origin'] = '*'
+    metrics.increment('whereat_http_requests_total',
+                      {'endpoint': endpoint, 'method': request.method, 'status': str(response.status_code)})
+    metrics.observe('whereat_http_request_duration_seconds', time.perf_counter() - timings.started,
+                    {'endpoint': endpoint, 'method': request.method})
+    for phase, seconds in timings.phases.items():
+        metrics.observe('whereat_request_phase_duration_seconds', seconds, {'endpoint': endpoint, 'phase': phase})
+    return response
+
+# Compress JSON/MessagePack responses of at least this many bytes (0 disables compression)
+COMPRESS_MIN_BYTES = int(os.getenv('COMPRESS_MIN_BYTES', '1024'))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', '6'))
+
+@app.after_request
+def compress_response(response):
+    """gzip or brotli encode buffered API responses when the client accepts it"""
+    if (not COMPRESS_MIN_BYTES or response.status_code != 200 or response.direct_passthrough
+            or response.is_streamed or response.mimetype not in COMPRESSIBLE_MIMETYPES
+            or 'Content-Encoding' in response.headers):
+        return response
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_BYTES:
+        return response
+    compressed, encoding = compress(body, request.accept_encodings, COMPRESS_LEVEL)
+    response.vary.add('Accept-Encoding')
+    if encoding:
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+    return response
+
 # Azure AD configuration
 AZURE_CLIENT_ID = os.getenv('AZURE_CLIENT_ID')
 AZURE_CLIENT_SECRET = os.getenv('AZURE_CLIENT_SECRET')
 AZURE_TENANT_ID = os.getenv('AZURE_TENANT_ID')
 AZURE_MAPS_API_KEY = os.getenv('AZURE_MAPS_API_KEY')
 
+# Endpoint base URLs (override to point at a local stand-in such as mock_graph_server.py)
+AZURE_LOGIN_BASE_URL = os.getenv('AZURE_LOGIN_BASE_URL', 'https://login.microsoftonline.com').rstrip('/')
+GRAPH_API_BASE_URL = os.getenv('GRAPH_API_BASE_URL', 'https://graph.microsoft.com/v1.0').rstrip('/')
+
+# Graph accepts at most 20 sub-requests per JSON $batch call
+GRAPH_BATCH_SIZE = min(int(os.getenv('GRAPH_BATCH_SIZE', '20')), 20)
+
+# Maximum number of Graph requests the org crawler keeps in flight at once
+GRAPH_MAX_CONCURRENCY = int(os.getenv('GRAPH_MAX_CONCURRENCY', '8'))
+
+# Graph throttling: retries for 429/503, optional requests-per-second cap (0 = none),
+# and how many seconds before expiry the access token is refreshed
+GRAPH_MAX_RETRIES = int(os.getenv('GRAPH_MAX_RETRIES', '4'))
+GRAPH_MAX_RPS = float(os.getenv('GRAPH_MAX_RPS', '0'))
+TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', '300'))
+
+# Shared hierarchy cache: TTL in seconds and a bound on the total number of cached nodes
+HIERARCHY_CACHE_TTL = int(os.getenv('HIERARCHY_CACHE_TTL', '300'))
+HIERARCHY_CACHE_MAX_NODES = int(os.getenv('HIERARCHY_CACHE_MAX_NODES', '200000'))
+
+# In-memory directory index kept fresh with /users/delta (one copy per worker process)
+DIRECTORY_INDEX_ENABLED = os.getenv('DIRECTORY_INDEX_ENABLED', 'false').lower() == 'true'
+DIRECTORY_DELTA_INTERVAL = int(os.getenv('DIRECTORY_DELTA_INTERVAL', '300'))
+
+# Azure Maps endpoint and geocoding fan-out
+AZURE_MAPS_BASE_URL = os.getenv('AZURE_MAPS_BASE_URL', 'https://atlas.microsoft.com').rstrip('/')
+GEOCODE_BATCH_ENABLED = os.getenv('GEOCODE_BATCH_ENABLED', 'true').lower() == 'true'
+GEOCODE_MAX_CONCURRENCY = int(os.getenv('GEOCODE_MAX_CONCURRENCY', '8'))
+
+# Offline gazetteer and office-code table: place-level strings resolve locally, only street addresses reach Azure Maps
+GAZETTEER_PATH = os.getenv('GAZETTEER_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'gazetteer.bin'))
+OFFICE_LOCATIONS_PATH = os.getenv('OFFICE_LOCATIONS_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'office_locations.csv'))
+# The synchronous batch search API accepts up to 100 queries per call
+AZURE_MAPS_BATCH_SIZE = 100
+
+# Geocode cache: in-process LRU in front of a SQLite file that survives restarts
+GEOCODE_CACHE_PATH = os.getenv('GEOCODE_CACHE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'geocode_cache.sqlite3'))
+GEOCODE_CACHE_MEMORY_SIZE = int(os.getenv('GEOCODE_CACHE_MEMORY_SIZE', '4096'))
+GEOCODE_CACHE_TTL = int(os.getenv('GEOCODE_CACHE_TTL', str(30 * 24 * 3600)))
+GEOCODE_CACHE_NEGATIVE_TTL = int(os.getenv('GEOCODE_CACHE_NEGATIVE_TTL', str(24 * 3600)))
+
+# Per-user location store: resolved locations reused until the user's location fields change
+LOCATION_STORE_PATH = os.getenv('LOCATION_STORE_PATH', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'location_store.sqlite3'))
+LOCATION_STORE_TTL = int(os.getenv('LOCATION_STORE_TTL', str(7 * 24 * 3600)))
+
+# Photo cache: memory LRU capped by bytes in front of a disk directory; HTTP cache lifetimes in seconds
+PHOTO_CACHE_DIR = os.getenv('PHOTO_CACHE_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'photo_store'))
+PHOTO_CACHE_MEMORY_MB = int(os.getenv('PHOTO_CACHE_MEMORY_MB', '64'))
+PHOTO_CACHE_TTL = int(os.getenv('PHOTO_CACHE_TTL', str(7 * 24 * 3600)))
+PHOTO_CACHE_NEGATIVE_TTL = int(os.getenv('PHOTO_CACHE_NEGATIVE_TTL', str(24 * 3600)))
+PHOTO_MAX_AGE = int(os.getenv('PHOTO_MAX_AGE', str(24 * 3600)))
+PHOTO_NEGATIVE_MAX_AGE = int(os.getenv('PHOTO_NEGATIVE_MAX_AGE', '3600'))
+PHOTO_SPRITE_TTL = int(os.getenv('PHOTO_SPRITE_TTL', '3600'))
+PHOTO_SPRITE_DEFAULT_SIZE = 96
+PHOTO_SPRITE_MAX_TILES = int(os.getenv('PHOTO_SPRITE_MAX_TILES', '1024'))
+PHOTO_MIN_SIZE, PHOTO_MAX_SIZE = 16, 648
+
+# Deepest ?depth= accepted by /api/org-hierarchy and /api/org-subtree
+MAX_SUBTREE_DEPTH = 20
+
+# Server-side rosters that chat requests reference by team-context id
+TEAM_CONTEXT_TTL = int(os.getenv('TEAM_CONTEXT_TTL', '3600'))
+TEAM_CONTEXT_MAX_MEMBERS = int(os.getenv('TEAM_CONTEXT_MAX_MEMBERS', '200000'))
+
+# Spatial indexes for /api/nearby: how many rosters to keep indexed and the grid cell size in degrees
+SPATIAL_INDEX_MAX_ENTRIES = int(os.getenv('SPATIAL_INDEX_MAX_ENTRIES', '16'))
+SPATIAL_INDEX_CELL_DEGREES = float(os.getenv('SPATIAL_INDEX_CELL_DEGREES', '1.0'))
+NEARBY_DEFAULT_K, NEARBY_MAX_K = 10, 1000
+
+# Server-side map clusters: zooms past CLUSTER_MAX_ZOOM return individual pins
+CLUSTER_MAX_ZOOM = int(os.getenv('CLUSTER_MAX_ZOOM', '16'))
+CLUSTER_LEAVES_DEFAULT_LIMIT, CLUSTER_LEAVES_MAX_LIMIT = 100, 1000
+
+# Chat mode when the request doesn't say: 'prompt' (roster in the prompt) or 'tools' (function calling)
+LLM_CHAT_MODE = os.getenv('LLM_CHAT_MODE', 'prompt')
+CHAT_MODES = ('prompt', 'tools')
+
+# Streaming map data: users geocoded and emitted per chunk of a hierarchy level
+MAP_STREAM_CHUNK_SIZE = int(os.getenv('MAP_STREAM_CHUNK_SIZE', '250'))
+
+# Async I/O: a shared event loop runs OpenAI calls always, and Graph $batch / Azure Maps
+# fan-out too when ASYNC_IO_ENABLED is set; connection pool size for that loop
+ASYNC_IO_ENABLED = os.getenv('ASYNC_IO_ENABLED', 'false').lower() == 'true'
+ASYNC_MAX_CONNECTIONS = int(os.getenv('ASYNC_MAX_CONNECTIONS', '100'))
+
+USER_SELECT_FIELDS = 'id,displayName,mail,userPrincipalName,jobTitle,department,officeLocation,businessPhones,mobilePhone,streetAddress,city,state,postalCode,country,usageLocation,timeZone'
+
 class GraphAPIClient:
-    def __init__(self):
-        self.access_token = None
+    def __init__(self, batch_size=GRAPH_BATCH_SIZE, runtime=None):
+        self.batch_size = batch_size
+        self.session = create_session(GRAPH_MAX_CONCURRENCY * 2)
+        self.token_provider = TokenProvider(
+            self.session,
+            f"{AZURE_LOGIN_BASE_URL}/{AZURE_TENANT_ID}/oauth2/v2.0/token",
+            AZURE_CLIENT_ID,
+            AZURE_CLIENT_SECRET,
+            'https://graph.microsoft.com/.default',
+            TOKEN_REFRESH_MARGIN
+        )
+        self.rate_limiter = RateLimiter(GRAPH_MAX_RPS)
+        self.transport = GraphTransport(self.session, self.token_provider, self.rate_limiter, GRAPH_MAX_RETRIES)
+        # With an async runtime, $batch chunks are sent concurrently on its event loop
+        self.runtime = runtime
+        self.async_transport = None
+        if runtime:
+            self.async_transport = AsyncGraphTransport(runtime.http, self.token_provider, self.rate_limiter,
+                                                       GRAPH_MAX_RETRIES, GRAPH_MAX_CONCURRENCY)
         
     def get_access_token(self):
-        """Get access token for Microsoft Graph API"""
-        url = f"https://login.microsoftonline.com/{AZURE_TENANT_ID}/oauth2/v2.0/token"
-        
-        headers = {
-            'Content-Type': 'application/x-www-form-urlencoded'
-        }
-        
-        data = {
-            'client_id': AZURE_CLIENT_ID,
-            'client_secret': AZURE_CLIENT_SECRET,
-            'scope': 'https://graph.microsoft.com/.default',
-            'grant_type': 'client_credentials'
-        }
-        
-        try:
-            response = requests.post(url, headers=headers, data=data)
-            response.raise_for_status()
-            token_data = response.json()
-            self.access_token = token_data['access_token']
-            logger.info("Successfully obtained access token")
-            return self.access_token
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Error getting access token: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                logger.error(f"Response content: {e.response.text}")
-            return None
+        """Get access token for Microsoft Graph API (cached until shortly before it expires)"""
+        return self.token_provider.get_token()
     
     def make_graph_request(self, endpoint, params=None):
         """Make a request to Microsoft Graph API"""
-        if not self.access_token:
-            if not self.get_access_token():
-                return None
-            
         headers = {
-            'Authorization': f'Bearer {self.access_token}',
             'Content-Type': 'application/json'
         }
         
-        url = f"https://graph.microsoft.com/v1.0{endpoint}"
+        url = f"{GRAPH_API_BASE_URL}{endpoint}"
         
         try:
-            response = requests.get(url, headers=headers, params=params)
-            
-            # Handle different error cases
-            if response.status_code == 401:
-                logger.warning("Access token expired, refreshing...")
-                self.access_token = None
-                if self.get_access_token():
-                    headers['Authorization'] = f'Bearer {self.access_token}'
-                    response = requests.get(url, headers=headers, params=params)
-                else:
-                    logger.error("Failed to refresh access token")
-                    return None
+            # The transport refreshes expired tokens and waits out 429/503 responses
+            response = self.transport.request('GET', url, headers=headers, params=params)
+            if response is None:
+                logger.error("Failed to obtain access token")
+                return None
             
             if response.status_code == 403:
                 logger.error(f"Forbidden access to {endpoint}. Check app permissions and admin consent.")
@@ -140,11 +279,159 @@ class GraphAPIClient:
                 logger.error(f"Response content: {e.response.text}")
             return None
     
+    def _batch_item_result(self, endpoint, status, body):
+        """Map a $batch sub-response onto the outcome make_graph_request gives for the same status"""
+        if status == 403:
+            logger.error(f"Forbidden access to {endpoint}. Check app permissions and admin consent.")
+            logger.error(f"Response: {body}")
+            return None
+        
+        if status == 404:
+            logger.warning(f"Resource not found: {endpoint}")
+            return None
+        
+        if status >= 400:
+            logger.error(f"Error making Graph API request to {endpoint}: HTTP {status}")
+            logger.error(f"Response content: {body}")
+            return None
+        
+        return body
+    
+    def batch_graph_requests(self, sub_requests, raw=False):
+        """Send (endpoint, params) GET requests through Graph JSON $batch, up to batch_size per POST.
+        
+        Returns one result per sub-request, in order, with None wherever the
+        single-call path would have returned None. With raw=True each result is
+        a (status, body) tuple instead, with (None, None) for transport errors.
+        """
+        if self.runtime and len(sub_requests) > self.batch_size:
+            return self.runtime.run(self.batch_graph_requests_async(sub_requests, raw))
+        
+        results = []
+        for start in range(0, len(sub_requests), self.batch_size):
+            results.extend(self._send_batch(sub_requests[start:start + self.batch_size], raw))
+        return results
+    
+    async def batch_graph_requests_async(self, sub_requests, raw=False):
+        """batch_graph_requests for the async runtime: every $batch POST is in flight at once"""
+        chunks = [sub_requests[start:start + self.batch_size] for start in range(0, len(sub_requests), self.batch_size)]
+        results = []
+        for chunk_results in await asyncio.gather(*(self._send_batch_async(chunk, raw) for chunk in chunks)):
+            results.extend(chunk_results)
+        return results
+    
+    @staticmethod
+    def _batch_body(sub_requests, pending):
+        batch_body = {'requests': []}
+        for index in pending:
+            endpoint, params = sub_requests[index]
+            if params:
+                endpoint = f"{endpoint}?{urlencode(params, safe='$,()')}"
+            batch_body['requests'].append({'id': str(index), 'method': 'GET', 'url': endpoint})
+        return batch_body
+    
+    def _collect_batch_responses(self, sub_requests, pending, responses, results, raw, retry_throttled):
+        """Fill results from one $batch response and return (throttled indexes, longest Retry-After)"""
+        throttled = []
+        retry_after = None
+        for index in pending:
+            endpoint = sub_requests[index][0]
+            item = responses.get(str(index))
+            if item is None:
+                logger.error(f"Missing $batch response for {endpoint}")
+                continue
+            status = item.get('status', 500)
+            if status in THROTTLE_STATUSES and retry_throttled:
+                throttled.append(index)
+                item_retry_after = parse_retry_after((item.get('headers') or {}).get('Retry-After'))
+                if item_retry_after is not None:
+                    retry_after = max(retry_after or 0, item_retry_after)
+                continue
+            if raw:
+                results[index] = (status, item.get('body'))
+            else:
+                results[index] = self._batch_item_result(endpoint, status, item.get('body'))
+        return throttled, retry_after
+    
+    def _send_batch(self, sub_requests, raw=False):
+        """POST a single $batch of at most 20 sub-requests.
+        
+        Sub-requests throttled with 429 are re-sent, after the shared rate
+        limiter has waited out their Retry-After, up to GRAPH_MAX_RETRIES times.
+        """
+        if not sub_requests:
+            return []
+        
+        failed = (None, None) if raw else None
+        results = [failed] * len(sub_requests)
+        pending = list(range(len(sub_requests)))
+        url = f"{GRAPH_API_BASE_URL}/$batch"
+        
+        for attempt in range(GRAPH_MAX_RETRIES + 1):
+            try:
+                response = self.transport.request('POST', url, headers={'Content-Type': 'application/json'},
+                                                  json=self._batch_body(sub_requests, pending))
+                if response is None:
+                    logger.error("Failed to obtain access token")
+                    return results
+                
+                response.raise_for_status()
+                responses = {item['id']: item for item in response.json().get('responses', [])}
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error making Graph API $batch request: {e}")
+                if hasattr(e, 'response') and e.response is not None:
+                    logger.error(f"Response status: {e.response.status_code}")
+                    logger.error(f"Response content: {e.response.text}")
+                return results
+            
+            pending, retry_after = self._collect_batch_responses(sub_requests, pending, responses, results, raw,
+                                                                 attempt < GRAPH_MAX_RETRIES)
+            if not pending:
+                break
+            self.rate_limiter.throttled(retry_after)
+        
+        return results
+    
+    async def _send_batch_async(self, sub_requests, raw=False):
+        """_send_batch over the async transport"""
+        if not sub_requests:
+            return []
+        
+        failed = (None, None) if raw else None
+        results = [failed] * len(sub_requests)
+        pending = list(range(len(sub_requests)))
+        url = f"{GRAPH_API_BASE_URL}/$batch"
+        
+        for attempt in range(GRAPH_MAX_RETRIES + 1):
+            try:
+                response = await self.async_transport.request('POST', url, headers={'Content-Type': 'application/json'},
+                                                              json=self._batch_body(sub_requests, pending))
+                if response is None:
+                    logger.error("Failed to obtain access token")
+                    return results
+                
+                response.raise_for_status()
+                responses = {item['id']: item for item in response.json().get('responses', [])}
+            except httpx.HTTPError as e:
+                logger.error(f"Error making Graph API $batch request: {e}")
+                if isinstance(e, httpx.HTTPStatusError):
+                    logger.error(f"Response status: {e.response.status_code}")
+                    logger.error(f"Response content: {e.response.text}")
+                return results
+            
+            pending, retry_after = self._collect_batch_responses(sub_requests, pending, responses, results, raw,
+                                                                 attempt < GRAPH_MAX_RETRIES)
+            if not pending:
+                break
+            self.rate_limiter.throttled(retry_after)
+        
+        return results
+    
     def get_user_by_email(self, email):
         """Get user details by email"""
         endpoint = f"/users/{email}"
         params = {
-            '$select': 'id,displayName,mail,userPrincipalName,jobTitle,department,officeLocation,businessPhones,mobilePhone,streetAddress,city,state,postalCode,country,usageLocation,timeZone'
+            '$select': USER_SELECT_FIELDS
         }
         return self.make_graph_request(endpoint, params)
     
@@ -160,76 +447,287 @@ class GraphAPIClient:
         """Get user's direct reports"""
         endpoint = f"/users/{user_id}/directReports"
         params = {
-            '$select': 'id,displayName,mail,userPrincipalName,jobTitle,department,officeLocation,businessPhones,mobilePhone,streetAddress,city,state,postalCode,country,usageLocation,timeZone'
+            '$select': USER_SELECT_FIELDS
         }
         return self.make_graph_request(endpoint, params)
     
-    def get_user_photo(self, user_id):
-        """Get user's profile photo"""
-        endpoint = f"/users/{user_id}/photo/$value"
-        
-        if not self.access_token:
-            self.get_access_token()
-            
-        headers = {
-            'Authorization': f'Bearer {self.access_token}'
+    def get_users_by_email(self, emails):
+        """Get user details for many emails via $batch"""
+        params = {
+            '$select': USER_SELECT_FIELDS
+        }
+        return self.batch_graph_requests([(f"/users/{email}", params) for email in emails])
+    
+    def get_direct_reports_for_users(self, user_ids):
+        """Get direct reports for many users via $batch"""
+        params = {
+            '$select': USER_SELECT_FIELDS
         }
+        return self.batch_graph_requests([(f"/users/{user_id}/directReports", params) for user_id in user_ids])
+    
+    def _relative_endpoint(self, link):
+        """Turn an absolute @odata.nextLink/deltaLink into an endpoint relative to the Graph base URL"""
+        if link.startswith(GRAPH_API_BASE_URL):
+            return link[len(GRAPH_API_BASE_URL):]
+        return link
+    
+    def follow_next_link(self, link):
+        """Fetch the page behind an @odata.nextLink or @odata.deltaLink"""
+        return self.make_graph_request(self._relative_endpoint(link))
+    
+    def get_next_pages(self, next_links):
+        """Follow @odata.nextLink URLs for many collections via $batch"""
+        return self.batch_graph_requests([(self._relative_endpoint(link), None) for link in next_links])
+    
+    def get_user_photo(self, user_id, size=None):
+        """Get user's profile photo as (content, status_code); status_code is None on transport errors
+        
+        size selects one of Graph's pre-rendered square sizes (48, 64, 96, ... 648).
+        """
+        endpoint = f"/users/{user_id}/photo/$value"
+        if size:
+            endpoint = f"/users/{user_id}/photos/{size}x{size}/$value"
         
-        url = f"https://graph.microsoft.com/v1.0{endpoint}"
+        url = f"{GRAPH_API_BASE_URL}{endpoint}"
         
         try:
-            response = requests.get(url, headers=headers)
+            response = self.transport.request('GET', url)
+            if response is None:
+                return None, None
             if response.status_code == 200:
-                return response.content
-            return None
+                return response.content, 200
+            return None, response.status_code
         except requests.exceptions.RequestException as e:
             logger.error(f"Error getting user photo: {e}")
-            return None
+            return None, None
+
+    def get_user_photos(self, user_ids, size):
+        """Get many users' photos at one Graph size via $batch, as (content, status_code) per user"""
+        results = self.batch_graph_requests([(f"/users/{user_id}/photos/{size}x{size}/$value", None) for user_id in user_ids], raw=True)
+        photos = []
+        for status, body in results:
+            if status == 200 and isinstance(body, str):
+                # Binary sub-responses come back base64-encoded in the $batch body
+                photos.append((base64.b64decode(body), status))
+            else:
+                photos.append((None, status))
+        return photos
 
 class LocationService:
-    def __init__(self, azure_maps_api_key):
+    def __init__(self, azure_maps_api_key, cache=None, max_concurrency=8, runtime=None, locator=None,
+                 local_geocoder=None):
         self.api_key = azure_maps_api_key
+        self.cache = cache
+        # Phone and time zone fallbacks are answered from tables in memory rather than Azure Maps
+        self.locator = locator or OfflineLocator()
+        # City/state/country strings and office codes are resolved from the gazetteer before any lookup
+        self.local_geocoder = local_geocoder
+        self.batch_enabled = GEOCODE_BATCH_ENABLED
+        self.max_concurrency = max(1, max_concurrency)
+        self.session = create_session(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix='geocoder')
+        # With an async runtime, batch and single searches are sent concurrently on its event loop
+        self.runtime = runtime
     
-    def geocode_address(self, address):
-        """Convert address to coordinates using Azure Maps"""
-        if not address:
-            return None
+    @staticmethod
+    def _location_from_search_response(data, address):
+        """Pick the top result of an Azure Maps address search response"""
+        if data.get('results') and len(data['results']) > 0:
+            result = data['results'][0]
+            position = result['position']
+            return {
+                'latitude': position['lat'],
+                'longitude': position['lon'],
+                'address': result.get('address', {}).get('freeformAddress', address)
+            }
+        return None
+    
+    def geocode_addresses(self, addresses):
+        """Geocode many address strings at once, returning a dict of address -> location (or None).
+        
+        Each unique string is resolved once: the offline gazetteer first, then cache
+        hits, then the Azure Maps batch search API for the rest, falling back to
+        parallel single searches. Strings whose lookup failed (as opposed to
+        finding no match) are left out, so callers can tell the two apart.
+        """
+        results = {}
+        pending = []
+        for address in dict.fromkeys(a for a in addresses if a):
+            location = self.local_geocoder.resolve(address) if self.local_geocoder else None
+            if location:
+                results[address] = location
+                continue
+            if self.cache:
+                found, location = self.cache.get(address)
+                if found:
+                    results[address] = location
+                    continue
+            pending.append(address)
+        
+        if pending and self.runtime:
+            # SQLite cache writes happen here, on the request thread, not on the event loop
+            resolved = self.runtime.run(self._geocode_pending_async(pending))
+            self._cache_results(resolved)
+            results.update(resolved)
+            return results
+        
+        if pending and self.batch_enabled:
+            for start in range(0, len(pending), AZURE_MAPS_BATCH_SIZE):
+                chunk = pending[start:start + AZURE_MAPS_BATCH_SIZE]
+                batch_results = self._geocode_batch(chunk)
+                if batch_results is None:
+                    break
+                results.update(batch_results)
+        
+        remaining = [address for address in pending if address not in results]
+        if remaining:
+            for address, (ok, location) in zip(remaining, self._executor.map(self._search_address, remaining)):
+                if ok:
+                    self._cache_results({address: location})
+                    results[address] = location
+        
+        return results
+    
+    async def _geocode_pending_async(self, pending):
+        """Resolve cache misses on the async runtime; addresses whose lookup failed are left out"""
+        results = {}
+        if self.batch_enabled:
+            chunks = [pending[start:start + AZURE_MAPS_BATCH_SIZE] for start in range(0, len(pending), AZURE_MAPS_BATCH_SIZE)]
+            for batch_results in await asyncio.gather(*(self._geocode_batch_async(chunk) for chunk in chunks)):
+                results.update(batch_results or {})
+        
+        remaining = [address for address in pending if address not in results]
+        if remaining:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
             
-        url = "https://atlas.microsoft.com/search/address/json"
+            async def geocode(address):
+                async with semaphore:
+                    return await self._search_address_async(address)
+            
+            for address, (ok, location) in zip(remaining, await asyncio.gather(*(geocode(address) for address in remaining))):
+                if ok:
+                    results[address] = location
+        return results
+    
+    def _batch_search_request(self, addresses):
+        """URL, query params and body for one Azure Maps synchronous batch search"""
+        url = f"{AZURE_MAPS_BASE_URL}/search/address/batch/json"
         params = {
+            'api-version': '1.0',
+            'subscription-key': self.api_key
+        }
+        body = {
+            'batchItems': [{'query': f"?{urlencode({'query': address, 'limit': 1})}"} for address in addresses]
+        }
+        return url, params, body
+    
+    def _parse_batch_items(self, addresses, items):
+        results = {}
+        for address, item in zip(addresses, items):
+            if item.get('statusCode') != 200:
+                continue
+            results[address] = self._location_from_search_response(item.get('response', {}), address)
+        return results
+    
+    def _cache_results(self, results):
+        # Cache misses too, so addresses Azure Maps can't resolve aren't re-billed on every load
+        if self.cache:
+            for address, location in results.items():
+                self.cache.put(address, location)
+    
+    def _geocode_batch(self, addresses):
+        """Resolve up to AZURE_MAPS_BATCH_SIZE addresses with one synchronous batch search call.
+        
+        Returns None if the batch endpoint itself fails so the caller can fall back.
+        Items that fail individually are left out of the result and retried singly.
+        """
+        url, params, body = self._batch_search_request(addresses)
+        
+        try:
+            response = self.session.post(url, params=params, json=body)
+            response.raise_for_status()
+            items = response.json().get('batchItems', [])
+        except Exception as e:
+            logger.warning(f"Azure Maps batch geocoding failed, falling back to single searches: {e}")
+            return None
+        
+        results = self._parse_batch_items(addresses, items)
+        self._cache_results(results)
+        return results
+    
+    async def _geocode_batch_async(self, addresses):
+        """_geocode_batch over the async runtime's shared HTTP client"""
+        url, params, body = self._batch_search_request(addresses)
+        
+        try:
+            response = await self.runtime.http.post(url, params=params, json=body)
+            response.raise_for_status()
+            items = response.json().get('batchItems', [])
+        except Exception as e:
+            logger.warning(f"Azure Maps batch geocoding failed, falling back to single searches: {e}")
+            return None
+        
+        return self._parse_batch_items(addresses, items)
+    
+    def _search_params(self, address):
+        return {
             'api-version': '1.0',
             'subscription-key': self.api_key,
             'query': address,
             'limit': 1
         }
+    
+    def geocode_address(self, address):
+        """Convert address to coordinates using Azure Maps, consulting the gazetteer and geocode cache first"""
+        if not address:
+            return None
+        
+        location = self.local_geocoder.resolve(address) if self.local_geocoder else None
+        if location:
+            return location
+        
+        if self.cache:
+            found, location = self.cache.get(address)
+            if found:
+                return location
+        
+        ok, location = self._search_address(address)
+        if ok:
+            self._cache_results({address: location})
+        return location
+    
+    def _search_address(self, address):
+        """Single Azure Maps address search, as (ok, location); ok is False on errors"""
+        url = f"{AZURE_MAPS_BASE_URL}/search/address/json"
         
         try:
-            response = requests.get(url, params=params)
+            response = self.session.get(url, params=self._search_params(address))
             response.raise_for_status()
-            data = response.json()
+            return True, self._location_from_search_response(response.json(), address)
+        except Exception as e:
+            logger.error(f"Error geocoding address {address}: {e}")
             
-            if data.get('results') and len(data['results']) > 0:
-                result = data['results'][0]
-                position = result['position']
-                return {
-                    'latitude': position['lat'],
-                    'longitude': position['lon'],
-                    'address': result.get('address', {}).get('freeformAddress', address)
-                }
+        return False, None
+    
+    async def _search_address_async(self, address):
+        """Single address search over the async runtime, as (ok, location); ok is False on errors"""
+        url = f"{AZURE_MAPS_BASE_URL}/search/address/json"
+        
+        try:
+            response = await self.runtime.http.get(url, params=self._search_params(address))
+            response.raise_for_status()
+            return True, self._location_from_search_response(response.json(), address)
         except Exception as e:
             logger.error(f"Error geocoding address {address}: {e}")
             
-        return None
+        return False, None
     
-    def get_location_from_phone(self, phone_number):
-        """Approximate location from phone number"""
+    def parse_phone_number(self, phone_number):
+        """Parse a phone number as Graph stores it, assuming US for bare 10/11-digit numbers"""
         if not phone_number:
-            logger.info("No phone number provided")
             return None
             
         try:
-            logger.info(f"Attempting to parse phone number: {phone_number}")
-            
             # Clean up phone number - remove common formatting
             cleaned_phone = re.sub(r'[^\d+]', '', phone_number)
             if not cleaned_phone.startswith('+') and len(cleaned_phone) == 10:
@@ -238,8 +736,6 @@ class LocationService:
             elif not cleaned_phone.startswith('+') and len(cleaned_phone) == 11 and cleaned_phone.startswith('1'):
                 # US number with leading 1
                 cleaned_phone = '+' + cleaned_phone
-                
-            logger.info(f"Cleaned phone number: {cleaned_phone}")
             
             # Parse phone number - try with US default first
             try:
@@ -247,112 +743,164 @@ class LocationService:
             except:
                 # Fallback to original parsing
                 parsed_number = phonenumbers.parse(phone_number, None)
-                
-            logger.info(f"Successfully parsed phone number: {parsed_number}")
-            
-            # Get country/region from phone number
-            country = geocoder.description_for_number(parsed_number, "en")
-            logger.info(f"Got country from phone number: {country}")
             
-            if country:
-                # Try to geocode the country
-                location = self.geocode_address(country)
-                logger.info(f"Geocoded location for {country}: {location}")
-                return location
-            else:
-                logger.warning(f"Could not determine country from phone number: {phone_number}")
-                
+            return parsed_number
         except Exception as e:
-            logger.error(f"Error getting location from phone {phone_number}: {e}")
+            logger.error(f"Error parsing phone number {phone_number}: {e}")
             
         return None
     
+    def get_location_from_phone(self, phone_number):
+        """Approximate location from phone number: the centre of its region, from the offline tables"""
+        parsed_number = self.parse_phone_number(phone_number)
+        if not parsed_number:
+            return None
+        region_code = phonenumbers.region_code_for_number(parsed_number)
+        location = self.locator.region_location(region_code)
+        if not location:
+            logger.debug(f"Could not determine region from phone number: {phone_number}")
+        return location
+    
     def get_timezone_location(self, timezone):
-        """Get approximate location from timezone"""
-        timezone_locations = {
-            'UTC-12:00': {'latitude': -11.0, 'longitude': -170.0, 'name': 'Baker Island'},
-            'UTC-11:00': {'latitude': 21.3, 'longitude': -157.8, 'name': 'Hawaii'},
-            'UTC-10:00': {'latitude': 21.3, 'longitude': -157.8, 'name': 'Hawaii-Aleutian'},
-            'UTC-09:00': {'latitude': 61.2, 'longitude': -149.9, 'name': 'Alaska'},
-            'UTC-08:00': {'latitude': 37.7, 'longitude': -122.4, 'name': 'Pacific Time'},
-            'UTC-07:00': {'latitude': 39.7, 'longitude': -104.9, 'name': 'Mountain Time'},
-            'UTC-06:00': {'latitude': 41.9, 'longitude': -87.6, 'name': 'Central Time'},
-            'UTC-05:00': {'latitude': 40.7, 'longitude': -74.0, 'name': 'Eastern Time'},
-            'UTC-04:00': {'latitude': 45.5, 'longitude': -73.6, 'name': 'Atlantic Time'},
-            'UTC-03:00': {'latitude': -23.5, 'longitude': -46.6, 'name': 'São Paulo'},
-            'UTC-02:00': {'latitude': -22.9, 'longitude': -43.2, 'name': 'Rio de Janeiro'},
-            'UTC-01:00': {'latitude': 32.3, 'longitude': -16.3, 'name': 'Azores'},
-            'UTC+00:00': {'latitude': 51.5, 'longitude': -0.1, 'name': 'London'},
-            'UTC+01:00': {'latitude': 52.5, 'longitude': 13.4, 'name': 'Berlin'},
-            'UTC+02:00': {'latitude': 41.9, 'longitude': 12.5, 'name': 'Rome'},
-            'UTC+03:00': {'latitude': 55.8, 'longitude': 37.6, 'name': 'Moscow'},
-            'UTC+04:00': {'latitude': 25.3, 'longitude': 55.3, 'name': 'Dubai'},
-            'UTC+05:00': {'latitude': 28.6, 'longitude': 77.2, 'name': 'Delhi'},
-            'UTC+06:00': {'latitude': 23.8, 'longitude': 90.4, 'name': 'Dhaka'},
-            'UTC+07:00': {'latitude': 13.8, 'longitude': 100.5, 'name': 'Bangkok'},
-            'UTC+08:00': {'latitude': 39.9, 'longitude': 116.4, 'name': 'Beijing'},
-            'UTC+09:00': {'latitude': 35.7, 'longitude': 139.7, 'name': 'Tokyo'},
-            'UTC+10:00': {'latitude': -33.9, 'longitude': 151.2, 'name': 'Sydney'},
-            'UTC+11:00': {'latitude': -37.8, 'longitude': 144.9, 'name': 'Melbourne'},
-            'UTC+12:00': {'latitude': -36.8, 'longitude': 174.7, 'name': 'Auckland'},
-        }
-        
-        if timezone in timezone_locations:
-            loc = timezone_locations[timezone]
-            return {
-                'latitude': loc['latitude'],
-                'longitude': loc['longitude'],
-                'address': loc['name']
-            }
-        
-        return None
+        """Get approximate location from a Windows or IANA time zone name or a UTC offset (no network calls)"""
+        return self.locator.timezone_location(timezone)
 
 # Initialize services
-graph_client = GraphAPIClient()
-location_service = LocationService(AZURE_MAPS_API_KEY)
+async_runtime = AsyncRuntime(ASYNC_MAX_CONNECTIONS)
+io_runtime = async_runtime if ASYNC_IO_ENABLED else None
+graph_client = GraphAPIClient(runtime=io_runtime)
+geocode_cache = GeocodeCache(GEOCODE_CACHE_PATH, GEOCODE_CACHE_MEMORY_SIZE,
+                             GEOCODE_CACHE_TTL, GEOCODE_CACHE_NEGATIVE_TTL)
+location_store = LocationStore(LOCATION_STORE_PATH, LOCATION_STORE_TTL, GEOCODE_CACHE_NEGATIVE_TTL)
+offline_locator = OfflineLocator()
+try:
+    gazetteer = Gazetteer(GAZETTEER_PATH)
+except (OSError, ValueError) as e:
+    logger.warning(f"Offline gazetteer unavailable, city lookups will use Azure Maps: {e}")
+    gazetteer = None
+local_geocoder = LocalGeocoder(gazetteer, offline_locator, load_office_locations(OFFICE_LOCATIONS_PATH))
+location_service = LocationService(AZURE_MAPS_API_KEY, geocode_cache, GEOCODE_MAX_CONCURRENCY, io_runtime,
+                                   offline_locator, local_geocoder)
+photo_cache = PhotoCache(PHOTO_CACHE_DIR, PHOTO_CACHE_MEMORY_MB * 1024 * 1024,
+                         PHOTO_CACHE_TTL, PHOTO_CACHE_NEGATIVE_TTL)
+org_crawler = OrgCrawler(graph_client, GRAPH_MAX_CONCURRENCY)
+hierarchy_cache = HierarchyCache(HIERARCHY_CACHE_TTL, HIERARCHY_CACHE_MAX_NODES)
+team_context_store = TeamContextStore(TEAM_CONTEXT_TTL, TEAM_CONTEXT_MAX_MEMBERS)
+spatial_indexes = SpatialIndexCache(SPATIAL_INDEX_MAX_ENTRIES, SPATIAL_INDEX_CELL_DEGREES)
+team_tools = TeamToolsCache(SPATIAL_INDEX_MAX_ENTRIES)
+cluster_indexes = ClusterIndexCache(SPATIAL_INDEX_MAX_ENTRIES, CLUSTER_MAX_ZOOM)
+photo_sprites = PhotoSpriteBuilder(lambda user_ids, size: load_user_photos(user_ids, size), PHOTO_SPRITE_TTL,
+                                   max_tiles=PHOTO_SPRITE_MAX_TILES)
+directory_index = DirectoryIndex(graph_client, USER_SELECT_FIELDS, DIRECTORY_DELTA_INTERVAL)
+if DIRECTORY_INDEX_ENABLED:
+    directory_index.start()
 
-def build_org_hierarchy(root_user_email, visited=None):
-    """Recursively build organization hierarchy"""
-    if visited is None:
-        visited = set()
+@timed_phase('crawl')
+def build_org_hierarchy(root_user_email, stats=None):
+    """Build organization hierarchy, from the directory index when it is loaded, else by crawling Graph.
     
-    if root_user_email in visited:
-        return None
+    Crawled trees go through the shared hierarchy cache, so concurrent requests
+    for the same root share one crawl and managers inside a cached tree are
+    answered with their subtree.
+    """
+    if stats is None:
+        stats = CrawlStats()
     
-    visited.add(root_user_email)
+    if directory_index.ready:
+        hierarchy = directory_index.build_hierarchy(root_user_email)
+        if hierarchy:
+            stats.source = 'directory-index'
+            stats.finish()
+            return hierarchy
     
-    # Get root user details
-    user_data = graph_client.get_user_by_email(root_user_email)
-    if not user_data:
-        return None
+    hierarchy, from_cache = hierarchy_cache.get_or_build(root_user_email, lambda email: org_crawler.crawl(email, stats))
+    if from_cache:
+        stats.source = 'cache'
+        stats.finish()
+    return hierarchy
+
+def annotate_hierarchy(hierarchy, depth, loaded_depth=None, report_counts=None):
+    """Copy of a hierarchy cut to depth levels of reports, with counts for lazy expansion.
     
-    # Get direct reports
-    direct_reports = graph_client.get_user_direct_reports(user_data['id'])
+    loaded_depth is where the given tree itself stops (None when it is complete);
+    report_counts(user_id) -> (direct, descendants) covers nodes at that edge.
+    Every node gets direct_report_count and descendant_count (None if unknown)
+    and children_loaded, which is False where the client should fetch the rest
+    from /api/org-subtree.
+    """
+    def counts(node, node_depth):
+        """(direct, descendants) for a node of the given tree, None for what it doesn't know"""
+        if loaded_depth is not None and node_depth >= loaded_depth:
+            return report_counts(node['user']['id']) if report_counts else (None, None)
+        descendants = 0
+        for child in node.get('children') or []:
+            child_descendants = counts_by_node[id(child)][1]
+            if child_descendants is None:
+                descendants = None
+                break
+            descendants += child_descendants + 1
+        return len(node.get('children') or []), descendants
     
-    hierarchy = {
-        'user': user_data,
-        'children': []
-    }
+    # Count bottom-up over everything loaded, deepest level first
+    levels = [[hierarchy]]
+    while levels[-1]:
+        levels.append([child for node in levels[-1] for child in node.get('children') or []])
+    counts_by_node = {}
+    for node_depth in range(len(levels) - 1, -1, -1):
+        for node in levels[node_depth]:
+            counts_by_node[id(node)] = counts(node, node_depth)
     
-    if direct_reports and direct_reports.get('value'):
-        for report in direct_reports['value']:
-            if report.get('mail'):
-                child_hierarchy = build_org_hierarchy(report['mail'], visited.copy())
-                if child_hierarchy:
-                    hierarchy['children'].append(child_hierarchy)
+    def copy(node, node_depth):
+        direct, descendants = counts_by_node[id(node)]
+        expanded = node_depth < depth and (loaded_depth is None or node_depth < loaded_depth)
+        return {
+            'user': node['user'],
+            'children': [copy(child, node_depth + 1) for child in node.get('children') or []] if expanded else [],
+            'direct_report_count': direct,
+            'descendant_count': descendants,
+            'children_loaded': expanded or direct == 0
+        }
     
-    return hierarchy
+    return copy(hierarchy, 0)
 
-def get_user_location_info(user):
-    """Get location information for a user with priority: address > phone > timezone"""
-    location_data = {
-        'user': user,
-        'location': None,
-        'border_color': 'gray',
-        'location_type': 'timezone'
-    }
+def cached_report_counts(user_id):
+    """(direct reports, everyone below) for a user from a cached tree that contains them, else (None, None)"""
+    subtree = hierarchy_cache.peek(user_id)
+    if not subtree:
+        return None, None
+    return len(subtree.get('children') or []), len(collect_hierarchy_users(subtree)) - 1
+
+@timed_phase('crawl')
+def build_limited_hierarchy(root, depth, stats=None):
+    """Build the hierarchy below root (an email, UPN or user id) to depth levels of reports, with counts.
+    
+    Uses the directory index or a cached tree when one covers root, with exact
+    counts; otherwise crawls depth levels plus the directReports of the last
+    one, so every node has direct_report_count (for depth=1 that is one user
+    lookup and two directReports round trips). Descendant counts at the cut
+    come from cached trees when there are any, else they are None.
+    """
+    if stats is None:
+        stats = CrawlStats()
+    
+    if directory_index.ready:
+        hierarchy = directory_index.build_hierarchy(root, depth)
+        if hierarchy:
+            stats.source = 'directory-index'
+            stats.finish()
+            return annotate_hierarchy(hierarchy, depth, depth, directory_index.report_counts)
+    
+    cached = hierarchy_cache.peek(root)
+    if cached:
+        stats.source = 'cache'
+        stats.finish()
+        return annotate_hierarchy(cached, depth)
     
-    # Try to build address from user fields
+    hierarchy = org_crawler.crawl(root, stats, max_depth=depth + 1)
+    return annotate_hierarchy(hierarchy, depth, depth + 1, cached_report_counts) if hierarchy else None
+
+def build_user_address(user):
+    """Join the user's street/city/state/country fields into a geocodable address"""
     address_parts = []
     if user.get('streetAddress'):
         address_parts.append(user['streetAddress'])
@@ -362,11 +910,30 @@ def get_user_location_info(user):
         address_parts.append(user['state'])
     if user.get('country'):
         address_parts.append(user['country'])
+    return ', '.join(address_parts) if address_parts else None
+
+def get_user_phone(user):
+    """Get the phone number used for location approximation"""
+    return user.get('mobilePhone') or (user.get('businessPhones') and user['businessPhones'][0])
+
+def get_user_location_info(user, geocoded=None):
+    """Get location information for a user with priority: address > phone > timezone
+    
+    geocoded is an optional dict of query string -> location produced by
+    LocationService.geocode_addresses; when given, no geocoding calls are made here.
+    """
+    geocode = location_service.geocode_address if geocoded is None else geocoded.get
+    location_data = {
+        'user': user,
+        'location': None,
+        'border_color': 'gray',
+        'location_type': 'timezone'
+    }
     
     # Priority 1: Try address
-    if address_parts:
-        address = ', '.join(address_parts)
-        location = location_service.geocode_address(address)
+    address = build_user_address(user)
+    if address:
+        location = geocode(address)
         if location:
             location_data['location'] = location
             location_data['border_color'] = 'green'
@@ -375,7 +942,7 @@ def get_user_location_info(user):
     
     # Priority 2: Try office location
     if user.get('officeLocation'):
-        location = location_service.geocode_address(user['officeLocation'])
+        location = geocode(user['officeLocation'])
         if location:
             location_data['location'] = location
             location_data['border_color'] = 'green'
@@ -383,21 +950,15 @@ def get_user_location_info(user):
             return location_data
     
     # Priority 3: Try phone number
-    phone = user.get('mobilePhone') or (user.get('businessPhones') and user['businessPhones'][0])
-    logger.info(f"Checking phone for user {user.get('displayName', 'Unknown')}: mobile={user.get('mobilePhone')}, business={user.get('businessPhones')}")
+    phone = get_user_phone(user)
     if phone:
-        logger.info(f"Found phone number for {user.get('displayName', 'Unknown')}: {phone}")
         location = location_service.get_location_from_phone(phone)
         if location:
-            logger.info(f"Successfully got location from phone for {user.get('displayName', 'Unknown')}: {location}")
             location_data['location'] = location
             location_data['border_color'] = 'orange'
             location_data['location_type'] = 'phone'
             return location_data
-        else:
-            logger.warning(f"Failed to get location from phone for {user.get('displayName', 'Unknown')}: {phone}")
-    else:
-        logger.info(f"No phone number available for user {user.get('displayName', 'Unknown')}")
+        logger.debug(f"Could not locate {user.get('displayName', 'Unknown')} from phone number {phone}")
     
     # Priority 4: Use timezone
     timezone = user.get('timeZone')
@@ -411,30 +972,133 @@ def get_user_location_info(user):
     
     return location_data
 
+def collect_hierarchy_users(hierarchy):
+    """List every user in the hierarchy in depth-first (pre-order) order"""
+    users = []
+    stack = [hierarchy] if hierarchy else []
+    while stack:
+        node = stack.pop()
+        if node.get('user'):
+            users.append(node['user'])
+        stack.extend(reversed(node.get('children') or []))
+    return users
+
+def geocode_users(users):
+    """Resolve the unique location strings for many users in staged batches.
+    
+    Addresses are geocoded first, then office locations only for users whose
+    address did not resolve. This keeps the address > office priority without
+    geocoding strings that will never be used; phone and time zone fallbacks
+    are resolved offline and need no geocoding. Strings whose lookup failed
+    are left out (see LocationService.geocode_addresses).
+    """
+    geocoded = location_service.geocode_addresses([build_user_address(user) for user in users])
+    unresolved = [user for user in users if not geocoded.get(build_user_address(user))]
+    
+    geocoded.update(location_service.geocode_addresses([user.get('officeLocation') for user in unresolved]))
+    return geocoded
+
+# Resolution priority of each location type; lower is better
+LOCATION_TYPE_RANK = {'address': 0, 'office': 1, 'phone': 2, 'timezone': 3}
+
+def best_location_type(user):
+    """The best location type the user's directory fields could resolve to"""
+    if build_user_address(user):
+        return 'address'
+    if user.get('officeLocation'):
+        return 'office'
+    if get_user_phone(user):
+        return 'phone'
+    return 'timezone'
+
+def geocode_answered(user, location_info, geocoded):
+    """Whether every string geocoded for the user got a definite answer (a match or a real no-match)
+    
+    geocode_users leaves out strings whose lookup failed, e.g. while Azure Maps is
+    unreachable; a location resolved around such a failure must not be stored.
+    """
+    address = build_user_address(user)
+    if address and address not in geocoded:
+        return False
+    office = user.get('officeLocation')
+    if office and location_info['location_type'] != 'address' and office not in geocoded:
+        return False
+    return True
+
+@timed_phase('geocode')
+def resolve_user_locations(users):
+    """Location info for each user, in order, resolving only users whose location fields changed
+    
+    Unchanged users come from the location store; the rest go through
+    geocode_users/get_user_location_info and are written back to it, unless a
+    geocode lookup behind them failed.
+    """
+    stored = location_store.get_many(users)
+    changed = [user for user in users if user.get('id') not in stored]
+    geocoded = geocode_users(changed) if changed else {}
+    
+    resolved = {}
+    storable = []
+    degraded = []
+    for user in changed:
+        location_info = get_user_location_info(user, geocoded)
+        resolved[id(user)] = location_info
+        if not geocode_answered(user, location_info, geocoded):
+            continue
+        storable.append(location_info)
+        # Anything short of the user's best field is retried when its geocode cache entry expires
+        if LOCATION_TYPE_RANK[location_info['location_type']] > LOCATION_TYPE_RANK[best_location_type(user)]:
+            degraded.append(user.get('id'))
+    location_store.put_many(storable, degraded)
+    
+    results = []
+    sources = Counter()
+    for user in users:
+        if id(user) in resolved:
+            location_info, source = resolved[id(user)], 'resolved'
+        else:
+            location_info, source = dict(stored[user['id']], user=user), 'store'
+        sources[(source, location_info['location_type'])] += 1
+        results.append(location_info)
+    for (source, location_type), count in sources.items():
+        metrics.increment('whereat_user_locations_total', {'source': source, 'location_type': location_type}, count)
+    
+    return results
+
 def flatten_hierarchy_for_map(hierarchy, users_list=None):
     """Flatten hierarchy tree to get all users for map display"""
     if users_list is None:
         users_list = []
     
-    if hierarchy and hierarchy.get('user'):
-        user_location = get_user_location_info(hierarchy['user'])
-        users_list.append(user_location)
-    
-    if hierarchy and hierarchy.get('children'):
-        for child in hierarchy['children']:
-            flatten_hierarchy_for_map(child, users_list)
+    users_list.extend(resolve_user_locations(collect_hierarchy_users(hierarchy)))
     
     return users_list
 
 @app.route('/api/org-hierarchy/<email>')
 def get_org_hierarchy(email):
-    """Get organization hierarchy starting from given email"""
+    """Get organization hierarchy starting from given email
+    
+    ?depth=N returns only N levels of reports, annotated for lazy expansion
+    (see /api/org-subtree); without it the whole tree is returned.
+    """
     try:
-        hierarchy = build_org_hierarchy(email)
+        depth = request.args.get('depth')
+        if depth is not None and (not depth.isdigit() or int(depth) > MAX_SUBTREE_DEPTH):
+            return jsonify({
+                'success': False,
+                'error': f'depth must be an integer between 0 and {MAX_SUBTREE_DEPTH}'
+            }), 400
+        
+        stats = CrawlStats()
+        if depth is not None:
+            hierarchy = build_limited_hierarchy(email, int(depth), stats)
+        else:
+            hierarchy = build_org_hierarchy(email, stats)
         if hierarchy:
             return jsonify({
                 'success': True,
-                'data': hierarchy
+                'data': hierarchy,
+                'crawl_stats': stats.to_dict()
             })
         else:
             return jsonify({
@@ -448,18 +1112,195 @@ def get_org_hierarchy(email):
             'error': str(e)
         }), 500
 
+@app.route('/api/org-subtree/<user_id>')
+def get_org_subtree(user_id):
+    """Get a user's reports for expanding one org chart node
+    
+    Returns the node with ?depth= levels of reports (default 1), each with
+    direct_report_count, descendant_count and children_loaded.
+    """
+    try:
+        depth = request.args.get('depth', '1')
+        if not depth.isdigit() or not 1 <= int(depth) <= MAX_SUBTREE_DEPTH:
+            return jsonify({
+                'success': False,
+                'error': f'depth must be an integer between 1 and {MAX_SUBTREE_DEPTH}'
+            }), 400
+        
+        stats = CrawlStats()
+        subtree = build_limited_hierarchy(user_id, int(depth), stats)
+        if subtree:
+            return jsonify({
+                'success': True,
+                'data': subtree,
+                'crawl_stats': stats.to_dict()
+            })
+        return jsonify({
+            'success': False,
+            'error': 'User not found or no access'
+        }), 404
+    except Exception as e:
+        logger.error(f"Error getting org subtree: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
 @app.route('/api/map-data/<email>')
 def get_map_data(email):
-    """Get all users in hierarchy with location data for map display"""
+    """Get all users in hierarchy with location data for map display
+    
+    ?fields= keeps only the given paths (e.g. user.displayName,location,location_type).
+    ?format=json (default) returns a list of records; columnar returns parallel
+    arrays per field; msgpack is columnar encoded as MessagePack. Responses carry
+    an ETag and answer If-None-Match with 304 when the roster hasn't changed.
+    """
     try:
-        hierarchy = build_org_hierarchy(email)
+        try:
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
+        data_format = request.args.get('format', 'json')
+        if data_format not in FORMATS:
+            return jsonify({
+                'success': False,
+                'error': f"format must be one of {', '.join(FORMATS)}"
+            }), 400
+        if data_format == 'msgpack' and not msgpack_available():
+            return jsonify({
+                'success': False,
+                'error': 'msgpack is not installed on the server'
+            }), 406
+        
+        stats = CrawlStats()
+        hierarchy = build_org_hierarchy(email, stats)
         if hierarchy:
             users_with_locations = flatten_hierarchy_for_map(hierarchy)
+            team_context_id = team_context_store.put(users_with_locations)
+            # Weak, so the same tag stands for every Content-Encoding of the body
+            etag = data_etag(team_context_id, fields, data_format)
+            if request.if_none_match.contains_weak(etag):
+                response = Response(status=304)
+            else:
+                payload = {
+                    'success': True,
+                    'team_context_id': team_context_id,
+                    'crawl_stats': stats.to_dict()
+                }
+                if data_format == 'json':
+                    payload['data'] = [project_record(record, fields) for record in users_with_locations]
+                    response = jsonify(payload)
+                else:
+                    payload['data'] = to_columnar(users_with_locations, fields)
+                    response = (jsonify(payload) if data_format == 'columnar'
+                                else Response(encode_msgpack(payload), mimetype=MSGPACK_MIMETYPE))
+            response.set_etag(etag, weak=True)
+            # Let browsers keep the body but revalidate it on every use
+            response.headers['Cache-Control'] = 'private, no-cache'
+            return response
+        else:
             return jsonify({
-                'success': True,
-                'data': users_with_locations
-            })
+                'success': False,
+                'error': 'User not found or no access'
+            }), 404
+    except Exception as e:
+        logger.error(f"Error getting map data: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def iter_hierarchy_levels(hierarchy):
+    """Yield the users of an already built hierarchy level by level, root first"""
+    level = [hierarchy]
+    while level:
+        yield [node['user'] for node in level if node.get('user')]
+        level = [child for node in level for child in node.get('children') or []]
+
+def stream_hierarchy_levels(root_user_email, stats):
+    """Yield the users of the hierarchy level by level, root first, while it is being built.
+    
+    A crawl runs on a background thread through the shared hierarchy cache (so
+    it is still single-flight and cached) and hands over each level as soon as
+    it is known. Cached trees, shared builds and the directory index are walked
+    level by level once available. Yields nothing if the user is not found.
+    """
+    if directory_index.ready:
+        hierarchy = directory_index.build_hierarchy(root_user_email)
+        if hierarchy:
+            stats.source = 'directory-index'
+            stats.finish()
+            yield from iter_hierarchy_levels(hierarchy)
+            return
+    
+    updates = queue.Queue()
+    
+    def build():
+        try:
+            hierarchy, from_cache = hierarchy_cache.get_or_build(
+                root_user_email,
+                lambda email: org_crawler.crawl(email, stats, on_level=lambda users: updates.put(('level', users)))
+            )
+            updates.put(('done', hierarchy, from_cache))
+        except Exception as e:
+            updates.put(('error', e))
+    
+    threading.Thread(target=build, name='map-stream-crawl', daemon=True).start()
+    
+    streamed = False
+    while True:
+        update = updates.get()
+        if update[0] == 'level':
+            streamed = True
+            yield update[1]
+        elif update[0] == 'error':
+            raise update[1]
         else:
+            _, hierarchy, from_cache = update
+            if from_cache:
+                stats.source = 'cache'
+                stats.finish()
+            if hierarchy and not streamed:
+                yield from iter_hierarchy_levels(hierarchy)
+            return
+
+def sse_event(event, data):
+    """Format one Server-Sent Events frame with a JSON payload"""
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.route('/api/map-data/<email>/stream')
+def stream_map_data(email):
+    """Stream map data as it is resolved, nearest levels first.
+    
+    Emits one {'type': 'user', 'depth', 'data'} record per user, in chunks of a
+    level as soon as they are geocoded, then a final {'type': 'summary'} record
+    (or {'type': 'error'}). ?format=ndjson (default) sends newline-delimited
+    JSON; ?format=sse sends Server-Sent Events named after the record type.
+    ?fields= projects each user record as for /api/map-data.
+    """
+    stream_format = request.args.get('format', 'ndjson')
+    if stream_format not in ('ndjson', 'sse'):
+        return jsonify({
+            'success': False,
+            'error': 'format must be ndjson or sse'
+        }), 400
+    try:
+        fields = parse_fields(request.args.get('fields'))
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        stats = CrawlStats()
+        levels = stream_hierarchy_levels(email, stats)
+        # Pull the root level before responding so an unknown user still gets a 404
+        first_level = next(levels, None)
+        if not first_level:
             return jsonify({
                 'success': False,
                 'error': 'User not found or no access'
@@ -470,19 +1311,352 @@ def get_map_data(email):
             'success': False,
             'error': str(e)
         }), 500
+    
+    def encode(record):
+        if stream_format == 'sse':
+            return sse_event(record['type'], record)
+        return json.dumps(record, separators=(',', ':')) + '\n'
+    
+    def generate():
+        started = time.perf_counter()
+        count = 0
+        depth = 0
+        location_types = {}
+        first_record_ms = None
+        # The roster chat will use is exactly what streams; the store keeps this list, and its
+        # user dicts are the hierarchy cache's own, so no second crawl or flatten is needed
+        roster = []
+        try:
+            level = first_level
+            while level is not None:
+                for start in range(0, len(level), MAP_STREAM_CHUNK_SIZE):
+                    chunk = level[start:start + MAP_STREAM_CHUNK_SIZE]
+                    for location_info in resolve_user_locations(chunk):
+                        location_types[location_info['location_type']] = location_types.get(location_info['location_type'], 0) + 1
+                        count += 1
+                        roster.append(location_info)
+                        yield encode({'type': 'user', 'depth': depth, 'data': project_record(location_info, fields)})
+                    if first_record_ms is None:
+                        first_record_ms = round((time.perf_counter() - started) * 1000, 1)
+                level = next(levels, None)
+                depth += 1
+        except Exception as e:
+            logger.error(f"Error streaming map data: {e}")
+            yield encode({'type': 'error', 'success': False, 'error': str(e)})
+            return
+        
+        yield encode({
+            'type': 'summary',
+            'success': True,
+            'count': count,
+            'levels': depth,
+            'location_types': location_types,
+            'team_context_id': team_context_store.put(roster),
+            'first_record_ms': first_record_ms,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1),
+            'crawl_stats': stats.to_dict()
+        })
+    
+    mimetype = 'text/event-stream' if stream_format == 'sse' else 'application/x-ndjson'
+    # Ask proxies not to buffer so the first pins reach the browser right away
+    return Response(generate(), mimetype=mimetype,
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
 
-@app.route('/api/user-photo/<user_id>')
-def get_user_photo(user_id):
-    """Get user profile photo"""
+def load_team_roster(email, team_context_id=None):
+    """Return (map-data records, team_context_id) for a cached team context, else for email's hierarchy.
+    
+    Returns (None, None) if the context has expired and the hierarchy can't be built.
+    """
+    members = team_context_store.get(team_context_id) if team_context_id else None
+    if members is not None:
+        return members, team_context_id
+    if not email:
+        return None, None
+    hierarchy = build_org_hierarchy(email)
+    if not hierarchy:
+        return None, None
+    members = flatten_hierarchy_for_map(hierarchy)
+    return members, team_context_store.put(members)
+
+@app.route('/api/nearby')
+def get_nearby():
+    """Find team members near a point or place.
+    
+    The team is given by team_context_id (from /api/map-data) or email (the
+    hierarchy root). The point is lat/lon or a place name to geocode. Returns
+    the k nearest members (k, default 10), or everyone within radius_km of the
+    point when radius_km is given (capped at k if k is also given).
+    """
     try:
-        photo_data = graph_client.get_user_photo(user_id)
-        if photo_data:
-            return photo_data, 200, {'Content-Type': 'image/jpeg'}
+        args = request.args
+        try:
+            k = int(args['k']) if args.get('k') else None
+            radius_km = float(args['radius_km']) if args.get('radius_km') else None
+            lat = float(args['lat']) if args.get('lat') else None
+            lon = float(args['lon']) if args.get('lon') else None
+        except ValueError:
+            return jsonify({
+                'success': False,
+                'error': 'k, radius_km, lat and lon must be numbers'
+            }), 400
+        
+        if k is not None and not 1 <= k <= NEARBY_MAX_K:
+            return jsonify({
+                'success': False,
+                'error': f'k must be between 1 and {NEARBY_MAX_K}'
+            }), 400
+        if radius_km is not None and radius_km < 0:
+            return jsonify({
+                'success': False,
+                'error': 'radius_km must not be negative'
+            }), 400
+        
+        started = time.perf_counter()
+        if lat is None or lon is None:
+            place = args.get('place')
+            if not place:
+                return jsonify({
+                    'success': False,
+                    'error': 'Provide lat and lon, or place'
+                }), 400
+            with timed_phase('geocode'):
+                location = location_service.geocode_address(place)
+            if not location:
+                return jsonify({
+                    'success': False,
+                    'error': f'Could not geocode {place}'
+                }), 404
+            lat, lon = location['latitude'], location['longitude']
+        
+        if not args.get('email') and not args.get('team_context_id'):
+            return jsonify({
+                'success': False,
+                'error': 'Provide email or team_context_id'
+            }), 400
+        members, team_context_id = load_team_roster(args.get('email'), args.get('team_context_id'))
+        if members is None:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or no access, or team_context_id expired'
+            }), 404
+        
+        index = spatial_indexes.get_or_build(team_context_id, lambda: members)
+        if radius_km is not None:
+            matches = index.within(lat, lon, radius_km, k)
         else:
+            matches = index.nearest(lat, lon, k or NEARBY_DEFAULT_K)
+        
+        return jsonify({
+            'success': True,
+            'data': [dict(member, distance_km=round(distance, 2)) for member, distance in matches],
+            'center': {'latitude': lat, 'longitude': lon},
+            'team_context_id': team_context_id,
+            'indexed_members': index.size,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+    except Exception as e:
+        logger.error(f"Error finding nearby team members: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/map-clusters')
+def get_map_clusters():
+    """Get the clusters and single pins visible in a map viewport
+    
+    The team is given by team_context_id (from /api/map-data) or email (the
+    hierarchy root). bbox is west,south,east,north in degrees and zoom the map
+    zoom level. Pins carry only what the map draws; fetch full records for a
+    cluster from /api/map-clusters/leaves.
+    """
+    try:
+        args = request.args
+        try:
+            west, south, east, north = (float(value) for value in args.get('bbox', '-180,-90,180,90').split(','))
+            zoom = float(args.get('zoom', '0'))
+        except ValueError:
             return jsonify({
                 'success': False,
-                'error': 'Photo not found'
+                'error': 'bbox must be west,south,east,north and zoom a number'
+            }), 400
+        
+        if not args.get('email') and not args.get('team_context_id'):
+            return jsonify({
+                'success': False,
+                'error': 'Provide email or team_context_id'
+            }), 400
+        members, team_context_id = load_team_roster(args.get('email'), args.get('team_context_id'))
+        if members is None:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or no access, or team_context_id expired'
+            }), 404
+        
+        started = time.perf_counter()
+        index = cluster_indexes.get_or_build(team_context_id, lambda: members)
+        features = index.query(west, south, east, north, zoom)
+        return jsonify({
+            'success': True,
+            'data': features,
+            'team_context_id': team_context_id,
+            'zoom': max(0, min(int(zoom), index.max_zoom + 1)),
+            'max_zoom': index.max_zoom,
+            'indexed_members': index.size,
+            'unlocated_members': index.unlocated,
+            'elapsed_ms': round((time.perf_counter() - started) * 1000, 2)
+        })
+    except Exception as e:
+        logger.error(f"Error getting map clusters: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/map-clusters/leaves')
+def get_map_cluster_leaves():
+    """Get the full map-data records of the members in one cluster, paged with limit and offset"""
+    try:
+        args = request.args
+        try:
+            cluster_id = int(args['cluster_id'])
+            limit = int(args.get('limit', CLUSTER_LEAVES_DEFAULT_LIMIT))
+            offset = int(args.get('offset', '0'))
+        except (KeyError, ValueError):
+            return jsonify({
+                'success': False,
+                'error': 'cluster_id is required; cluster_id, limit and offset must be integers'
+            }), 400
+        if not 1 <= limit <= CLUSTER_LEAVES_MAX_LIMIT or offset < 0:
+            return jsonify({
+                'success': False,
+                'error': f'limit must be between 1 and {CLUSTER_LEAVES_MAX_LIMIT} and offset not negative'
+            }), 400
+        
+        members, team_context_id = load_team_roster(args.get('email'), args.get('team_context_id'))
+        if members is None:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or no access, or team_context_id expired'
+            }), 404
+        
+        leaves = cluster_indexes.get_or_build(team_context_id, lambda: members).leaves(cluster_id, limit, offset)
+        if leaves is None:
+            return jsonify({
+                'success': False,
+                'error': f'Unknown cluster {cluster_id}'
             }), 404
+        return jsonify({
+            'success': True,
+            'data': leaves['members'],
+            'total': leaves['total'],
+            'team_context_id': team_context_id
+        })
+    except Exception as e:
+        logger.error(f"Error getting map cluster leaves: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+def parse_photo_size(value):
+    """Parse a ?size= value such as '96' or '96x96', clamped to the sizes we serve"""
+    if not value:
+        return None
+    size = int(value.lower().split('x')[0])
+    return max(PHOTO_MIN_SIZE, min(size, PHOTO_MAX_SIZE))
+
+def photo_cache_key(user_id, size=None):
+    return f"{user_id}:{size}" if size else user_id
+
+def fetch_user_photo(user_id, size=None):
+    """Fetch a photo from Graph, downscaling the nearest pre-rendered size when needed"""
+    if not size:
+        return graph_client.get_user_photo(user_id)
+    
+    graph_size = graph_photo_size(size)
+    photo_data, status = graph_client.get_user_photo(user_id, graph_size)
+    if photo_data and graph_size != size:
+        photo_data = resize_photo(photo_data, size)
+    return photo_data, status
+
+def load_user_photos(user_ids, size):
+    """Load thumbnails for many users: photo cache first, then $batch requests for the misses"""
+    photos = {}
+    missing = []
+    for user_id in user_ids:
+        found, photo = photo_cache.get(photo_cache_key(user_id, size))
+        if found:
+            photos[user_id] = photo.data if photo else None
+        else:
+            missing.append(user_id)
+    
+    graph_size = graph_photo_size(size)
+    fetched = org_crawler.run_batched(lambda chunk: graph_client.get_user_photos(chunk, graph_size), missing)
+    for user_id, (photo_data, status) in zip(missing, fetched):
+        if not photo_data:
+            if status == 404:
+                photo_cache.put(photo_cache_key(user_id, size), None)
+            photos[user_id] = None
+            continue
+        if graph_size != size:
+            photo_data = resize_photo(photo_data, size)
+        photos[user_id] = photo_cache.put(photo_cache_key(user_id, size), photo_data).data
+    
+    return [photos.get(user_id) for user_id in user_ids]
+
+def cached_image_response(photo, max_age):
+    """Serve image bytes with a strong ETag, Cache-Control and If-None-Match handling"""
+    response = Response(photo.data, mimetype='image/jpeg')
+    response.set_etag(photo.etag)
+    response.headers['Cache-Control'] = f'public, max-age={max_age}'
+    return response.make_conditional(request)
+
+@app.route('/api/user-photo/<user_id>')
+def get_user_photo(user_id):
+    """Get user profile photo, optionally resized with ?size=N, served from the photo cache with ETag revalidation"""
+    try:
+        size = parse_photo_size(request.args.get('size'))
+        cache_key = photo_cache_key(user_id, size)
+        found, photo = photo_cache.get(cache_key)
+        if not found:
+            photo_data, status = fetch_user_photo(user_id, size)
+            if photo_data or status == 404:
+                photo = photo_cache.put(cache_key, photo_data)
+            elif status is None or status >= 500 or status == 429:
+                response = jsonify({
+                    'success': False,
+                    'error': 'Photo service unavailable'
+                })
+                response.status_code = 503
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+            else:
+                # Only a real 404 means "no photo"; a 400/401/403 must not be cached as one
+                logger.warning(f"Graph returned {status} for the photo of {user_id}")
+                response = jsonify({
+                    'success': False,
+                    'error': 'Photo could not be retrieved'
+                })
+                response.status_code = 502
+                response.headers['Cache-Control'] = 'no-store'
+                return response
+
+        if photo is None:
+            response = jsonify({
+                'success': False,
+                'error': 'Photo not found'
+            })
+            response.status_code = 404
+            response.headers['Cache-Control'] = f'public, max-age={PHOTO_NEGATIVE_MAX_AGE}'
+            return response
+        
+        return cached_image_response(photo, PHOTO_MAX_AGE)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid size'
+        }), 400
     except Exception as e:
         logger.error(f"Error getting user photo: {e}")
         return jsonify({
@@ -490,6 +1664,170 @@ def get_user_photo(user_id):
             'error': str(e)
         }), 500
 
+def get_photo_sprite_for(email, size):
+    """Get (sheet images, index) for everyone in email's hierarchy, or None if the user isn't found"""
+    def list_user_ids():
+        hierarchy = build_org_hierarchy(email)
+        if not hierarchy:
+            return None
+        return [user['id'] for user in collect_hierarchy_users(hierarchy)]
+    
+    return photo_sprites.get_sprite(email.lower(), size, list_user_ids)
+
+@app.route('/api/photo-sprite/<email>')
+def get_photo_sprite(email):
+    """Get the sprite index (user id -> [sheet, x, y]) for all photos in a hierarchy
+    
+    Each sheet lists the image_url to fetch it from; the URL carries the sheet's
+    ETag so it can be cached for as long as the index that named it.
+    """
+    try:
+        size = parse_photo_size(request.args.get('size')) or PHOTO_SPRITE_DEFAULT_SIZE
+        sprite = get_photo_sprite_for(email, size)
+        if not sprite:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or no access'
+            }), 404
+        
+        _, index = sprite
+        image_path = f"/api/photo-sprite/{quote(email, safe='@')}/image?size={size}"
+        return jsonify({
+            'success': True,
+            'data': dict(index, sheets=[
+                dict(sheet, image_url=f"{image_path}&sheet={number}&v={sheet['etag']}")
+                for number, sheet in enumerate(index['sheets'])
+            ])
+        })
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid size'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting photo sprite: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/photo-sprite/<email>/image')
+def get_photo_sprite_image(email):
+    """Get one sprite sheet image (?sheet=N, default 0) for all photos in a hierarchy
+    
+    ?v= is the sheet ETag from the index; if the sprite has since been rebuilt
+    the request fails with 409 rather than caching a sheet that doesn't match
+    the positions the client holds.
+    """
+    try:
+        size = parse_photo_size(request.args.get('size')) or PHOTO_SPRITE_DEFAULT_SIZE
+        sheet = request.args.get('sheet', '0')
+        if not sheet.isdigit():
+            return jsonify({
+                'success': False,
+                'error': 'sheet must be a non-negative integer'
+            }), 400
+        sprite = get_photo_sprite_for(email, size)
+        if not sprite:
+            return jsonify({
+                'success': False,
+                'error': 'User not found or no access'
+            }), 404
+        
+        sheets, _ = sprite
+        if int(sheet) >= len(sheets):
+            return jsonify({
+                'success': False,
+                'error': 'Sprite sheet not found'
+            }), 404
+        image = sheets[int(sheet)]
+        version = request.args.get('v')
+        if version is not None and version != image.etag:
+            response = jsonify({
+                'success': False,
+                'error': 'Sprite has been rebuilt; fetch the index again'
+            })
+            response.headers['Cache-Control'] = 'no-store'
+            return response, 409
+        
+        return cached_image_response(image, PHOTO_MAX_AGE)
+    except ValueError:
+        return jsonify({
+            'success': False,
+            'error': 'Invalid size'
+        }), 400
+    except Exception as e:
+        logger.error(f"Error getting photo sprite image: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/directory-index/status')
+def get_directory_index_status():
+    """Get freshness and size of the in-memory directory index"""
+    return jsonify({
+        'success': True,
+        'enabled': DIRECTORY_INDEX_ENABLED,
+        'data': directory_index.status()
+    })
+
+@app.route('/api/cache-stats')
+def get_cache_stats():
+    """Get hit/miss counters for the backend caches"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'geocode': geocode_cache.stats(),
+            'locations': location_store.stats(),
+            'photos': photo_cache.stats(),
+            'hierarchy': hierarchy_cache.stats(),
+            'team_contexts': team_context_store.stats(),
+            'spatial_indexes': spatial_indexes.stats(),
+            'cluster_indexes': cluster_indexes.stats()
+        }
+    })
+
+@app.route('/api/location-store/invalidate', methods=['POST'])
+def invalidate_location_store():
+    """Drop stored user locations so they are resolved again on the next map load
+    
+    Body: {"userIds": [...]} and/or {"locationTypes": [...]} to narrow the
+    invalidation, or {"all": true} to clear the whole store.
+    """
+    try:
+        data = request.get_json(silent=True) or {}
+        user_ids = data.get('userIds')
+        location_types = data.get('locationTypes')
+        if user_ids is None and location_types is None and not data.get('all'):
+            return jsonify({
+                'success': False,
+                'error': 'Provide userIds, locationTypes or all: true'
+            }), 400
+        if any(value is not None and not (isinstance(value, list) and all(isinstance(item, str) for item in value))
+               for value in (user_ids, location_types)):
+            return jsonify({
+                'success': False,
+                'error': 'userIds and locationTypes must be lists of strings'
+            }), 400
+        
+        removed = location_store.invalidate(user_ids, location_types)
+        return jsonify({
+            'success': True,
+            'data': {'invalidated': removed}
+        })
+    except Exception as e:
+        logger.error(f"Error invalidating location store: {e}")
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/metrics')
+def get_metrics():
+    """Prometheus metrics: outbound call counts and latency histograms, API request latency and phases"""
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/health')
 def health_check():
     """Health check endpoint"""
@@ -540,10 +1878,60 @@ def test_auth():
             'error': str(e)
         }), 500
 
+def resolve_chat_provider(provider):
+    """Return (provider, available_providers), falling back to the first configured provider"""
+    available_providers = llm_service.get_available_providers()
+    
+    # If requested provider is not available, use the first available or fallback to simulation
+    if provider not in available_providers and available_providers:
+        provider = available_providers[0]
+        logger.info(f"Requested provider not available, using {provider}")
+    elif not available_providers:
+        logger.info("No LLM providers configured, using simulated responses")
+    
+    return provider, available_providers
+
+def resolve_chat_team_data(data):
+    """Return (team_data, team_context_id) for a chat request body.
+    
+    teamContextId (from /api/map-data) is looked up in the server-side store;
+    teamData is only used when no id is given or the id is unknown here.
+    team_data is None when the id is unknown and no roster was sent.
+    """
+    team_context_id = data.get('teamContextId')
+    if team_context_id:
+        team_data = team_context_store.get(team_context_id)
+        if team_data is not None:
+            return team_data, team_context_id
+        if 'teamData' not in data:
+            return None, None
+        # Another worker issued the id; keep the resent roster so the next message finds it here
+        return data['teamData'], team_context_store.put(data['teamData'])
+    return data.get('teamData', []), None
+
+def prepare_chat(team_data, team_context_id, mode):
+    """Return (system_prompt, prompt_info, tools) for a chat; tools is None in prompt mode.
+    
+    Done on the request thread rather than the event loop. Prompts are cached by
+    team-data hash, and tool indexes by team-context id.
+    """
+    if mode == 'tools':
+        key = team_context_id or team_context_store.put(team_data)
+        tools = team_tools.get_or_build(key, lambda: TeamQueryTools(
+            team_data, location_service.geocode_address, spatial_indexes.get_or_build(key, lambda: team_data),
+            offline_locator.windows_zones))
+        system_prompt, prompt_info = llm_service.build_tools_system_prompt(tools.summary())
+        return system_prompt, prompt_info, tools
+    
+    system_prompt, prompt_info = llm_service.build_system_prompt(team_data, team_context_id)
+    return system_prompt, prompt_info, None
+
 @app.route('/api/chat', methods=['POST'])
 def chat_with_llm():
     """
-    Endpoint for chatting with LLM about team location data
+    Endpoint for chatting with LLM about team location data.
+    mode 'prompt' puts a compact roster in the prompt; mode 'tools' lets the
+    model call team query tools instead, so the prompt size stays fixed.
     """
     try:
         data = request.get_json()
@@ -551,29 +1939,39 @@ def chat_with_llm():
             return jsonify({'error': 'No data provided'}), 400
         
         user_query = data.get('userQuery', '')
-        team_data = data.get('teamData', [])
         provider = data.get('provider', 'openai')
+        mode = data.get('mode', LLM_CHAT_MODE)
         
         if not user_query:
             return jsonify({'error': 'No user query provided'}), 400
+        if mode not in CHAT_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(CHAT_MODES)}"}), 400
         
-        # Get available providers
-        available_providers = llm_service.get_available_providers()
+        team_data, team_context_id = resolve_chat_team_data(data)
+        if team_data is None:
+            return jsonify({
+                'error': 'Team context not found or expired; resend teamData',
+                'code': 'team_context_expired'
+            }), 404
         
-        # If requested provider is not available, use the first available or fallback to simulation
-        if provider not in available_providers and available_providers:
-            provider = available_providers[0]
-            logger.info(f"Requested provider not available, using {provider}")
-        elif not available_providers:
-            logger.info("No LLM providers configured, using simulated responses")
+        provider, available_providers = resolve_chat_provider(provider)
+        system_prompt, prompt_info, tools = prepare_chat(team_data, team_context_id, mode)
         
-        # Get response from LLM service (this handles async internally)
-        response_text = asyncio.run(llm_service.chat_completion(provider, user_query, team_data))
+        # Run on the shared event loop so the AsyncOpenAI connection pool is reused across requests
+        tool_calls = [] if tools else None
+        with timed_phase('llm'):
+            if tools:
+                response_text = async_runtime.run(llm_service.chat_with_tools(user_query, tools, system_prompt, tool_calls))
+            else:
+                response_text = async_runtime.run(llm_service.chat_completion(provider, user_query, team_data, system_prompt))
         
         return jsonify({
             'response': response_text,
             'provider': provider,
             'available_providers': available_providers,
+            'mode': mode,
+            'prompt': prompt_info,
+            'tool_calls': tool_calls,
             'timestamp': str(datetime.now())
         })
         
@@ -581,6 +1979,80 @@ def chat_with_llm():
         logger.error(f"Error in chat endpoint: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/chat/stream', methods=['POST'])
+def chat_with_llm_stream():
+    """
+    Streaming variant of /api/chat (same body, including teamContextId and mode):
+    Server-Sent Events with one `delta` event per completion chunk, then a `done`
+    event with provider, timing and tool-call metadata (or an `error` event if
+    the completion fails part-way)
+    """
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        user_query = data.get('userQuery', '')
+        provider = data.get('provider', 'openai')
+        mode = data.get('mode', LLM_CHAT_MODE)
+        
+        if not user_query:
+            return jsonify({'error': 'No user query provided'}), 400
+        if mode not in CHAT_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(CHAT_MODES)}"}), 400
+        
+        team_data, team_context_id = resolve_chat_team_data(data)
+        if team_data is None:
+            return jsonify({
+                'error': 'Team context not found or expired; resend teamData',
+                'code': 'team_context_expired'
+            }), 404
+        
+        provider, available_providers = resolve_chat_provider(provider)
+        system_prompt, prompt_info, tools = prepare_chat(team_data, team_context_id, mode)
+    except Exception as e:
+        logger.error(f"Error in chat stream endpoint: {e}")
+        return jsonify({'error': str(e)}), 500
+    
+    def generate():
+        started = time.perf_counter()
+        first_token_ms = None
+        chunks = 0
+        characters = 0
+        tool_calls = [] if tools else None
+        if tools:
+            completion = llm_service.stream_chat_with_tools(user_query, tools, system_prompt, tool_calls)
+        else:
+            completion = llm_service.stream_chat_completion(provider, user_query, team_data, system_prompt)
+        try:
+            for delta in async_runtime.iterate(completion):
+                if first_token_ms is None:
+                    first_token_ms = round((time.perf_counter() - started) * 1000, 1)
+                chunks += 1
+                characters += len(delta)
+                yield sse_event('delta', {'content': delta})
+        except Exception as e:
+            logger.error(f"Error in chat stream endpoint: {e}")
+            yield sse_event('error', {'error': str(e)})
+            return
+        
+        yield sse_event('done', {
+            'provider': provider,
+            'available_providers': available_providers,
+            'mode': mode,
+            'prompt': prompt_info,
+            'tool_calls': tool_calls,
+            'timestamp': str(datetime.now()),
+            'first_token_ms': first_token_ms,
+            'total_ms': round((time.perf_counter() - started) * 1000, 1),
+            'chunks': chunks,
+            'characters': characters
+        })
+    
+    # Ask proxies not to buffer so each delta reaches the browser as soon as it is generated
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
 @app.route('/api/chat/providers', methods=['GET'])
 def get_llm_providers():
     """
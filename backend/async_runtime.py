@@ -0,0 +1,77 @@
+"""
+Async Runtime Module
+A background event loop that multiplexes outbound Graph, Maps and OpenAI I/O for request threads
+"""
+
+import asyncio
+import threading
+import logging
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Iterator, Optional
+
+import httpx
+
+from telemetry import instrumented_async_transport
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncRuntime:
+    """One event loop thread plus a pooled httpx.AsyncClient shared by the whole process.
+
+    Flask request threads hand coroutines to the loop with run() and block only
+    on the result, so fanning a request out into many slow outbound calls costs
+    sockets from a shared pool rather than a worker thread per call. Async
+    clients (httpx, AsyncOpenAI) bind their connection pools to the loop they
+    first run on, which is why everything goes through this one loop instead of
+    a fresh asyncio.run() per request.
+    """
+
+    def __init__(self, max_connections: int = 100, max_keepalive: int = 20, timeout: float = 30.0):
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self._run_loop, name='async-io', daemon=True)
+        self._thread.start()
+        self.http = httpx.AsyncClient(
+            transport=instrumented_async_transport(
+                httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_keepalive)),
+            timeout=timeout
+        )
+        logger.info(f"Async I/O loop started with up to {max_connections} pooled connections")
+
+    def _run_loop(self):
+        asyncio.set_event_loop(self._loop)
+        self._loop.run_forever()
+
+    def submit(self, coro: Awaitable[Any]) -> Future:
+        """Schedule a coroutine on the loop and return a concurrent.futures.Future for it"""
+        return asyncio.run_coroutine_threadsafe(coro, self._loop)
+
+    def run(self, coro: Awaitable[Any], timeout: Optional[float] = None) -> Any:
+        """Run a coroutine on the loop and block the calling thread until it finishes"""
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("AsyncRuntime.run() called from the event loop thread; await the coroutine instead")
+        return self.submit(coro).result(timeout)
+
+    def iterate(self, agen: AsyncIterator[Any]) -> Iterator[Any]:
+        """Drive an async generator on the loop, yielding each item to the calling thread as it arrives"""
+        async def await_(awaitable):
+            # run_coroutine_threadsafe only accepts coroutines, not __anext__()/aclose() awaitables
+            return await awaitable
+
+        try:
+            while True:
+                try:
+                    yield self.run(await_(agen.__anext__()))
+                except StopAsyncIteration:
+                    return
+        finally:
+            # Also runs when the consumer stops early (e.g. the client disconnected)
+            self.run(await_(agen.aclose()))
+
+    def close(self):
+        """Close the shared HTTP client and stop the loop"""
+        try:
+            self.run(self.http.aclose(), timeout=5)
+        except Exception as e:
+            logger.warning(f"Error closing async HTTP client: {e}")
+        self._loop.call_soon_threadsafe(self._loop.stop)
@@ -0,0 +1,270 @@
+"""
+Benchmark Module
+Drives the backend against the local stand-ins in mock_graph_server.py over synthetic orgs
+and reports latency percentiles, throughput and outbound calls as JSON
+
+Usage:
+    python benchmark.py --users 10,1000,10000 --fanout 4,20 --output results.json
+    python benchmark.py --users 1000 --latency-ms 30 --throttle-rate 0.05 --compare results.json
+
+Each scenario (org size x fan-out) runs in a fresh process with empty caches. Workloads run
+in the order given, so later ones see the caches earlier ones filled, as in a real session;
+the first request of each workload is reported separately as cold_ms.
+"""
+
+import argparse
+import json
+import logging
+import os
+import platform
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import requests
+from werkzeug.serving import make_server
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_EMAIL = 'user0@contoso.example'
+WORKLOADS = ('org_hierarchy', 'map_data', 'user_photo', 'chat')
+CHAT_QUERY = 'Which countries have the most team members?'
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _serve(wsgi_app, port: int):
+    server = make_server('127.0.0.1', port, wsgi_app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def summarize(latencies_ms: List[float], elapsed_s: float, errors: int) -> Dict[str, Any]:
+    """Percentiles and throughput of one workload's timed requests"""
+    latencies = np.array(latencies_ms, dtype=np.float64)
+    if not len(latencies):
+        return {'requests': 0, 'errors': errors}
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'p50_ms': round(float(p50), 2),
+        'p95_ms': round(float(p95), 2),
+        'p99_ms': round(float(p99), 2),
+        'mean_ms': round(float(latencies.mean()), 2),
+        'max_ms': round(float(latencies.max()), 2),
+        'throughput_rps': round(len(latencies) / elapsed_s, 2) if elapsed_s else None
+    }
+
+
+def run_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Run every workload of one scenario in this process; call only once per process"""
+    from mock_graph_server import create_app
+
+    mock_port, app_port = _free_port(), _free_port()
+    mock_url = f'http://127.0.0.1:{mock_port}'
+    workdir = tempfile.mkdtemp(prefix='whereat-bench-')
+    # The backend reads its configuration at import time, so it is set before the import below
+    os.environ.update({
+        'AZURE_TENANT_ID': 'benchmark', 'AZURE_CLIENT_ID': 'benchmark', 'AZURE_CLIENT_SECRET': 'benchmark',
+        'AZURE_LOGIN_BASE_URL': mock_url,
+        'GRAPH_API_BASE_URL': f'{mock_url}/v1.0',
+        'AZURE_MAPS_BASE_URL': mock_url, 'AZURE_MAPS_API_KEY': 'benchmark',
+        'AZURE_OPENAI_ENDPOINT': f'{mock_url}/openai', 'AZURE_OPENAI_API_KEY': 'benchmark',
+        'AZURE_OPENAI_DEPLOYMENT': 'mock', 'AZURE_OPENAI_API_VERSION': '2024-06-01',
+        'GEOCODE_CACHE_PATH': os.path.join(workdir, 'geocode_cache.sqlite3'),
+        'LOCATION_STORE_PATH': os.path.join(workdir, 'location_store.sqlite3'),
+        'PHOTO_CACHE_DIR': os.path.join(workdir, 'photo_store'),
+    })
+    os.environ.update({key: str(value) for key, value in scenario.get('env', {}).items()})
+
+    mock = create_app(scenario['users'], scenario['fanout'], scenario['latency_ms'], throttle_rate=scenario['throttle_rate'],
+                      maps_latency_ms=scenario['maps_latency_ms'], openai_latency_ms=scenario['openai_latency_ms'])
+    mock_server = _serve(mock, mock_port)
+
+    if not scenario.get('verbose'):
+        # Both in-process servers log every request at INFO, Graph and Maps stand-in calls included,
+        # which would otherwise dominate the output (and the timings)
+        logging.disable(logging.INFO)
+    import app as backend
+    app_server = _serve(backend.app, app_port)
+    base_url = f'http://127.0.0.1:{app_port}'
+
+    local = threading.local()
+    rng = random.Random(scenario['seed'])
+    user_ids = [f"00000000-0000-0000-0000-{index:012d}" for index in range(scenario['users'])]
+    context = {}
+
+    def session():
+        if not hasattr(local, 'session'):
+            local.session = requests.Session()
+        return local.session
+
+    def team_context_id():
+        if 'team_context_id' not in context:
+            response = session().get(f'{base_url}/api/map-data/{ROOT_EMAIL}', timeout=600)
+            context['team_context_id'] = response.json().get('team_context_id')
+        return context['team_context_id']
+
+    def request_for(workload):
+        if workload == 'org_hierarchy':
+            return lambda: session().get(f'{base_url}/api/org-hierarchy/{ROOT_EMAIL}', timeout=600)
+        if workload == 'map_data':
+            return lambda: session().get(f'{base_url}/api/map-data/{ROOT_EMAIL}', timeout=600)
+        if workload == 'user_photo':
+            return lambda: session().get(f'{base_url}/api/user-photo/{rng.choice(user_ids)}?size=64', timeout=60)
+        body = {'userQuery': CHAT_QUERY, 'teamContextId': team_context_id(), 'provider': 'azure'}
+        return lambda: session().post(f'{base_url}/api/chat', json=body, timeout=120)
+
+    def timed(workload, send):
+        started = time.perf_counter()
+        try:
+            status = send().status_code
+            # A missing photo is a valid answer; anything else outside 2xx/304 counts as an error
+            ok = status < 400 or (workload == 'user_photo' and status == 404)
+        except requests.RequestException:
+            ok = False
+        return (time.perf_counter() - started) * 1000, ok
+
+    results = {}
+    for workload in scenario['workloads']:
+        send = request_for(workload)
+        mock.call_counts.clear()
+        cold_ms, cold_ok = timed(workload, send)
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=scenario['concurrency']) as executor:
+            timings = list(executor.map(lambda _: timed(workload, send), range(scenario['iterations'])))
+        elapsed = time.perf_counter() - started
+
+        latencies = [latency for latency, ok in timings]
+        errors = sum(1 for latency, ok in timings if not ok) + (0 if cold_ok else 1)
+        outbound = dict(mock.call_counts)
+        # Items inside a $batch are not separate HTTP calls; they are reported but not counted
+        calls = sum(count for service, count in outbound.items() if service != 'graph_batch_items')
+        results[workload] = dict(summarize(latencies, elapsed, errors),
+                                 cold_ms=round(cold_ms, 2),
+                                 concurrency=scenario['concurrency'],
+                                 outbound_calls=outbound,
+                                 outbound_per_request=round(calls / (len(timings) + 1), 2))
+
+    app_server.shutdown()
+    mock_server.shutdown()
+    shutil.rmtree(workdir, ignore_errors=True)
+    return {
+        'name': scenario['name'],
+        'users': scenario['users'],
+        'fanout': scenario['fanout'],
+        'latency_ms': scenario['latency_ms'],
+        'maps_latency_ms': scenario['maps_latency_ms'],
+        'openai_latency_ms': scenario['openai_latency_ms'],
+        'throttle_rate': scenario['throttle_rate'],
+        'workloads': results
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_summary(report: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None, file=sys.stderr):
+    previous = {scenario['name']: scenario['workloads'] for scenario in (baseline or {}).get('scenarios', [])}
+    print(f"{'scenario':<14}{'workload':<15}{'cold':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'rps':>9}{'calls/req':>11}"
+          + ('  p95 vs baseline' if baseline else ''), file=file)
+    for scenario in report['scenarios']:
+        for workload, result in scenario['workloads'].items():
+            line = (f"{scenario['name']:<14}{workload:<15}{result['cold_ms']:>9.1f}{result.get('p50_ms', 0):>9.1f}"
+                    f"{result.get('p95_ms', 0):>9.1f}{result.get('p99_ms', 0):>9.1f}"
+                    f"{result.get('throughput_rps') or 0:>9.1f}{result['outbound_per_request']:>11.2f}")
+            old = previous.get(scenario['name'], {}).get(workload)
+            if old and old.get('p95_ms'):
+                line += f"  {result.get('p95_ms', 0) / old['p95_ms']:.2f}x ({old['p95_ms']:.1f}ms)"
+            if result['errors']:
+                line += f"  [{result['errors']} errors]"
+            print(line, file=file)
+
+
+def _int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the backend against local Graph, Azure Maps and OpenAI stand-ins')
+    parser.add_argument('--users', type=_int_list, default=[10, 1000, 10000], help='comma-separated org sizes')
+    parser.add_argument('--fanout', type=_int_list, default=[8], help='comma-separated direct reports per manager')
+    parser.add_argument('--workloads', default=','.join(WORKLOADS), help=f"comma-separated subset of {', '.join(WORKLOADS)}")
+    parser.add_argument('--iterations', type=int, default=20, help='timed requests per workload after the cold one')
+    parser.add_argument('--concurrency', type=int, default=4, help='requests in flight per workload')
+    parser.add_argument('--latency-ms', type=int, default=0, help='added latency per login/Graph request')
+    parser.add_argument('--maps-latency-ms', type=int, default=0, help='added latency per Azure Maps request')
+    parser.add_argument('--openai-latency-ms', type=int, default=0, help='added latency per chat completion')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of Graph requests answered with 429')
+    parser.add_argument('--env', action='append', default=[], metavar='NAME=VALUE',
+                        help='backend setting for every scenario, e.g. --env ASYNC_IO_ENABLED=true')
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help='write the JSON report here (default: stdout; the summary table goes to stderr)')
+    parser.add_argument('--compare', help='earlier JSON report to compare p95 latencies against')
+    parser.add_argument('--verbose', action='store_true', help='keep the backend INFO logs')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        print(json.dumps(run_scenario(json.loads(args.run_scenario))))
+        sys.exit(0)
+
+    workloads = [workload for workload in args.workloads.split(',') if workload]
+    unknown = set(workloads) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"unknown workloads: {', '.join(sorted(unknown))}")
+
+    report = {
+        'commit': _git_commit(),
+        'created': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'settings': dict(arg.split('=', 1) for arg in args.env),
+        'scenarios': []
+    }
+    for users in args.users:
+        for fanout in args.fanout:
+            scenario = {
+                'name': f'{users}u-f{fanout}', 'users': users, 'fanout': fanout, 'workloads': workloads,
+                'iterations': args.iterations, 'concurrency': args.concurrency,
+                'latency_ms': args.latency_ms, 'maps_latency_ms': args.maps_latency_ms,
+                'openai_latency_ms': args.openai_latency_ms, 'throttle_rate': args.throttle_rate,
+                'env': report['settings'], 'seed': args.seed, 'verbose': args.verbose
+            }
+            print(f"Running {scenario['name']}...", file=sys.stderr)
+            child = subprocess.run([sys.executable, os.path.abspath(__file__), '--run-scenario', json.dumps(scenario)],
+                                   cwd=BACKEND_DIR, stdout=subprocess.PIPE, text=True)
+            if child.returncode != 0:
+                print(f"Scenario {scenario['name']} failed with exit code {child.returncode}", file=sys.stderr)
+                continue
+            report['scenarios'].append(json.loads(child.stdout.strip().splitlines()[-1]))
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_summary(report, baseline)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+    else:
+        print(json.dumps(report, indent=2))
@@ -0,0 +1,231 @@
+"""
+Cluster Index Module
+Hierarchical multi-zoom clusters of team members so the map can fetch only what a viewport shows
+"""
+
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# 2**CELL_BITS cluster cells across each 512px map tile, i.e. cells of 64px like the old clusterRadius of 60
+CELL_BITS = 3
+# cluster_id packs (cell code << ZOOM_BITS) | zoom and must stay below 2**53 for JavaScript
+ZOOM_BITS = 5
+MAX_SUPPORTED_ZOOM = 20
+MAX_LATITUDE = 85.05112878
+
+
+def _spread_bits(values: np.ndarray) -> np.ndarray:
+    """Insert a zero bit between each of the low 32 bits (one half of a Morton code)"""
+    v = values.astype(np.uint64)
+    for shift, mask in ((16, 0x0000FFFF0000FFFF), (8, 0x00FF00FF00FF00FF), (4, 0x0F0F0F0F0F0F0F0F),
+                        (2, 0x3333333333333333), (1, 0x5555555555555555)):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def project(lats: np.ndarray, lons: np.ndarray):
+    """Web Mercator coordinates in [0, 1], x eastwards and y southwards"""
+    x = np.mod(lons + 180, 360) / 360
+    sin_lat = np.sin(np.radians(np.clip(lats, -MAX_LATITUDE, MAX_LATITUDE)))
+    y = 0.5 - np.log((1 + sin_lat) / (1 - sin_lat)) / (4 * math.pi)
+    return x, np.clip(y, 0, 1)
+
+
+def unproject(x: float, y: float):
+    """(latitude, longitude) of a Web Mercator point"""
+    return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y)))), x * 360 - 180
+
+
+def _compact_member(member: Dict[str, Any]) -> Dict[str, Any]:
+    """What the map needs to draw a pin; the full record comes from leaves()"""
+    user = member.get('user') or {}
+    return {
+        'id': user.get('id'),
+        'displayName': user.get('displayName'),
+        'jobTitle': user.get('jobTitle'),
+        'location_type': member.get('location_type'),
+        'border_color': member.get('border_color')
+    }
+
+
+class ClusterIndex:
+    """Grid clusters of located members for every zoom from 0 to max_zoom, built in one pass.
+
+    Points are sorted by the Morton code of their cell at the finest zoom, so the
+    cells of every coarser zoom are prefixes of that code and each cluster is a
+    contiguous run of points. Building a zoom level is then a handful of
+    vectorized reductions, cluster members are a slice, and a cell always nests
+    inside its parent cell one zoom out, the same hierarchy supercluster builds.
+    Zooms past max_zoom return the individual points.
+    """
+
+    def __init__(self, members: List[Dict[str, Any]], max_zoom: int = 16):
+        started = time.perf_counter()
+        located = [member for member in members
+                   if (member.get('location') or {}).get('latitude') is not None
+                   and (member.get('location') or {}).get('longitude') is not None]
+
+        self.max_zoom = max(0, min(max_zoom, MAX_SUPPORTED_ZOOM))
+        self.size = len(located)
+        self.unlocated = len(members) - len(located)
+        bits = self.max_zoom + CELL_BITS
+
+        x, y = project(np.array([member['location']['latitude'] for member in located], dtype=np.float64),
+                       np.array([member['location']['longitude'] for member in located], dtype=np.float64))
+        cells = 1 << bits
+        columns = np.minimum((x * cells).astype(np.int64), cells - 1)
+        rows = np.minimum((y * cells).astype(np.int64), cells - 1)
+        codes = _spread_bits(columns) | (_spread_bits(rows) << np.uint64(1))
+
+        order = np.argsort(codes, kind='stable')
+        self.members = [located[i] for i in order]
+        self.codes = codes[order]
+        self.x, self.y = x[order], y[order]
+
+        type_names, type_index = np.unique([member.get('location_type', 'unknown') for member in self.members],
+                                           return_inverse=True)
+        self.location_types = [str(name) for name in type_names]
+        one_hot = np.zeros((self.size, len(self.location_types)), dtype=np.int64)
+        one_hot[np.arange(self.size), type_index] = 1
+
+        # levels[z] for z in 0..max_zoom are clusters; levels[max_zoom + 1] are the points themselves
+        self.levels: List[Dict[str, np.ndarray]] = []
+        for zoom in range(self.max_zoom + 2):
+            self.levels.append(self._build_level(zoom, one_hot))
+        self._set_expansion_zooms()
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def _shift(self, zoom):
+        return np.uint64(2 * max(0, self.max_zoom - zoom))
+
+    def _build_level(self, zoom, one_hot):
+        if zoom > self.max_zoom or not self.size:
+            starts = np.arange(self.size)
+            counts = np.ones(self.size, dtype=np.int64)
+            return {'code': self.codes, 'start': starts, 'count': counts, 'x': self.x, 'y': self.y,
+                    'types': one_hot}
+
+        codes = self.codes >> self._shift(zoom)
+        starts = np.flatnonzero(np.concatenate(([True], codes[1:] != codes[:-1])))
+        counts = np.diff(np.append(starts, self.size))
+        return {
+            'code': codes[starts],
+            'start': starts,
+            'count': counts,
+            'x': np.add.reduceat(self.x, starts) / counts,
+            'y': np.add.reduceat(self.y, starts) / counts,
+            'types': np.add.reduceat(one_hot, starts, axis=0)
+        }
+
+    def _set_expansion_zooms(self):
+        """The zoom at which each cluster first splits, found bottom-up from the finest level"""
+        finest = self.levels[self.max_zoom]
+        finest['expansion'] = np.full(len(finest['code']), self.max_zoom + 1, dtype=np.int64)
+        for zoom in range(self.max_zoom - 1, -1, -1):
+            level, child = self.levels[zoom], self.levels[zoom + 1]
+            parents = np.searchsorted(level['code'], child['code'] >> np.uint64(2))
+            children = np.bincount(parents, minlength=len(level['code']))
+            # A cluster with a single child cell splits wherever that child does
+            inherited = np.empty(len(level['code']), dtype=np.int64)
+            inherited[parents] = child['expansion']
+            level['expansion'] = np.where(children > 1, zoom + 1, inherited)
+
+    def query(self, west: float, south: float, east: float, north: float, zoom: float) -> List[Dict[str, Any]]:
+        """Clusters and single points at zoom whose position lies inside the bounding box (degrees)"""
+        zoom = max(0, min(int(math.floor(zoom)), self.max_zoom + 1))
+        level = self.levels[zoom]
+        if not self.size:
+            return []
+
+        _, (y_north, y_south) = project(np.array([north, south]), np.array([west, east]))
+        inside = (level['y'] >= y_north) & (level['y'] <= y_south)
+        width = (east - west) % 360 if east - west < 360 else 360
+        if width < 360:
+            x_west = ((west + 180) % 360) / 360
+            x_east = x_west + width / 360
+            # A box crossing the antimeridian wraps around to the start of the x range
+            inside &= (((level['x'] >= x_west) & (level['x'] <= x_east)) if x_east <= 1
+                       else ((level['x'] >= x_west) | (level['x'] <= x_east - 1)))
+
+        features = []
+        for position in np.flatnonzero(inside):
+            count = int(level['count'][position])
+            # A point's cell id works with leaves() too, which is how the map loads its full record
+            cluster_id = (int(level['code'][position]) << ZOOM_BITS) | zoom
+            if count == 1:
+                member = self.members[int(level['start'][position])]
+                features.append(dict(_compact_member(member), type='point', cluster_id=cluster_id,
+                                     latitude=member['location']['latitude'],
+                                     longitude=member['location']['longitude']))
+                continue
+            latitude, longitude = unproject(float(level['x'][position]), float(level['y'][position]))
+            features.append({
+                'type': 'cluster',
+                'cluster_id': cluster_id,
+                'count': count,
+                'latitude': round(latitude, 6),
+                'longitude': round(longitude, 6),
+                'expansion_zoom': int(level['expansion'][position]),
+                'location_types': {name: int(total) for name, total in
+                                   zip(self.location_types, level['types'][position]) if total}
+            })
+        return features
+
+    def leaves(self, cluster_id: int, limit: int = 100, offset: int = 0) -> Optional[Dict[str, Any]]:
+        """Full map-data records of the members in a cluster, or None if the id is not from this index"""
+        zoom, code = cluster_id & ((1 << ZOOM_BITS) - 1), cluster_id >> ZOOM_BITS
+        if zoom > self.max_zoom + 1:
+            return None
+        shift = int(self._shift(zoom))
+        low = int(np.searchsorted(self.codes, np.uint64(code << shift), side='left'))
+        high = int(np.searchsorted(self.codes, np.uint64((code + 1) << shift), side='left'))
+        if high <= low:
+            return None
+        return {
+            'total': high - low,
+            'members': self.members[low + offset:min(high, low + offset + limit)]
+        }
+
+
+class ClusterIndexCache:
+    """Small LRU of cluster indexes keyed by team-context id (the content hash of the roster)"""
+
+    def __init__(self, max_entries: int = 16, max_zoom: int = 16):
+        self.max_entries = max_entries
+        self.max_zoom = max_zoom
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, ClusterIndex]" = OrderedDict()
+        self._stats = {'hits': 0, 'builds': 0}
+
+    def get_or_build(self, key: str, load_members: Callable[[], List[Dict[str, Any]]]) -> ClusterIndex:
+        with self._lock:
+            index = self._indexes.get(key)
+            if index:
+                self._indexes.move_to_end(key)
+                self._stats['hits'] += 1
+                return index
+
+        index = ClusterIndex(load_members(), self.max_zoom)
+        logger.info(f"Built cluster index over {index.size} located members, zooms 0-{index.max_zoom}, "
+                    f"in {index.build_ms}ms")
+        with self._lock:
+            self._indexes[key] = index
+            self._stats['builds'] += 1
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['indexes'] = len(self._indexes)
+            stats['members'] = sum(index.size for index in self._indexes.values())
+        return stats
@@ -0,0 +1,274 @@
+"""
+Directory Index Module
+Keeps an in-memory copy of the tenant's users and reporting lines, refreshed with Graph delta queries
+"""
+
+import threading
+import time
+import logging
+from datetime import datetime, timezone
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class DirectoryIndex:
+    """id -> user records, manager -> reports adjacency and email -> id lookup for the whole tenant.
+
+    The index bootstraps from a full /users listing with the manager expanded,
+    then applies incremental changes from /users/delta on a background thread.
+    User dicts are replaced rather than mutated, so hierarchies handed out to
+    requests are never modified underneath them.
+    """
+
+    def __init__(self, graph_client, select_fields: str, refresh_interval: int = 300):
+        self.graph_client = graph_client
+        self.select_fields = select_fields
+        self.refresh_interval = refresh_interval
+        self._lock = threading.RLock()
+        self._thread = None
+
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.manager_of: Dict[str, str] = {}
+        self.reports: Dict[str, Dict[str, None]] = {}
+        self.email_to_id: Dict[str, str] = {}
+        # Subtree sizes per user, computed on first use after each change
+        self._descendants: Optional[Dict[str, int]] = None
+
+        self.delta_link: Optional[str] = None
+        self.ready = False
+        self.bootstrapped_at: Optional[float] = None
+        self.last_delta_at: Optional[float] = None
+        self.last_delta_changes = 0
+        self.last_error: Optional[str] = None
+
+    def start(self):
+        """Bootstrap and keep the index fresh on a daemon thread"""
+        if self._thread:
+            return
+        self._thread = threading.Thread(target=self._run, name='directory-index', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                if not self.ready or not self.delta_link:
+                    self.bootstrap()
+                else:
+                    self.apply_delta()
+            except Exception as e:
+                self.last_error = str(e)
+                logger.error(f"Directory index refresh failed: {e}")
+            time.sleep(self.refresh_interval)
+
+    def _fetch_all_pages(self, endpoint, params):
+        """Yield each page of a Graph collection, following @odata.nextLink"""
+        page = self.graph_client.make_graph_request(endpoint, params)
+        while page is not None:
+            yield page
+            next_link = page.get('@odata.nextLink')
+            if not next_link:
+                return
+            page = self.graph_client.follow_next_link(next_link)
+        raise RuntimeError(f"Graph request failed while paging {endpoint}")
+
+    def bootstrap(self):
+        """Load every user and their manager, then record a delta token for later refreshes"""
+        started = time.perf_counter()
+
+        # Take the delta token first so changes made during the full listing are replayed later
+        latest = self.graph_client.make_graph_request('/users/delta', {
+            '$deltatoken': 'latest',
+            '$select': f"{self.select_fields},manager"
+        })
+        delta_link = latest.get('@odata.deltaLink') if latest else None
+
+        users, manager_of, reports, email_to_id = {}, {}, {}, {}
+        pages = self._fetch_all_pages('/users', {
+            '$select': self.select_fields,
+            '$expand': 'manager($select=id)',
+            '$top': 999
+        })
+        for page in pages:
+            for record in page.get('value', []):
+                manager = record.pop('manager', None)
+                users[record['id']] = record
+                self._index_email(email_to_id, record)
+                if manager and manager.get('id'):
+                    manager_of[record['id']] = manager['id']
+                    reports.setdefault(manager['id'], {})[record['id']] = None
+
+        with self._lock:
+            self.users, self.manager_of, self.reports, self.email_to_id = users, manager_of, reports, email_to_id
+            self._descendants = None
+            self.delta_link = delta_link
+            self.ready = True
+            self.bootstrapped_at = time.time()
+            self.last_error = None
+
+        logger.info(f"Directory index bootstrapped with {len(users)} users in "
+                    f"{time.perf_counter() - started:.1f}s")
+
+    def apply_delta(self):
+        """Apply changes from /users/delta since the last delta link"""
+        changes = 0
+        link = self.delta_link
+        while link:
+            page = self.graph_client.follow_next_link(link)
+            if page is None:
+                # Expired or invalid tokens surface as errors; start over from a full listing
+                logger.warning("Directory delta query failed, re-bootstrapping index")
+                self.bootstrap()
+                return
+
+            with self._lock:
+                for record in page.get('value', []):
+                    self._apply_change(record)
+                    changes += 1
+
+            link = page.get('@odata.nextLink')
+            if not link:
+                with self._lock:
+                    self.delta_link = page.get('@odata.deltaLink', self.delta_link)
+
+        self.last_delta_at = time.time()
+        self.last_delta_changes = changes
+        self.last_error = None
+        if changes:
+            logger.info(f"Directory index applied {changes} delta changes")
+
+    def _apply_change(self, record):
+        """Merge one delta record into the index (caller holds the lock)"""
+        user_id = record.get('id')
+        if not user_id:
+            return
+        self._descendants = None
+
+        if '@removed' in record:
+            self._remove_user(user_id)
+            return
+
+        manager_delta = record.pop('manager@delta', None)
+        record.pop('manager', None)
+        previous = self.users.get(user_id, {})
+        merged = dict(previous)
+        merged.update({k: v for k, v in record.items() if not k.startswith('@')})
+        for key in ('mail', 'userPrincipalName'):
+            if previous.get(key) and self.email_to_id.get(previous[key].lower()) == user_id:
+                del self.email_to_id[previous[key].lower()]
+        self.users[user_id] = merged
+        self._index_email(self.email_to_id, merged)
+
+        if manager_delta is not None:
+            self._set_manager(user_id, None)
+            for manager in manager_delta:
+                if manager.get('id') and '@removed' not in manager:
+                    self._set_manager(user_id, manager['id'])
+
+    def _set_manager(self, user_id, manager_id):
+        old_manager = self.manager_of.pop(user_id, None)
+        if old_manager:
+            self.reports.get(old_manager, {}).pop(user_id, None)
+        if manager_id:
+            self.manager_of[user_id] = manager_id
+            self.reports.setdefault(manager_id, {})[user_id] = None
+
+    def _remove_user(self, user_id):
+        user = self.users.pop(user_id, None)
+        if user:
+            for key in ('mail', 'userPrincipalName'):
+                if user.get(key) and self.email_to_id.get(user[key].lower()) == user_id:
+                    del self.email_to_id[user[key].lower()]
+        self._set_manager(user_id, None)
+        for report_id in list(self.reports.pop(user_id, {})):
+            self.manager_of.pop(report_id, None)
+
+    @staticmethod
+    def _index_email(email_to_id, user):
+        for key in ('mail', 'userPrincipalName'):
+            if user.get(key):
+                email_to_id[user[key].lower()] = user['id']
+
+    def lookup_id(self, email_or_id: str) -> Optional[str]:
+        """Resolve an email, UPN or user id to a user id"""
+        if email_or_id in self.users:
+            return email_or_id
+        return self.email_to_id.get(email_or_id.lower())
+
+    def build_hierarchy(self, root_email: str, max_depth: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Build the nested {'user', 'children'} hierarchy below root_email from memory.
+
+        max_depth, if given, stops after that many levels of reports.
+        """
+        with self._lock:
+            root_id = self.lookup_id(root_email)
+            if not root_id:
+                return None
+
+            root = {'user': self.users[root_id], 'children': []}
+            visited = {root_id}
+            level = [root]
+            depth = 0
+            while level and (max_depth is None or depth < max_depth):
+                depth += 1
+                next_level = []
+                for node in level:
+                    for report_id in self.reports.get(node['user']['id'], {}):
+                        if report_id in visited or report_id not in self.users:
+                            continue
+                        visited.add(report_id)
+                        child = {'user': self.users[report_id], 'children': []}
+                        node['children'].append(child)
+                        next_level.append(child)
+                level = next_level
+            return root
+
+    def _descendant_counts(self) -> Dict[str, int]:
+        """Number of people below every user, managers counted after all their reports (caller holds the lock)"""
+        if self._descendants is None:
+            level = [user_id for user_id in self.users if self.manager_of.get(user_id) not in self.users]
+            visited = set(level)
+            order = []
+            while level:
+                order.extend(level)
+                next_level = []
+                for user_id in level:
+                    for report_id in self.reports.get(user_id, {}):
+                        if report_id in self.users and report_id not in visited:
+                            visited.add(report_id)
+                            next_level.append(report_id)
+                level = next_level
+
+            counts = dict.fromkeys(self.users, 0)
+            for user_id in reversed(order):
+                manager_id = self.manager_of.get(user_id)
+                if manager_id in counts:
+                    counts[manager_id] += counts[user_id] + 1
+            self._descendants = counts
+        return self._descendants
+
+    def report_counts(self, user_id: str) -> Tuple[int, int]:
+        """(direct reports, everyone below) for a user id"""
+        with self._lock:
+            direct = sum(1 for report_id in self.reports.get(user_id, {}) if report_id in self.users)
+            return direct, self._descendant_counts().get(user_id, 0)
+
+    def status(self) -> Dict[str, Any]:
+        """Freshness and size of the index"""
+        def iso(ts):
+            return datetime.fromtimestamp(ts, timezone.utc).isoformat() if ts else None
+
+        now = time.time()
+        freshest = max(filter(None, [self.bootstrapped_at, self.last_delta_at]), default=None)
+        return {
+            'ready': self.ready,
+            'users': len(self.users),
+            'reporting_lines': len(self.manager_of),
+            'managers': sum(1 for reports in self.reports.values() if reports),
+            'bootstrapped_at': iso(self.bootstrapped_at),
+            'last_delta_at': iso(self.last_delta_at),
+            'last_delta_changes': self.last_delta_changes,
+            'age_seconds': round(now - freshest, 1) if freshest else None,
+            'refresh_interval_seconds': self.refresh_interval,
+            'last_error': self.last_error
+        }
@@ -0,0 +1,313 @@
+"""
+Gazetteer Module
+Memory-mapped offline city gazetteer and office-code table, so place-level locations resolve without Azure Maps
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import mmap
+import os
+import re
+import struct
+import unicodedata
+import logging
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# data/gazetteer.bin is built from GeoNames cities15000 (CC BY 4.0, https://www.geonames.org).
+# File layout: header | key hashes (u8, sorted) | place index per key (u4) | places | UTF-8 names.
+# Keys with the same hash are ordered most populous place first.
+MAGIC = b'GZT1'
+HEADER = struct.Struct('<4sIII16x')
+PLACE_DTYPE = np.dtype([
+    ('latitude', '<f4'), ('longitude', '<f4'), ('population', '<u4'),
+    ('name_offset', '<u4'), ('admin1_offset', '<u4'),
+    ('country', 'S2'), ('name_length', 'u1'), ('admin1_length', 'u1')
+])
+
+# Alternate names worth indexing: proper-cased Latin spellings such as "Bombay" or "Saint Louis"
+_ALTERNATE_NAME = re.compile(r"^[A-Z][A-Za-z .'\-]{2,}$")
+# What trails a site name in an officeLocation: "Redmond/B42", "London 2", "Dublin Bldg 3"
+_OFFICE_SEPARATORS = re.compile(r'[/\\#|;]')
+_OFFICE_WORDS = {'bldg', 'building', 'floor', 'fl', 'campus', 'office', 'hq', 'room', 'rm'}
+
+
+def normalize_place(text: Optional[str]) -> str:
+    """Case-, accent- and punctuation-insensitive form of a place name"""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    return ' '.join(re.sub(r'[^0-9a-z]+', ' ', text).split())
+
+
+def _key_hash(normalized: str) -> int:
+    return int.from_bytes(hashlib.blake2b(normalized.encode('utf-8'), digest_size=8).digest(), 'little')
+
+
+class Gazetteer:
+    """Read-only city gazetteer memory-mapped from a binary file built by build_gazetteer().
+
+    Opening the file maps it without reading it, so start-up is instant and
+    every worker process shares the same pages. A lookup hashes the normalized
+    name and binary-searches the sorted hash array, which takes microseconds.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, key_count, place_count, names_size = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a gazetteer file")
+
+        offset = HEADER.size
+        self.hashes = np.frombuffer(self._mmap, dtype='<u8', count=key_count, offset=offset)
+        offset += key_count * 8
+        self.key_places = np.frombuffer(self._mmap, dtype='<u4', count=key_count, offset=offset)
+        offset += key_count * 4
+        self.places = np.frombuffer(self._mmap, dtype=PLACE_DTYPE, count=place_count, offset=offset)
+        self._names_offset = offset + place_count * PLACE_DTYPE.itemsize
+        self.key_count, self.place_count = key_count, place_count
+        logger.info(f"Gazetteer mapped {place_count} places under {key_count} names from {path}")
+
+    def _text(self, offset, length):
+        start = self._names_offset + int(offset)
+        return self._mmap[start:start + int(length)].decode('utf-8')
+
+    def place(self, index: int) -> Dict[str, Any]:
+        record = self.places[index]
+        return {
+            'name': self._text(record['name_offset'], record['name_length']),
+            'admin1': self._text(record['admin1_offset'], record['admin1_length']),
+            'country': record['country'].decode('ascii'),
+            'latitude': round(float(record['latitude']), 5),
+            'longitude': round(float(record['longitude']), 5),
+            'population': int(record['population'])
+        }
+
+    def candidates(self, name: str) -> List[int]:
+        """Indexes of every place known by name, most populous first"""
+        normalized = normalize_place(name)
+        if not normalized:
+            return []
+        key = np.uint64(_key_hash(normalized))
+        low = int(np.searchsorted(self.hashes, key, side='left'))
+        high = int(np.searchsorted(self.hashes, key, side='right'))
+        return [int(index) for index in self.key_places[low:high]]
+
+    def lookup(self, name: str, country: Optional[str] = None, region: Optional[str] = None,
+               require_region: bool = False) -> Optional[Dict[str, Any]]:
+        """Most populous place called name, optionally within a country code, preferring region matches.
+
+        region is compared with the place's first-level division, by code ("WA")
+        or by name ("Washington") when the gazetteer was built with names.
+        """
+        wanted_region = normalize_place(region) if region else None
+        fallback = None
+        for index in self.candidates(name):
+            place = self.place(index)
+            if country and place['country'] != country:
+                continue
+            if not wanted_region:
+                return place
+            codes = {normalize_place(part) for part in place['admin1'].split('|')}
+            if wanted_region in codes:
+                return place
+            fallback = fallback or place
+        return None if require_region else fallback
+
+
+def load_office_locations(path: Optional[str]) -> Dict[str, Dict[str, Any]]:
+    """Read an office table (code,latitude,longitude,address CSV) keyed by normalized code"""
+    if not path or not os.path.exists(path):
+        return {}
+    offices = {}
+    with open(path, encoding='utf-8', newline='') as f:
+        for row in csv.DictReader(line for line in f if not line.startswith('#')):
+            offices[normalize_place(row['code'])] = {
+                'latitude': float(row['latitude']),
+                'longitude': float(row['longitude']),
+                'address': row.get('address') or row['code']
+            }
+    logger.info(f"Loaded {len(offices)} office locations from {path}")
+    return offices
+
+
+class LocalGeocoder:
+    """Resolves place-level strings locally: office codes, "City[, State][, Country]", bare countries.
+
+    Anything that looks like a street address (a number in the first part, or
+    more than three comma-separated parts) is left for Azure Maps.
+    """
+
+    def __init__(self, gazetteer: Optional[Gazetteer], locator, offices: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.gazetteer = gazetteer
+        self.locator = locator
+        self.offices = offices or {}
+
+    def _format(self, place):
+        country = (self.locator.region_location(place['country']) or {}).get('address', place['country'])
+        # admin1 is "code|name"; US states read best by code ("Redmond, WA"), elsewhere by name
+        admin1_code, _, admin1_name = place['admin1'].partition('|')
+        region = admin1_code if place['country'] == 'US' else admin1_name
+        return {
+            'latitude': place['latitude'],
+            'longitude': place['longitude'],
+            'address': ', '.join(part for part in (place['name'], region, country) if part)
+        }
+
+    def _site(self, text):
+        """The place part of an officeLocation: "Redmond/B42" -> "Redmond", "London 2" -> "London" """
+        site = _OFFICE_SEPARATORS.split(text, 1)[0]
+        words = site.split()
+        while words and (any(ch.isdigit() for ch in words[-1]) or words[-1].lower().strip('.') in _OFFICE_WORDS):
+            words.pop()
+        return ' '.join(words)
+
+    def resolve(self, text: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Location for a place-level string, or None to fall back to Azure Maps"""
+        if not text:
+            return None
+        office = self.offices.get(normalize_place(text))
+        if office:
+            return dict(office)
+
+        parts = [part.strip() for part in text.split(',') if part.strip()]
+        if len(parts) == 1:
+            site = self._site(parts[0])
+            office = self.offices.get(normalize_place(site))
+            if office:
+                return dict(office)
+            parts = [site] if site else []
+        if not parts or len(parts) > 3 or any(ch.isdigit() for ch in parts[0]):
+            return None
+
+        if len(parts) == 1:
+            country = self.locator.country_code(parts[0])
+            if country:
+                return self.locator.region_location(country)
+        if not self.gazetteer:
+            return None
+
+        city, rest = parts[0], parts[1:]
+        place = None
+        if len(rest) == 2:
+            country = self.locator.country_code(rest[1])
+            place = self.gazetteer.lookup(city, country, rest[0]) if country else None
+        elif len(rest) == 1:
+            # "Atlanta, GA" names a state, "Libreville, Gabon" a country; try the division first
+            place = self.gazetteer.lookup(city, region=rest[0], require_region=True)
+            if not place and self.locator.country_code(rest[0]):
+                place = self.gazetteer.lookup(city, self.locator.country_code(rest[0]))
+        else:
+            place = self.gazetteer.lookup(city)
+        return self._format(place) if place else None
+
+
+def read_geonames(path: str) -> Iterator[Dict[str, Any]]:
+    """Places from a GeoNames dump (cities15000.txt and friends) or geonamescache's cities JSON"""
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            for city in json.load(f).values():
+                yield {
+                    'names': [city['name']] + list(city.get('alternatenames') or []),
+                    'latitude': city['latitude'], 'longitude': city['longitude'],
+                    'country': city['countrycode'], 'admin1': city.get('admin1code') or '',
+                    'population': int(city.get('population') or 0)
+                }
+        return
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            columns = line.rstrip('\n').split('\t')
+            yield {
+                'names': [columns[1], columns[2]] + [name for name in columns[3].split(',') if name],
+                'latitude': float(columns[4]), 'longitude': float(columns[5]),
+                'country': columns[8], 'admin1': columns[10],
+                'population': int(columns[14] or 0)
+            }
+
+
+def read_admin1_names(path: Optional[str]) -> Dict[Tuple[str, str], str]:
+    """(country, admin1 code) -> name from GeoNames admin1CodesASCII.txt or geonamescache's us_states.json"""
+    if not path or not os.path.exists(path):
+        return {}
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            return {('US', code): state['name'] for code, state in json.load(f).items()}
+    names = {}
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            columns = line.rstrip('\n').split('\t')
+            country, _, code = columns[0].partition('.')
+            names[(country, code)] = columns[1]
+    return names
+
+
+def build_gazetteer(places: Iterable[Dict[str, Any]], admin1_names: Dict[Tuple[str, str], str],
+                    output_path: str) -> Tuple[int, int]:
+    """Write the binary gazetteer; returns (places, keys)"""
+    places = sorted(places, key=lambda place: -place['population'])
+    records = np.zeros(len(places), dtype=PLACE_DTYPE)
+    blob = bytearray()
+    interned: Dict[str, Tuple[int, int]] = {}
+
+    def intern(text):
+        if text not in interned:
+            encoded = text.encode('utf-8')[:255]
+            interned[text] = (len(blob), len(encoded))
+            blob.extend(encoded)
+        return interned[text]
+
+    hashes, key_places = [], []
+    for index, place in enumerate(places):
+        name = place['names'][0]
+        admin1 = place['admin1']
+        if (place['country'], admin1) in admin1_names:
+            admin1 = f"{admin1}|{admin1_names[(place['country'], admin1)]}"
+        records[index]['latitude'], records[index]['longitude'] = place['latitude'], place['longitude']
+        records[index]['population'] = min(place['population'], 2 ** 32 - 1)
+        records[index]['country'] = place['country'].encode('ascii')
+        records[index]['name_offset'], records[index]['name_length'] = intern(name)
+        records[index]['admin1_offset'], records[index]['admin1_length'] = intern(admin1)
+
+        keys = {normalize_place(name)}
+        keys.update(normalize_place(alternate) for alternate in place['names'][1:]
+                    if _ALTERNATE_NAME.match(alternate) and not alternate.isupper())
+        keys.discard('')
+        for key in keys:
+            hashes.append(_key_hash(key))
+            key_places.append(index)
+
+    hashes = np.array(hashes, dtype='<u8')
+    key_places = np.array(key_places, dtype='<u4')
+    # Places are numbered by descending population, so sorting by (hash, index) puts the largest first
+    order = np.lexsort((key_places, hashes))
+
+    with open(output_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(hashes), len(records), len(blob)))
+        f.write(hashes[order].tobytes())
+        f.write(key_places[order].tobytes())
+        f.write(records.tobytes())
+        f.write(bytes(blob))
+    return len(records), len(hashes)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Build the offline gazetteer from GeoNames city data')
+    parser.add_argument('cities', help='GeoNames cities dump (e.g. cities15000.txt) or geonamescache cities JSON')
+    parser.add_argument('--admin1', help='admin1CodesASCII.txt, or us_states.json (default: next to a JSON cities file)')
+    parser.add_argument('--output', default=os.path.join(DATA_DIR, 'gazetteer.bin'))
+    args = parser.parse_args()
+
+    admin1_path = args.admin1
+    if not admin1_path and args.cities.endswith('.json'):
+        admin1_path = os.path.join(os.path.dirname(args.cities), 'us_states.json')
+    place_count, key_count = build_gazetteer(read_geonames(args.cities), read_admin1_names(admin1_path), args.output)
+    print(f"Wrote {place_count} places under {key_count} names "
+          f"({os.path.getsize(args.output) / 1e6:.1f} MB) to {args.output}")
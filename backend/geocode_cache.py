@@ -0,0 +1,126 @@
+"""
+Geocode Cache Module
+Two-tier cache for Azure Maps geocoding results: an in-process LRU in front of a SQLite file
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_address(address: str) -> str:
+    """Normalize an address string so trivially different spellings share a cache key"""
+    key = unicodedata.normalize('NFKC', address).lower()
+    key = re.sub(r'\s*,\s*', ', ', key)
+    key = re.sub(r'\s+', ' ', key)
+    return key.strip(' ,.;')
+
+
+class GeocodeCache:
+    """LRU + SQLite cache of geocode results keyed by normalized address.
+
+    Successful lookups live for `ttl` seconds. Failed lookups (no match) are
+    stored as negative entries with their own, shorter `negative_ttl` so a
+    bad address is not re-billed on every map load but is retried eventually.
+    """
+
+    def __init__(self, db_path: str, memory_size: int = 4096,
+                 ttl: int = 30 * 24 * 3600, negative_ttl: int = 24 * 3600):
+        self.db_path = db_path
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[Optional[Dict[str, Any]], float]]" = OrderedDict()
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'negative_hits': 0, 'misses': 0, 'stores': 0}
+        self._db = None
+
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS geocode ('
+                'key TEXT PRIMARY KEY, value TEXT, expires_at REAL NOT NULL)'
+            )
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Geocode cache disk store unavailable at {db_path}, using memory only: {e}")
+            self._db = None
+
+    def _remember(self, key, value, expires_at):
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, address: str) -> Tuple[bool, Optional[Dict[str, Any]]]:
+        """Return (found, location). location is None for a cached failed lookup."""
+        key = normalize_address(address)
+        now = time.time()
+
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                if entry[0] is None:
+                    self._stats['negative_hits'] += 1
+                return True, entry[0] and dict(entry[0])
+
+            if self._db is not None:
+                try:
+                    row = self._db.execute(
+                        'SELECT value, expires_at FROM geocode WHERE key = ?', (key,)
+                    ).fetchone()
+                except sqlite3.Error as e:
+                    logger.error(f"Geocode cache read failed: {e}")
+                    row = None
+                if row and row[1] > now:
+                    value = json.loads(row[0]) if row[0] else None
+                    self._remember(key, value, row[1])
+                    self._stats['disk_hits'] += 1
+                    if value is None:
+                        self._stats['negative_hits'] += 1
+                    return True, value and dict(value)
+
+            self._stats['misses'] += 1
+            return False, None
+
+    def put(self, address: str, location: Optional[Dict[str, Any]]):
+        """Store a geocode result, or None to record a failed lookup"""
+        key = normalize_address(address)
+        expires_at = time.time() + (self.ttl if location else self.negative_ttl)
+
+        with self._lock:
+            self._remember(key, location and dict(location), expires_at)
+            self._stats['stores'] += 1
+            if self._db is not None:
+                try:
+                    self._db.execute(
+                        'INSERT OR REPLACE INTO geocode (key, value, expires_at) VALUES (?, ?, ?)',
+                        (key, json.dumps(location) if location else None, expires_at)
+                    )
+                    self._db.commit()
+                except sqlite3.Error as e:
+                    logger.error(f"Geocode cache write failed: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            if self._db is not None:
+                try:
+                    stats['disk_entries'] = self._db.execute('SELECT COUNT(*) FROM geocode').fetchone()[0]
+                except sqlite3.Error:
+                    stats['disk_entries'] = None
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+        return stats
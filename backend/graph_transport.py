@@ -0,0 +1,261 @@
+"""
+Graph Transport Module
+Pooled HTTP sessions, proactive token refresh and a shared throttle for Microsoft Graph
+"""
+
+import asyncio
+import threading
+import time
+import logging
+from email.utils import parsedate_to_datetime
+from typing import Optional
+
+import httpx
+import requests
+
+from telemetry import InstrumentedHTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Statuses Graph uses to ask callers to slow down; both may carry Retry-After
+THROTTLE_STATUSES = (429, 503)
+
+
+def parse_retry_after(value) -> Optional[float]:
+    """Parse a Retry-After header given in seconds or as an HTTP date"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def create_session(pool_size: int) -> requests.Session:
+    """requests.Session that keeps up to pool_size connections alive per host and records call metrics"""
+    session = requests.Session()
+    adapter = InstrumentedHTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+class TokenProvider:
+    """Thread-safe client-credentials token cache that refreshes before the token expires"""
+
+    def __init__(self, session: requests.Session, token_url: str, client_id: str, client_secret: str,
+                 scope: str, refresh_margin: int = 300):
+        self.session = session
+        self.token_url = token_url
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.scope = scope
+        self.refresh_margin = refresh_margin
+        self._lock = threading.Lock()
+        self._token: Optional[str] = None
+        self._expires_at = 0.0
+
+    def cached_token(self) -> Optional[str]:
+        """Return the cached token if it is still fresh, without ever blocking on a refresh"""
+        if self._token and time.time() < self._expires_at - self.refresh_margin:
+            return self._token
+        return None
+
+    def get_token(self, force_refresh: bool = False) -> Optional[str]:
+        """Return a valid access token, fetching a new one when it is within refresh_margin of expiry"""
+        if not force_refresh and self._token and time.time() < self._expires_at - self.refresh_margin:
+            return self._token
+
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if not force_refresh and self._token and time.time() < self._expires_at - self.refresh_margin:
+                return self._token
+
+            data = {
+                'client_id': self.client_id,
+                'client_secret': self.client_secret,
+                'scope': self.scope,
+                'grant_type': 'client_credentials'
+            }
+            try:
+                response = self.session.post(self.token_url, data=data,
+                                             headers={'Content-Type': 'application/x-www-form-urlencoded'})
+                response.raise_for_status()
+                token_data = response.json()
+            except requests.exceptions.RequestException as e:
+                logger.error(f"Error getting access token: {e}")
+                if hasattr(e, 'response') and e.response is not None:
+                    logger.error(f"Response content: {e.response.text}")
+                return None
+
+            self._token = token_data['access_token']
+            self._expires_at = time.time() + int(token_data.get('expires_in', 3599))
+            logger.info("Successfully obtained access token")
+            return self._token
+
+    def invalidate(self, token: Optional[str] = None):
+        """Forget the cached token (only if it is still the one that was rejected)"""
+        with self._lock:
+            if token is None or token == self._token:
+                self._token = None
+                self._expires_at = 0.0
+
+
+class RateLimiter:
+    """Process-wide Graph throttle shared by every worker.
+
+    A 429/503 pauses all callers until its Retry-After has passed (or an
+    exponential backoff when the header is missing). An optional
+    requests-per-second cap spaces calls out before Graph has to push back.
+    """
+
+    def __init__(self, max_rps: float = 0, base_backoff: float = 1.0, max_backoff: float = 60.0):
+        self.min_interval = 1.0 / max_rps if max_rps else 0.0
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self._lock = threading.Lock()
+        self._paused_until = 0.0
+        self._next_slot = 0.0
+        self._consecutive_throttles = 0
+        self.throttle_count = 0
+
+    def _reserve(self) -> float:
+        """Claim the next send slot and return how long the caller must wait for it"""
+        with self._lock:
+            now = time.time()
+            start = max(now, self._paused_until, self._next_slot)
+            self._next_slot = start + self.min_interval
+        return start - now
+
+    def wait(self):
+        """Block until the caller may send its next request"""
+        delay = self._reserve()
+        if delay > 0:
+            time.sleep(delay)
+
+    async def wait_async(self):
+        """Like wait(), but yields to the event loop instead of blocking the thread"""
+        delay = self._reserve()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def throttled(self, retry_after: Optional[float]) -> float:
+        """Record a throttle response and pause everyone; returns the pause applied"""
+        with self._lock:
+            self._consecutive_throttles += 1
+            self.throttle_count += 1
+            if retry_after is None:
+                retry_after = min(self.max_backoff, self.base_backoff * 2 ** (self._consecutive_throttles - 1))
+            self._paused_until = max(self._paused_until, time.time() + retry_after)
+        logger.warning(f"Graph throttled the app, pausing all requests for {retry_after:.1f}s")
+        return retry_after
+
+    def succeeded(self):
+        if self._consecutive_throttles:
+            with self._lock:
+                self._consecutive_throttles = 0
+
+
+class GraphTransport:
+    """Sends authenticated Graph requests over a pooled session, retrying 401s and throttles"""
+
+    def __init__(self, session: requests.Session, token_provider: TokenProvider,
+                 rate_limiter: RateLimiter, max_retries: int = 4):
+        self.session = session
+        self.token_provider = token_provider
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    def request(self, method: str, url: str, headers=None, **kwargs) -> Optional[requests.Response]:
+        """Send a request; returns None only if no access token could be obtained.
+
+        Raises requests.exceptions.RequestException on transport errors like
+        requests.request does.
+        """
+        refreshed = False
+        attempt = 0
+        while True:
+            token = self.token_provider.get_token()
+            if not token:
+                return None
+
+            request_headers = dict(headers or {})
+            request_headers['Authorization'] = f'Bearer {token}'
+
+            self.rate_limiter.wait()
+            response = self.session.request(method, url, headers=request_headers, **kwargs)
+
+            if response.status_code == 401 and not refreshed:
+                logger.warning("Access token expired, refreshing...")
+                self.token_provider.invalidate(token)
+                refreshed = True
+                continue
+
+            if response.status_code in THROTTLE_STATUSES and attempt < self.max_retries:
+                attempt += 1
+                self.rate_limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+                continue
+
+            if response.status_code not in THROTTLE_STATUSES:
+                self.rate_limiter.succeeded()
+            return response
+
+
+class AsyncGraphTransport:
+    """GraphTransport for the async runtime: same token cache and throttle, non-blocking sends"""
+
+    def __init__(self, client: httpx.AsyncClient, token_provider: TokenProvider,
+                 rate_limiter: RateLimiter, max_retries: int = 4, max_concurrency: int = 8):
+        self.client = client
+        self.token_provider = token_provider
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.max_concurrency = max(1, max_concurrency)
+        self._semaphore = None
+
+    async def _get_token(self) -> Optional[str]:
+        # Refreshing uses the blocking session, so keep it off the event loop
+        return self.token_provider.cached_token() or await asyncio.to_thread(self.token_provider.get_token)
+
+    async def request(self, method: str, url: str, headers=None, **kwargs) -> Optional[httpx.Response]:
+        """Send a request; returns None only if no access token could be obtained.
+
+        Raises httpx.HTTPError on transport errors. At most max_concurrency
+        requests are in flight at once across the whole process.
+        """
+        if self._semaphore is None:
+            # Created lazily so it binds to the runtime's loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        refreshed = False
+        attempt = 0
+        while True:
+            token = await self._get_token()
+            if not token:
+                return None
+
+            request_headers = dict(headers or {})
+            request_headers['Authorization'] = f'Bearer {token}'
+
+            await self.rate_limiter.wait_async()
+            async with self._semaphore:
+                response = await self.client.request(method, url, headers=request_headers, **kwargs)
+
+            if response.status_code == 401 and not refreshed:
+                logger.warning("Access token expired, refreshing...")
+                self.token_provider.invalidate(token)
+                refreshed = True
+                continue
+
+            if response.status_code in THROTTLE_STATUSES and attempt < self.max_retries:
+                attempt += 1
+                self.rate_limiter.throttled(parse_retry_after(response.headers.get('Retry-After')))
+                continue
+
+            if response.status_code not in THROTTLE_STATUSES:
+                self.rate_limiter.succeeded()
+            return response
@@ -0,0 +1,158 @@
+"""
+Hierarchy Cache Module
+Shares built org hierarchies across requests, with single-flight builds and subtree lookups
+"""
+
+import threading
+import time
+import logging
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class _CachedTree:
+    __slots__ = ('hierarchy', 'node_count', 'expires_at', 'member_keys')
+
+    def __init__(self, hierarchy, node_count, expires_at, member_keys):
+        self.hierarchy = hierarchy
+        self.node_count = node_count
+        self.expires_at = expires_at
+        self.member_keys = member_keys
+
+
+class HierarchyCache:
+    """Hierarchies keyed by root email with a TTL and a bound on the total number of cached nodes.
+
+    Concurrent requests for the same root wait on the one in-flight build.
+    Every member of a cached tree is indexed by id, mail and UPN, so a request
+    for any manager inside an already-built tree is answered with that subtree.
+    """
+
+    def __init__(self, ttl: int = 300, max_nodes: int = 200000):
+        self.ttl = ttl
+        self.max_nodes = max_nodes
+        self._lock = threading.Lock()
+        self._trees: "OrderedDict[str, _CachedTree]" = OrderedDict()
+        self._members: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self._inflight: Dict[str, Future] = {}
+        self._node_total = 0
+        self._stats = {'hits': 0, 'subtree_hits': 0, 'misses': 0, 'shared_builds': 0, 'evictions': 0}
+
+    @staticmethod
+    def _member_keys(node):
+        user = node.get('user') or {}
+        return [user[field].lower() for field in ('id', 'mail', 'userPrincipalName') if user.get(field)]
+
+    def _lookup(self, key, now):
+        """Find a cached tree rooted at key, or the subtree for key inside another cached tree"""
+        tree = self._trees.get(key)
+        if tree and tree.expires_at > now:
+            self._trees.move_to_end(key)
+            self._stats['hits'] += 1
+            return tree.hierarchy
+
+        member = self._members.get(key)
+        if member:
+            root_key, node = member
+            tree = self._trees.get(root_key)
+            if tree and tree.expires_at > now:
+                self._trees.move_to_end(root_key)
+                self._stats['subtree_hits'] += 1
+                return node
+        return None
+
+    def _evict(self, root_key):
+        tree = self._trees.pop(root_key, None)
+        if not tree:
+            return
+        self._node_total -= tree.node_count
+        for member_key in tree.member_keys:
+            if self._members.get(member_key, (None,))[0] == root_key:
+                del self._members[member_key]
+
+    def _store(self, key, hierarchy):
+        members = {}
+        node_count = 0
+        stack = [hierarchy]
+        while stack:
+            node = stack.pop()
+            node_count += 1
+            for member_key in self._member_keys(node):
+                members[member_key] = node
+            stack.extend(node.get('children') or [])
+
+        if node_count > self.max_nodes:
+            return
+
+        with self._lock:
+            self._evict(key)
+            self._trees[key] = _CachedTree(hierarchy, node_count, time.time() + self.ttl, list(members))
+            self._node_total += node_count
+            for member_key, node in members.items():
+                self._members[member_key] = (key, node)
+
+            now = time.time()
+            for root_key in [k for k, tree in self._trees.items() if tree.expires_at <= now]:
+                self._evict(root_key)
+            while self._node_total > self.max_nodes and len(self._trees) > 1:
+                self._evict(next(iter(self._trees)))
+                self._stats['evictions'] += 1
+
+    def get_or_build(self, root_email: str,
+                     build: Callable[[str], Optional[Dict[str, Any]]]) -> Tuple[Optional[Dict[str, Any]], bool]:
+        """Return (hierarchy, from_cache), calling build(root_email) at most once per root at a time"""
+        key = root_email.lower()
+        with self._lock:
+            cached = self._lookup(key, time.time())
+            if cached is not None:
+                return cached, True
+
+            future = self._inflight.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._inflight[key] = future
+                self._stats['misses'] += 1
+            else:
+                self._stats['shared_builds'] += 1
+
+        if not leader:
+            return future.result(), True
+
+        try:
+            hierarchy = build(root_email)
+            if hierarchy:
+                self._store(key, hierarchy)
+            future.set_result(hierarchy)
+            return hierarchy, False
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def peek(self, root_email: str) -> Optional[Dict[str, Any]]:
+        """Return a cached tree or subtree for root_email (an email, UPN or user id) without building one"""
+        with self._lock:
+            return self._lookup(root_email.lower(), time.time())
+
+    def invalidate(self, root_email: Optional[str] = None):
+        """Drop one cached root, or everything when no root is given"""
+        with self._lock:
+            if root_email is None:
+                for root_key in list(self._trees):
+                    self._evict(root_key)
+            else:
+                self._evict(root_email.lower())
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['trees'] = len(self._trees)
+            stats['nodes'] = self._node_total
+            stats['in_flight'] = len(self._inflight)
+        return stats
@@ -4,13 +4,19 @@ Handles communication with Azure OpenAI only
 """
 
 import os
+import asyncio
 import base64
 import json
+import time
 from datetime import datetime
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 import logging
+import httpx
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI
+from prompt_builder import TeamPromptBuilder, count_tokens
+from team_tools import TOOL_DEFINITIONS
+from telemetry import instrumented_async_transport
 
 # Load environment variables
 load_dotenv()
@@ -22,6 +28,10 @@ class LLMService:
     
     def __init__(self):
         self.client = None
+        # Team context is cut down to fit this many tokens and cached by team-data hash
+        self.prompt_builder = TeamPromptBuilder(int(os.getenv('LLM_CONTEXT_TOKEN_BUDGET', '6000')))
+        # Tool-calling mode: rounds of tool calls allowed before the model has to answer
+        self.max_tool_rounds = int(os.getenv('LLM_MAX_TOOL_ROUNDS', '4'))
         self._initialize_client()
     
     def _initialize_client(self):
@@ -32,10 +42,19 @@ class LLMService:
         self.deployment = os.getenv('AZURE_OPENAI_DEPLOYMENT')
         self.key = os.getenv('AZURE_OPENAI_API_KEY')
         self.version = os.getenv('AZURE_OPENAI_API_VERSION')
+        max_connections = int(os.getenv('LLM_MAX_CONNECTIONS', '50'))
+        timeout = float(os.getenv('LLM_TIMEOUT', '120'))
         
-        self.client = OpenAI(
+        # Async client with one shared connection pool; callers must always run it on
+        # the same event loop (app.py uses its AsyncRuntime) so pooled connections are reused
+        self.client = AsyncOpenAI(
                     base_url=self.endpoint,
-                    api_key=self.key
+                    api_key=self.key,
+                    http_client=httpx.AsyncClient(
+                        transport=instrumented_async_transport(
+                            httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)),
+                        timeout=timeout
+                    )
                 )
 
     def get_available_providers(self) -> List[str]:
@@ -45,44 +64,46 @@ class LLMService:
             providers.append('azure')
         return providers
 
-    async def chat_completion(self, provider: str, user_query: str, team_data: List[Dict[str, Any]]) -> str:
-        system_prompt = self._create_system_prompt(team_data)
+    async def chat_completion(self, provider: str, user_query: str, team_data: List[Dict[str, Any]],
+                              system_prompt: Optional[str] = None) -> str:
+        if system_prompt is None:
+            system_prompt = self._create_system_prompt(team_data)
         return await self._azure_openai_completion(user_query, system_prompt)
 
-    def _create_system_prompt(self, team_data: List[Dict[str, Any]]) -> str:
-        """Create system prompt with team context"""
-        team_count = len(team_data)
-        
-        # Extract key team information
-        locations = []
-        location_types = {'address': 0, 'phone': 0, 'timezone': 0}
+    async def stream_chat_completion(self, provider: str, user_query: str, team_data: List[Dict[str, Any]],
+                                     system_prompt: Optional[str] = None) -> AsyncIterator[str]:
+        """Yield the completion text piece by piece as Azure OpenAI generates it"""
+        if system_prompt is None:
+            system_prompt = self._create_system_prompt(team_data)
+        stream = await self.client.chat.completions.create(
+            model=self.deployment,
+            messages=self._messages(user_query, system_prompt),
+            stream=True
+        )
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+
+    def build_system_prompt(self, team_data: List[Dict[str, Any]],
+                            team_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Create the system prompt and report how the team context was encoded and its token count"""
+        team_context, context_info = self.prompt_builder.build(team_data, team_hash)
         
+        location_types = {'address': 0, 'office': 0, 'phone': 0, 'timezone': 0}
         for member in team_data:
-            user_info = member.get('user', {})
-            location_info = member.get('location', {})
             location_type = member.get('location_type', 'unknown')
-            
             if location_type in location_types:
                 location_types[location_type] += 1
-            
-            if location_info.get('address'):
-                locations.append({
-                    'name': user_info.get('displayName', 'Unknown'),
-                    'title': user_info.get('jobTitle', ''),
-                    'department': user_info.get('department', ''),
-                    'address': location_info.get('address', ''),
-                    'accuracy': location_type
-                })
 
         system_prompt = f"""You are a helpful assistant that specializes in analyzing team location data and helping with travel planning and team coordination.
 
-You have access to data for {team_count} team members with the following location accuracy:
-- {location_types['address']} members with precise addresses/offices
+You have access to data for {len(team_data)} team members with the following location accuracy:
+- {location_types['address'] + location_types['office']} members with precise addresses/offices
 - {location_types['phone']} members with phone-based location approximations  
 - {location_types['timezone']} members with timezone-only locations
 
-Team member details:
-{json.dumps(locations, indent=2)}
+Team members grouped by location (accuracy is address, office, phone or timezone):
+{team_context}
 
 Your role is to:
 1. Help users find team members near specific locations for in-person meetings
@@ -95,15 +116,102 @@ NEVER GIVE OUT THE STREET ADDRESS OF ANY TEAM MEMBER, only give out City and Sta
 
 Always be helpful, accurate, and provide specific names and locations when relevant. If asked about travel to a specific city, identify team members in that area or nearby regions."""
 
-        return system_prompt
+        prompt_info = dict(context_info, system_prompt_tokens=count_tokens(system_prompt))
+        return system_prompt, prompt_info
+
+    def _create_system_prompt(self, team_data: List[Dict[str, Any]]) -> str:
+        """Create system prompt with team context"""
+        return self.build_system_prompt(team_data)[0]
+
+    def build_tools_system_prompt(self, summary: Dict[str, Any]) -> Tuple[str, Dict[str, Any]]:
+        """System prompt for tool-calling mode: a fixed-size team summary instead of the roster"""
+        location_types = summary.get('location_types', {})
+        system_prompt = f"""You are a helpful assistant that specializes in analyzing team location data and helping with travel planning and team coordination.
+
+The team has {summary['members']} members in {summary['cities']} cities across {summary['countries']} countries ({summary['located']} with a known location).
+Location accuracy: {location_types.get('address', 0) + location_types.get('office', 0)} precise addresses/offices, {location_types.get('phone', 0)} phone-based approximations, {location_types.get('timezone', 0)} timezone-only.
+
+You do not see the roster. Use the provided tools to count members by location, find members near a place, find members in a time zone band, or look members up by name, and base every number and name in your answer on tool results.
+
+Your role is to:
+1. Help users find team members near specific locations for in-person meetings
+2. Provide insights about team geographic distribution
+3. Assist with travel planning by identifying nearby colleagues
+4. Answer questions about team locations, time zones, and regional presence
+
+Security and Privacy:
+NEVER GIVE OUT THE STREET ADDRESS OF ANY TEAM MEMBER, only give out City and State in any response you give. This is CRITICAL for privacy reasons."""
+
+        return system_prompt, {'mode': 'tools', 'system_prompt_tokens': count_tokens(system_prompt)}
+
+    async def stream_chat_with_tools(self, user_query: str, tools, system_prompt: str,
+                                     trace: Optional[List[Dict[str, Any]]] = None) -> AsyncIterator[str]:
+        """Answer with function calling against TeamQueryTools, yielding the answer text as it streams.
+
+        Tool calls run on worker threads (they may geocode) and are recorded in
+        trace, if given. After max_tool_rounds rounds the model must answer.
+        """
+        messages = self._messages(user_query, system_prompt)
+        for round_number in range(self.max_tool_rounds + 1):
+            request = {'model': self.deployment, 'messages': messages, 'stream': True}
+            if round_number < self.max_tool_rounds:
+                request['tools'] = TOOL_DEFINITIONS
+            stream = await self.client.chat.completions.create(**request)
+
+            calls: Dict[int, Dict[str, str]] = {}
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta
+                if delta.content:
+                    yield delta.content
+                # Tool calls arrive in fragments keyed by index
+                for call in delta.tool_calls or []:
+                    entry = calls.setdefault(call.index, {'id': '', 'name': '', 'arguments': ''})
+                    if call.id:
+                        entry['id'] = call.id
+                    if call.function and call.function.name:
+                        entry['name'] += call.function.name
+                    if call.function and call.function.arguments:
+                        entry['arguments'] += call.function.arguments
+
+            if not calls:
+                return
+
+            ordered = [calls[index] for index in sorted(calls)]
+            messages.append({
+                'role': 'assistant',
+                'content': None,
+                'tool_calls': [{'id': call['id'], 'type': 'function',
+                                'function': {'name': call['name'], 'arguments': call['arguments']}} for call in ordered]
+            })
+            for call in ordered:
+                started = time.perf_counter()
+                result = await asyncio.to_thread(tools.execute, call['name'], call['arguments'])
+                if trace is not None:
+                    trace.append({
+                        'name': call['name'],
+                        'arguments': call['arguments'],
+                        'error': result.get('error'),
+                        'elapsed_ms': round((time.perf_counter() - started) * 1000, 1)
+                    })
+                messages.append({'role': 'tool', 'tool_call_id': call['id'], 'content': json.dumps(result)})
+
+    async def chat_with_tools(self, user_query: str, tools, system_prompt: str,
+                              trace: Optional[List[Dict[str, Any]]] = None) -> str:
+        return ''.join([delta async for delta in self.stream_chat_with_tools(user_query, tools, system_prompt, trace)])
+
+    @staticmethod
+    def _messages(user_query: str, system_prompt: str) -> List[Dict[str, str]]:
+        return [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": user_query}
+        ]
 
     async def _azure_openai_completion(self, user_query: str, system_prompt: str) -> str:
-        completion = self.client.chat.completions.create(
+        completion = await self.client.chat.completions.create(
             model=self.deployment,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_query}
-            ]
+            messages=self._messages(user_query, system_prompt)
         )
         
         return completion.choices[0].message.content
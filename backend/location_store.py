@@ -0,0 +1,164 @@
+"""
+Location Store Module
+Persistent per-user resolved locations, reused until the user's location fields change
+"""
+
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Directory fields that feed the address > office > phone > time zone resolution
+FINGERPRINT_FIELDS = ('streetAddress', 'city', 'state', 'postalCode', 'country', 'officeLocation',
+                      'mobilePhone', 'businessPhones', 'timeZone')
+# Bump when the resolution rules change so every stored location is recomputed once
+FINGERPRINT_VERSION = 1
+
+# SQLite's default limit on bound parameters is 999
+_QUERY_CHUNK = 500
+
+
+def location_fingerprint(user: Dict[str, Any]) -> str:
+    """Hash of the fields a user's location is resolved from"""
+    fields = [FINGERPRINT_VERSION] + [user.get(field) for field in FINGERPRINT_FIELDS]
+    return hashlib.sha256(json.dumps(fields, separators=(',', ':')).encode('utf-8')).hexdigest()[:32]
+
+
+class LocationStore:
+    """SQLite table of user id -> (fingerprint, location, location_type, border_color).
+
+    A stored entry is used only while the user's fingerprint matches and it has
+    not expired, so a map load resolves just the users whose address, office,
+    phone or time zone changed since the last one. Entries whose address or
+    office did not geocode are kept for the shorter `degraded_ttl`, matching the
+    geocode cache's negative entries, so they are retried against Azure Maps.
+    """
+
+    def __init__(self, db_path: str, ttl: int = 7 * 24 * 3600, degraded_ttl: int = 24 * 3600):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.degraded_ttl = degraded_ttl
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'changed': 0, 'misses': 0, 'stores': 0, 'invalidated': 0}
+        self._db = None
+
+        try:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute('PRAGMA journal_mode=WAL')
+            self._db.execute(
+                'CREATE TABLE IF NOT EXISTS user_location ('
+                'user_id TEXT PRIMARY KEY, fingerprint TEXT NOT NULL, location TEXT, '
+                'location_type TEXT NOT NULL, border_color TEXT NOT NULL, expires_at REAL NOT NULL)'
+            )
+            self._db.execute('CREATE INDEX IF NOT EXISTS user_location_type ON user_location (location_type)')
+            self._db.commit()
+        except sqlite3.Error as e:
+            logger.error(f"Location store unavailable at {db_path}, resolving every user on each load: {e}")
+            self._db = None
+
+    def get_many(self, users: Iterable[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """Stored location_data for the users whose fingerprint is unchanged, keyed by user id"""
+        fingerprints = {user['id']: location_fingerprint(user) for user in users if user.get('id')}
+        if self._db is None or not fingerprints:
+            return {}
+
+        ids = list(fingerprints)
+        now = time.time()
+        found = {}
+        changed = 0
+        with self._lock:
+            try:
+                for start in range(0, len(ids), _QUERY_CHUNK):
+                    chunk = ids[start:start + _QUERY_CHUNK]
+                    rows = self._db.execute(
+                        'SELECT user_id, fingerprint, location, location_type, border_color FROM user_location '
+                        f"WHERE expires_at > ? AND user_id IN ({','.join('?' * len(chunk))})",
+                        [now] + chunk
+                    ).fetchall()
+                    for user_id, fingerprint, location, location_type, border_color in rows:
+                        if fingerprint != fingerprints[user_id]:
+                            changed += 1
+                            continue
+                        found[user_id] = {
+                            'location': json.loads(location) if location else None,
+                            'border_color': border_color,
+                            'location_type': location_type
+                        }
+            except sqlite3.Error as e:
+                logger.error(f"Location store read failed: {e}")
+                return {}
+            self._stats['hits'] += len(found)
+            self._stats['changed'] += changed
+            self._stats['misses'] += len(ids) - len(found) - changed
+        return found
+
+    def put_many(self, records: List[Dict[str, Any]], degraded_ids: Iterable[str] = ()):
+        """Store resolved location_data records; users in degraded_ids expire after degraded_ttl"""
+        if self._db is None:
+            return
+        degraded_ids = set(degraded_ids)
+        now = time.time()
+        rows = [(record['user']['id'], location_fingerprint(record['user']),
+                 json.dumps(record['location']) if record.get('location') else None,
+                 record['location_type'], record['border_color'],
+                 now + (self.degraded_ttl if record['user']['id'] in degraded_ids else self.ttl))
+                for record in records if (record.get('user') or {}).get('id')]
+        if not rows:
+            return
+        with self._lock:
+            try:
+                self._db.executemany(
+                    'INSERT OR REPLACE INTO user_location '
+                    '(user_id, fingerprint, location, location_type, border_color, expires_at) '
+                    'VALUES (?, ?, ?, ?, ?, ?)', rows
+                )
+                self._db.commit()
+                self._stats['stores'] += len(rows)
+            except sqlite3.Error as e:
+                logger.error(f"Location store write failed: {e}")
+
+    def invalidate(self, user_ids: Optional[List[str]] = None,
+                   location_types: Optional[List[str]] = None) -> int:
+        """Drop stored locations for the given users and/or location types (everything if neither); returns rows removed"""
+        if self._db is None or user_ids == [] or location_types == []:
+            return 0
+        id_chunks = ([user_ids[start:start + _QUERY_CHUNK] for start in range(0, len(user_ids), _QUERY_CHUNK)]
+                     if user_ids is not None else [None])
+
+        removed = 0
+        with self._lock:
+            try:
+                for chunk in id_chunks:
+                    clauses, params = [], []
+                    if chunk is not None:
+                        clauses.append(f"user_id IN ({','.join('?' * len(chunk))})")
+                        params.extend(chunk)
+                    if location_types is not None:
+                        clauses.append(f"location_type IN ({','.join('?' * len(location_types))})")
+                        params.extend(location_types)
+                    where = f" WHERE {' AND '.join(clauses)}" if clauses else ''
+                    removed += self._db.execute(f'DELETE FROM user_location{where}', params).rowcount
+                self._db.commit()
+            except sqlite3.Error as e:
+                logger.error(f"Location store invalidation failed: {e}")
+                return 0
+            self._stats['invalidated'] += removed
+        logger.info(f"Invalidated {removed} stored user locations")
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            if self._db is not None:
+                try:
+                    stats['entries'] = self._db.execute('SELECT COUNT(*) FROM user_location').fetchone()[0]
+                except sqlite3.Error:
+                    stats['entries'] = None
+        lookups = stats['hits'] + stats['changed'] + stats['misses']
+        stats['hit_rate'] = round(stats['hits'] / lookups, 3) if lookups else None
+        return stats
@@ -0,0 +1,348 @@
+"""
+Local stand-in for Microsoft Graph, Azure Maps and Azure OpenAI
+Serves a synthetic org so the backend can be exercised (and benchmarked, see benchmark.py) offline.
+
+Usage:
+    python mock_graph_server.py --users 2000 --fanout 8 --port 5001
+
+Then start the backend with:
+    AZURE_LOGIN_BASE_URL=http://localhost:5001
+    GRAPH_API_BASE_URL=http://localhost:5001/v1.0
+    AZURE_MAPS_BASE_URL=http://localhost:5001
+    AZURE_OPENAI_ENDPOINT=http://localhost:5001/openai
+
+GET /mock/stats returns the number of requests received per service.
+"""
+
+import argparse
+import base64
+import hashlib
+import io
+import json
+import random
+import threading
+import time
+from collections import Counter
+from urllib.parse import parse_qs, urlencode
+from flask import Flask, Response, jsonify, request
+from PIL import Image
+
+CITIES = [
+    ('1 Microsoft Way', 'Redmond', 'WA', 'United States', '+1 425 555 0100'),
+    ('555 California St', 'San Francisco', 'CA', 'United States', '+1 415 555 0100'),
+    ('11 Times Sq', 'New York', 'NY', 'United States', '+1 212 555 0100'),
+    ('2 Kingdom St', 'London', None, 'United Kingdom', '+44 20 7946 0100'),
+    ('Walter-Gropius-Str. 5', 'Munich', None, 'Germany', '+49 89 3176 0100'),
+    ('Embassy Golf Links', 'Bengaluru', 'Karnataka', 'India', '+91 80 4010 0100'),
+    ('1 Denison St', 'Sydney', 'NSW', 'Australia', '+61 2 8281 0100'),
+    ('Shinagawa Grand Central Tower', 'Tokyo', None, 'Japan', '+81 3 4332 0100'),
+]
+
+CITY_COORDINATES = {
+    'Redmond': (47.674, -122.1215), 'San Francisco': (37.7749, -122.4194), 'New York': (40.7128, -74.006),
+    'London': (51.5085, -0.1257), 'Munich': (48.1374, 11.5755), 'Bengaluru': (12.9719, 77.5937),
+    'Sydney': (-33.8679, 151.2073), 'Tokyo': (35.6895, 139.6917),
+}
+
+TITLES = ['Engineer', 'Senior Engineer', 'Program Manager', 'Designer', 'Data Scientist', 'Architect']
+
+
+def generate_org(user_count, fanout, seed=42):
+    """Generate a synthetic tenant: a dict of users keyed by id and a manager -> reports map"""
+    rng = random.Random(seed)
+    users = {}
+    reports = {}
+
+    for index in range(user_count):
+        user_id = f"00000000-0000-0000-0000-{index:012d}"
+        street, city, state, country, phone = CITIES[rng.randrange(len(CITIES))]
+        has_address = rng.random() < 0.6
+        users[user_id] = {
+            'id': user_id,
+            'displayName': f"User {index}",
+            'mail': f"user{index}@contoso.example",
+            'userPrincipalName': f"user{index}@contoso.example",
+            'jobTitle': 'CEO' if index == 0 else rng.choice(TITLES),
+            'department': f"Org {index % 17}",
+            'officeLocation': f"{city}/B{rng.randrange(1, 50)}",
+            'businessPhones': [phone] if rng.random() < 0.7 else [],
+            'mobilePhone': None,
+            'streetAddress': street if has_address else None,
+            'city': city if has_address else None,
+            'state': state if has_address else None,
+            'postalCode': None,
+            'country': country if has_address else None,
+            'usageLocation': None,
+            'timeZone': None,
+        }
+        if index > 0:
+            manager_id = f"00000000-0000-0000-0000-{(index - 1) // fanout:012d}"
+            reports.setdefault(manager_id, []).append(user_id)
+            users[user_id]['_manager'] = manager_id
+
+    return users, reports
+
+
+def service_for_path(path):
+    """Which real service a request to the stand-in replaces, for latency and call counting"""
+    if '/oauth2/' in path:
+        return 'login'
+    if path.startswith('/search/'):
+        return 'maps_batch' if '/batch/' in path else 'maps'
+    if path.endswith('/chat/completions'):
+        return 'openai'
+    if path == '/v1.0/$batch':
+        return 'graph_batch'
+    if path.startswith('/v1.0/'):
+        return 'graph'
+    return None
+
+
+def geocode_result(query):
+    """An Azure Maps search result: the known city named in the query, else a stable made-up point"""
+    for city, (latitude, longitude) in CITY_COORDINATES.items():
+        if city.lower() in query.lower():
+            break
+    else:
+        digest = hashlib.sha256(query.encode('utf-8')).digest()
+        latitude = digest[0] / 255 * 120 - 55
+        longitude = digest[1] / 255 * 360 - 180
+    return {'results': [{'position': {'lat': latitude, 'lon': longitude},
+                         'address': {'freeformAddress': query}}]}
+
+
+def create_app(user_count=1000, fanout=8, latency_ms=0, page_size=100, throttle_rate=0.0, retry_after=1,
+               maps_latency_ms=0, openai_latency_ms=0):
+    app = Flask(__name__)
+    throttle_random = random.Random(7)
+    # Requests received per service; benchmark.py reads these as the backend's outbound calls
+    app.call_counts = Counter()
+    counts_lock = threading.Lock()
+    users, reports = generate_org(user_count, fanout)
+    by_mail = {user['mail'].lower(): user_id for user_id, user in users.items()}
+
+    def lookup(key):
+        return users.get(key) or users.get(by_mail.get(key.lower(), ''))
+
+    def project(user):
+        fields = request.args.get('$select')
+        public = {k: v for k, v in user.items() if not k.startswith('_')}
+        if not fields:
+            return public
+        return {k: public.get(k) for k in fields.split(',')}
+
+    def not_found():
+        return jsonify({'error': {'code': 'Request_ResourceNotFound', 'message': 'Resource not found'}}), 404
+
+    @app.before_request
+    def count_call():
+        service = service_for_path(request.path)
+        if service:
+            with counts_lock:
+                app.call_counts['graph_batch_items' if 'X-Batch-Item' in request.headers else service] += 1
+
+    @app.before_request
+    def simulate_latency():
+        service = service_for_path(request.path)
+        delay_ms = {'maps': maps_latency_ms, 'maps_batch': maps_latency_ms, 'openai': openai_latency_ms}.get(service, latency_ms)
+        if delay_ms and service and 'X-Batch-Item' not in request.headers:
+            time.sleep(delay_ms / 1000.0)
+
+    @app.before_request
+    def simulate_throttling():
+        # Graph answers 429 with Retry-After, both for whole requests and for $batch items
+        if (throttle_rate and service_for_path(request.path) in ('graph', 'graph_batch')
+                and throttle_random.random() < throttle_rate):
+            response = jsonify({'error': {'code': 'TooManyRequests', 'message': 'Too many requests'}})
+            response.status_code = 429
+            response.headers['Retry-After'] = str(retry_after)
+            return response
+
+    @app.route('/<tenant>/oauth2/v2.0/token', methods=['POST'])
+    def token(tenant):
+        return jsonify({'token_type': 'Bearer', 'expires_in': 3599, 'access_token': 'mock-token'})
+
+    changes = []
+
+    def with_manager(user, record):
+        if 'manager' in request.args.get('$expand', '') and user.get('_manager'):
+            record['manager'] = {'id': user['_manager']}
+        return record
+
+    @app.route('/v1.0/users')
+    def list_users():
+        top = int(request.args.get('$top', 100))
+        skip = int(request.args.get('$skiptoken', 0))
+        user_list = list(users.values())
+        page = {'value': [with_manager(user, project(user)) for user in user_list[skip:skip + top]]}
+        if skip + top < len(user_list):
+            query = {k: v for k, v in request.args.items() if k != '$skiptoken'}
+            query['$skiptoken'] = skip + top
+            page['@odata.nextLink'] = f"{request.host_url}v1.0/users?{urlencode(query, safe='$,()')}"
+        return jsonify(page)
+
+    @app.route('/v1.0/users/delta')
+    def users_delta():
+        token = request.args.get('$deltatoken')
+        since = len(changes) if token == 'latest' else int(token or 0)
+        record_ids = list(dict.fromkeys(changes[since:])) if token else list(users)
+        value = []
+        for user_id in record_ids:
+            user = users[user_id]
+            record = project(user)
+            record['manager@delta'] = [{'id': user['_manager']}] if user.get('_manager') else []
+            value.append(record)
+        return jsonify({
+            'value': value,
+            '@odata.deltaLink': f"{request.host_url}v1.0/users/delta?$deltatoken={len(changes)}"
+        })
+
+    @app.route('/mock/users/<key>/manager', methods=['PUT'])
+    def move_user(key):
+        """Reassign a user to a new manager so delta queries have something to report"""
+        user = lookup(key)
+        manager = lookup(request.get_json().get('manager', ''))
+        if not user or not manager:
+            return not_found()
+        if user.get('_manager'):
+            reports[user['_manager']].remove(user['id'])
+        user['_manager'] = manager['id']
+        reports.setdefault(manager['id'], []).append(user['id'])
+        changes.append(user['id'])
+        return jsonify({'id': user['id'], 'manager': manager['id']})
+
+    @app.route('/v1.0/users/<key>')
+    def get_user(key):
+        user = lookup(key)
+        return jsonify(project(user)) if user else not_found()
+
+    @app.route('/v1.0/users/<key>/manager')
+    def get_manager(key):
+        user = lookup(key)
+        if not user or not user.get('_manager'):
+            return not_found()
+        return jsonify(project(users[user['_manager']]))
+
+    @app.route('/v1.0/users/<key>/directReports')
+    def get_direct_reports(key):
+        user = lookup(key)
+        if not user:
+            return not_found()
+        skip = int(request.args.get('$skiptoken', 0))
+        report_ids = reports.get(user['id'], [])
+        page = {'value': [project(users[report_id]) for report_id in report_ids[skip:skip + page_size]]}
+        if skip + page_size < len(report_ids):
+            query = {'$skiptoken': skip + page_size}
+            if request.args.get('$select'):
+                query['$select'] = request.args['$select']
+            page['@odata.nextLink'] = f"{request.host_url}v1.0/users/{key}/directReports?{urlencode(query, safe='$,')}"
+        return jsonify(page)
+
+    def photo_response(key, size):
+        user = lookup(key)
+        index = int(user['id'].rsplit('-', 1)[1]) if user else 0
+        if not user or index % 3 == 2:
+            return not_found()
+        output = io.BytesIO()
+        Image.new('RGB', (size, size), ((index * 37) % 256, (index * 91) % 256, (index * 53) % 256)).save(output, format='JPEG')
+        return Response(output.getvalue(), mimetype='image/jpeg')
+
+    @app.route('/v1.0/users/<key>/photo/$value')
+    def get_photo(key):
+        return photo_response(key, 648)
+
+    @app.route('/v1.0/users/<key>/photos/<size>/$value')
+    def get_sized_photo(key, size):
+        return photo_response(key, int(size.split('x')[0]))
+
+    @app.route('/v1.0/$batch', methods=['POST'])
+    def batch():
+        sub_requests = request.get_json().get('requests', [])
+        if len(sub_requests) > 20:
+            return jsonify({'error': {'code': 'BadRequest', 'message': 'Too many requests in batch'}}), 400
+
+        responses = []
+        with app.test_client() as client:
+            for sub_request in sub_requests:
+                sub_response = client.open('/v1.0/' + sub_request['url'].lstrip('/'),
+                                           method=sub_request.get('method', 'GET'),
+                                           headers={'X-Batch-Item': '1', 'Host': request.host})
+                body = sub_response.get_json(silent=True)
+                if body is None and sub_response.data:
+                    # Graph base64-encodes non-JSON sub-response bodies
+                    body = base64.b64encode(sub_response.data).decode('ascii')
+                responses.append({
+                    'id': sub_request['id'],
+                    'status': sub_response.status_code,
+                    'headers': {k: v for k, v in sub_response.headers.items() if k in ('Content-Type', 'Retry-After')},
+                    'body': body
+                })
+        return jsonify({'responses': responses})
+
+    @app.route('/search/address/json')
+    def search_address():
+        return jsonify(geocode_result(request.args.get('query', '')))
+
+    @app.route('/search/address/batch/json', methods=['POST'])
+    def search_address_batch():
+        items = []
+        for item in request.get_json().get('batchItems', []):
+            query = parse_qs(item.get('query', '').lstrip('?')).get('query', [''])[0]
+            items.append({'statusCode': 200, 'response': geocode_result(query)})
+        return jsonify({'batchItems': items})
+
+    def completion_chunk(delta, finish_reason=None):
+        return 'data: ' + json.dumps({
+            'id': 'mock', 'object': 'chat.completion.chunk', 'created': int(time.time()), 'model': 'mock',
+            'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]
+        }) + '\n\n'
+
+    @app.route('/chat/completions', methods=['POST'])
+    @app.route('/<path:prefix>/chat/completions', methods=['POST'])
+    def chat_completions(prefix=None):
+        body = request.get_json()
+        answered_tools = any(message.get('role') == 'tool' for message in body.get('messages', []))
+        if body.get('tools') and not answered_tools:
+            # One round of tool calls, then the answer
+            tool_call = {'index': 0, 'id': 'call_0', 'type': 'function',
+                         'function': {'name': 'count_by_location', 'arguments': '{"group_by": "country", "top": 5}'}}
+            chunks = [completion_chunk({'tool_calls': [tool_call]}), completion_chunk({}, 'tool_calls')]
+        else:
+            words = ['Most ', 'of ', 'the ', 'team ', 'is ', 'in ', 'Redmond.']
+            if not body.get('stream'):
+                return jsonify({'id': 'mock', 'object': 'chat.completion', 'created': int(time.time()), 'model': 'mock',
+                                'choices': [{'index': 0, 'finish_reason': 'stop',
+                                             'message': {'role': 'assistant', 'content': ''.join(words)}}]})
+            chunks = [completion_chunk({'content': word}) for word in words] + [completion_chunk({}, 'stop')]
+        return Response(chunks + ['data: [DONE]\n\n'], mimetype='text/event-stream')
+
+    @app.route('/mock/stats')
+    def call_stats():
+        with counts_lock:
+            return jsonify(dict(app.call_counts))
+
+    @app.route('/mock/stats/reset', methods=['POST'])
+    def reset_call_stats():
+        with counts_lock:
+            app.call_counts.clear()
+        return jsonify({})
+
+    return app
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local Microsoft Graph, Azure Maps and Azure OpenAI stand-in')
+    parser.add_argument('--users', type=int, default=1000, help='number of synthetic users')
+    parser.add_argument('--fanout', type=int, default=8, help='direct reports per manager')
+    parser.add_argument('--latency-ms', type=int, default=0, help='added latency per login/Graph request')
+    parser.add_argument('--maps-latency-ms', type=int, default=0, help='added latency per Azure Maps request')
+    parser.add_argument('--openai-latency-ms', type=int, default=0, help='added latency per chat completion')
+    parser.add_argument('--page-size', type=int, default=100, help='directReports page size')
+    parser.add_argument('--throttle-rate', type=float, default=0.0, help='fraction of requests answered with 429')
+    parser.add_argument('--retry-after', type=int, default=1, help='Retry-After seconds sent with throttled responses')
+    parser.add_argument('--port', type=int, default=5001)
+    args = parser.parse_args()
+
+    print(f"Mock Graph: {args.users} users, fanout {args.fanout}, user0@contoso.example is the root")
+    create_app(args.users, args.fanout, args.latency_ms, args.page_size, args.throttle_rate, args.retry_after,
+               args.maps_latency_ms, args.openai_latency_ms).run(host='127.0.0.1', port=args.port, threaded=True)
@@ -0,0 +1,193 @@
+"""
+Offline Locator Module
+Phone-region and time-zone centroids from tables shipped with the app, so those fallbacks need no network calls
+"""
+
+import argparse
+import csv
+import math
+import os
+import re
+import logging
+from typing import Any, Dict, Iterator, Optional
+
+logger = logging.getLogger(__name__)
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+# Representative places for bare UTC offsets (UTC+05:00, Etc/GMT-5, the "UTC+12" Windows zones)
+OFFSET_LOCATIONS = {
+    -12: (-11.0, -170.0, 'Baker Island'),
+    -11: (21.3, -157.8, 'Hawaii'),
+    -10: (21.3, -157.8, 'Hawaii-Aleutian'),
+    -9: (61.2, -149.9, 'Alaska'),
+    -8: (37.7, -122.4, 'Pacific Time'),
+    -7: (39.7, -104.9, 'Mountain Time'),
+    -6: (41.9, -87.6, 'Central Time'),
+    -5: (40.7, -74.0, 'Eastern Time'),
+    -4: (45.5, -73.6, 'Atlantic Time'),
+    -3: (-23.5, -46.6, 'São Paulo'),
+    -2: (-22.9, -43.2, 'Rio de Janeiro'),
+    -1: (32.3, -16.3, 'Azores'),
+    0: (51.5, -0.1, 'London'),
+    1: (52.5, 13.4, 'Berlin'),
+    2: (41.9, 12.5, 'Rome'),
+    3: (55.8, 37.6, 'Moscow'),
+    4: (25.3, 55.3, 'Dubai'),
+    5: (28.6, 77.2, 'Delhi'),
+    6: (23.8, 90.4, 'Dhaka'),
+    7: (13.8, 100.5, 'Bangkok'),
+    8: (39.9, 116.4, 'Beijing'),
+    9: (35.7, 139.7, 'Tokyo'),
+    10: (-33.9, 151.2, 'Sydney'),
+    11: (-37.8, 144.9, 'Melbourne'),
+    12: (-36.8, 174.7, 'Auckland'),
+    13: (-21.1, -175.2, "Nuku'alofa"),
+    14: (1.9, -157.4, 'Kiritimati'),
+}
+
+# Country spellings seen in directory data besides the region_centroids.csv names and ISO codes
+COUNTRY_ALIASES = {
+    'USA': 'US', 'United States of America': 'US', 'America': 'US',
+    'UK': 'GB', 'Great Britain': 'GB', 'England': 'GB', 'Scotland': 'GB', 'Wales': 'GB', 'Northern Ireland': 'GB',
+    'UAE': 'AE', 'Korea': 'KR', 'Republic of Korea': 'KR', 'Russian Federation': 'RU',
+    'Czech Republic': 'CZ', 'Holland': 'NL', 'The Netherlands': 'NL', 'Viet Nam': 'VN', 'Türkiye': 'TR',
+    'PRC': 'CN', "People's Republic of China": 'CN', 'Hong Kong SAR': 'HK', 'Macau SAR': 'MO',
+}
+
+_UTC_OFFSET = re.compile(r'^(?:UTC|GMT)\s*([+-])(\d{1,2})(?::?(\d{2}))?$', re.IGNORECASE)
+_ETC_OFFSET = re.compile(r'^Etc/GMT([+-])(\d{1,2})$', re.IGNORECASE)
+
+
+def _read_csv(path: str) -> Iterator[Dict[str, str]]:
+    """Rows of a data table, skipping its leading # comment lines"""
+    with open(path, encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(line for line in f if not line.startswith('#'))
+
+
+def _country_key(name: str) -> str:
+    return ' '.join(re.sub(r"[^\w]+", ' ', name.lower()).split())
+
+
+def _location(latitude: float, longitude: float, address: str) -> Dict[str, Any]:
+    return {'latitude': latitude, 'longitude': longitude, 'address': address}
+
+
+class OfflineLocator:
+    """Region-code, IANA and Windows time-zone lookups against in-memory tables loaded once.
+
+    region_centroids.csv holds the approximate centre of every ISO 3166 region
+    that phone numbers map to, timezone_centroids.csv the tzdata reference
+    place of every IANA zone and alias, and windows_zones.csv the CLDR mapping
+    from Windows zone names (what Graph usually returns) to IANA zones.
+    """
+
+    def __init__(self, data_dir: str = DATA_DIR):
+        self.regions = {row['code']: _location(float(row['latitude']), float(row['longitude']), row['name'])
+                        for row in _read_csv(os.path.join(data_dir, 'region_centroids.csv'))}
+
+        self.timezones = {}
+        for row in _read_csv(os.path.join(data_dir, 'timezone_centroids.csv')):
+            country = self.regions.get(row['country'], {}).get('address')
+            self.timezones[row['zone'].lower()] = _location(float(row['latitude']), float(row['longitude']),
+                                                            f"{row['place']}, {country}" if country else row['place'])
+
+        self.countries = {_country_key(location['address']): code for code, location in self.regions.items()}
+        self.countries.update({_country_key(code): code for code in self.regions})
+        self.countries.update({_country_key(alias): code for alias, code in COUNTRY_ALIASES.items()})
+
+        self.windows_zones = {row['windows_name'].lower(): row['iana']
+                              for row in _read_csv(os.path.join(data_dir, 'windows_zones.csv'))}
+        logger.info(f"Offline locator loaded {len(self.regions)} regions, {len(self.timezones)} IANA zones "
+                    f"and {len(self.windows_zones)} Windows zones")
+
+    def country_code(self, name: Optional[str]) -> Optional[str]:
+        """ISO 3166 code for a country name, common alias or code as Graph's country field holds it"""
+        return self.countries.get(_country_key(name or ''))
+
+    def region_location(self, region_code: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Centre of an ISO 3166 region such as 'US' (as returned by phonenumbers)"""
+        location = self.regions.get((region_code or '').upper())
+        return dict(location) if location else None
+
+    @staticmethod
+    def offset_location(hours: float) -> Optional[Dict[str, Any]]:
+        """Representative place for a UTC offset, to the nearest hour (half hours round down: +05:30 is Delhi)"""
+        place = OFFSET_LOCATIONS.get(math.floor(hours + 0.5 - 1e-9))
+        return _location(*place) if place else None
+
+    def timezone_location(self, timezone: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Place for a Windows zone name, IANA zone name or UTC offset string; None if unknown"""
+        name = (timezone or '').strip()
+        if not name:
+            return None
+
+        name = self.windows_zones.get(name.lower(), name)
+        location = self.timezones.get(name.lower())
+        if location:
+            return dict(location)
+
+        match = _UTC_OFFSET.match(name)
+        if match:
+            hours = int(match.group(2)) + int(match.group(3) or 0) / 60
+            return self.offset_location(-hours if match.group(1) == '-' else hours)
+        match = _ETC_OFFSET.match(name)
+        if match:
+            # POSIX-style names have the sign inverted: Etc/GMT+5 is UTC-05:00
+            return self.offset_location(-int(match.group(2)) if match.group(1) == '+' else int(match.group(2)))
+        if name.upper() in ('UTC', 'GMT', 'ETC/UTC', 'ETC/GMT', 'Z'):
+            return self.offset_location(0)
+        return None
+
+
+def _parse_iso6709(value):
+    """Decode tzdata's +DDMM[SS]+DDDMM[SS] coordinates into decimal degrees"""
+    match = re.match(r'^([+-]\d+)([+-]\d+)$', value)
+
+    def degrees(part, degree_digits):
+        sign = -1 if part[0] == '-' else 1
+        digits = part[1:]
+        minutes = int(digits[degree_digits:degree_digits + 2])
+        seconds = int(digits[degree_digits + 2:] or 0)
+        return sign * round(int(digits[:degree_digits]) + minutes / 60 + seconds / 3600, 4)
+
+    return degrees(match.group(1), 2), degrees(match.group(2), 3)
+
+
+def build_timezone_table(zoneinfo_dir: str, output_path: str) -> int:
+    """Write timezone_centroids.csv from a tzdata install's zone.tab and its backward-compatible links"""
+    zones = {}
+    with open(os.path.join(zoneinfo_dir, 'zone.tab'), encoding='utf-8') as f:
+        for line in f:
+            if line.startswith('#') or not line.strip():
+                continue
+            country, coordinates, zone = line.rstrip('\n').split('\t')[:3]
+            latitude, longitude = _parse_iso6709(coordinates)
+            zones[zone] = (country, latitude, longitude)
+
+    links = {}
+    tzdata_path = os.path.join(zoneinfo_dir, 'tzdata.zi')
+    if os.path.exists(tzdata_path):
+        with open(tzdata_path, encoding='utf-8') as f:
+            for line in f:
+                parts = line.split()
+                if len(parts) == 3 and parts[0] == 'L' and parts[1] in zones:
+                    links[parts[2]] = parts[1]
+
+    with open(output_path, 'w', encoding='utf-8', newline='') as f:
+        f.write('# IANA zone or alias, tzdata reference-place coordinates, region code and place name (generated from zone.tab)\n')
+        writer = csv.writer(f, lineterminator='\n')
+        writer.writerow(['zone', 'latitude', 'longitude', 'country', 'place'])
+        for zone in sorted(zones) + sorted(links):
+            canonical = links.get(zone, zone)
+            country, latitude, longitude = zones[canonical]
+            writer.writerow([zone, latitude, longitude, country, canonical.rsplit('/', 1)[-1].replace('_', ' ')])
+    return len(zones) + len(links)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Regenerate the offline time-zone table from tzdata')
+    parser.add_argument('--zoneinfo', default='/usr/share/zoneinfo', help='tzdata directory with zone.tab')
+    parser.add_argument('--output', default=os.path.join(DATA_DIR, 'timezone_centroids.csv'))
+    args = parser.parse_args()
+    print(f"Wrote {build_timezone_table(args.zoneinfo, args.output)} zones to {args.output}")
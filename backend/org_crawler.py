@@ -0,0 +1,169 @@
+"""
+Org Crawler Module
+Builds organization hierarchies level by level with bounded-parallel Graph requests
+"""
+
+import threading
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class CrawlStats:
+    """Graph call counts and wall-clock timings collected during one crawl"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._started = time.perf_counter()
+        self.source = 'crawl'
+        self.graph_calls = 0
+        self.sub_requests = 0
+        self.levels: List[Dict[str, Any]] = []
+        self.total_ms = 0.0
+
+    def count_call(self, sub_requests: int = 1):
+        """Count one HTTP round trip carrying sub_requests logical Graph requests"""
+        with self._lock:
+            self.graph_calls += 1
+            self.sub_requests += sub_requests
+
+    def record_level(self, depth: int, users: int, graph_calls: int, elapsed: float):
+        self.levels.append({
+            'depth': depth,
+            'users': users,
+            'graph_calls': graph_calls,
+            'elapsed_ms': round(elapsed * 1000, 1)
+        })
+
+    def finish(self):
+        self.total_ms = round((time.perf_counter() - self._started) * 1000, 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'source': self.source,
+            'graph_calls': self.graph_calls,
+            'sub_requests': self.sub_requests,
+            'total_ms': self.total_ms,
+            'levels': list(self.levels)
+        }
+
+
+class OrgCrawler:
+    """Breadth-first org crawler that fans each level out over a shared worker pool.
+
+    Each level is packed into Graph $batch calls of graph_client.batch_size
+    sub-requests, and the batches for a level run concurrently. Nodes are
+    keyed by user id and every directReports record is used as the child
+    node as-is, so only the root is fetched on its own.
+    """
+
+    def __init__(self, graph_client, max_concurrency: int = 8):
+        self.graph_client = graph_client
+        self.max_concurrency = max(1, max_concurrency)
+        # One pool for the whole process so concurrent requests share the Graph budget
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='org-crawler')
+
+    def run_batched(self, batch_fn, items: List[Any], stats: Optional[CrawlStats] = None) -> List[Any]:
+        """Split items into $batch-sized chunks, run them on the pool and return results in order"""
+        size = self.graph_client.batch_size
+        chunks = [items[start:start + size] for start in range(0, len(items), size)]
+
+        if getattr(self.graph_client, 'runtime', None):
+            # The client sends every chunk concurrently on its event loop, so no pool threads are needed
+            results = batch_fn(items)
+            if stats:
+                for chunk in chunks:
+                    stats.count_call(len(chunk))
+            return results
+
+        def run(chunk):
+            results = batch_fn(chunk)
+            if stats:
+                stats.count_call(len(chunk))
+            return results
+
+        results = []
+        for chunk_results in self._executor.map(run, chunks):
+            results.extend(chunk_results)
+        return results
+
+    def _fetch_direct_reports(self, user_ids: List[str], stats: CrawlStats) -> List[List[Dict]]:
+        """Fetch every page of directReports for each user id"""
+        pages = self.run_batched(self.graph_client.get_direct_reports_for_users, user_ids, stats)
+        reports = [(page or {}).get('value', []) for page in pages]
+
+        pending = {index: page['@odata.nextLink'] for index, page in enumerate(pages)
+                   if page and page.get('@odata.nextLink')}
+        while pending:
+            indexes = list(pending)
+            next_pages = self.run_batched(self.graph_client.get_next_pages,
+                                           [pending[index] for index in indexes], stats)
+            pending = {}
+            for index, page in zip(indexes, next_pages):
+                if not page:
+                    continue
+                reports[index].extend(page.get('value', []))
+                if page.get('@odata.nextLink'):
+                    pending[index] = page['@odata.nextLink']
+
+        return reports
+
+    def crawl(self, root_email: str, stats: Optional[CrawlStats] = None,
+              on_level: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+              max_depth: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Build the nested {'user', 'children'} hierarchy below root_email.
+
+        on_level, if given, is called with the users of each level as soon as
+        that level is known (root first), before its direct reports are fetched.
+        max_depth, if given, stops after that many levels of reports, leaving the
+        nodes at the last level with no children fetched.
+        """
+        if stats is None:
+            stats = CrawlStats()
+
+        level_started = time.perf_counter()
+        user = self.graph_client.get_user_by_email(root_email)
+        stats.count_call()
+        if not user:
+            stats.finish()
+            return None
+
+        root = {'user': user, 'children': []}
+        visited = {user['id']}
+        level = [root]
+        depth = 0
+
+        while level and (max_depth is None or depth < max_depth):
+            if on_level:
+                on_level([node['user'] for node in level])
+            calls_before = stats.graph_calls if depth else 0
+            reports = self._fetch_direct_reports([node['user']['id'] for node in level], stats)
+
+            next_level = []
+            for node, direct_reports in zip(level, reports):
+                for report in direct_reports:
+                    if report.get('@odata.type', '#microsoft.graph.user') != '#microsoft.graph.user':
+                        continue
+                    if not report.get('id') or report['id'] in visited:
+                        continue
+                    visited.add(report['id'])
+                    child = {'user': report, 'children': []}
+                    node['children'].append(child)
+                    next_level.append(child)
+
+            stats.record_level(depth, len(level), stats.graph_calls - calls_before,
+                               time.perf_counter() - level_started)
+            level_started = time.perf_counter()
+            level = next_level
+            depth += 1
+
+        if level and on_level:
+            on_level([node['user'] for node in level])
+        stats.finish()
+        logger.info(f"Crawled org for {root_email}: {len(visited)} users, "
+                    f"{stats.graph_calls} Graph calls, {depth} levels in {stats.total_ms}ms")
+        return root
@@ -0,0 +1,147 @@
+"""
+Photo Cache Module
+Caches Graph profile photos in a byte-capped memory LRU in front of a disk store
+"""
+
+import hashlib
+import os
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+
+class CachedPhoto:
+    """Photo bytes with a strong ETag derived from their content"""
+
+    __slots__ = ('data', 'etag')
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.etag = hashlib.sha256(data).hexdigest()[:32]
+
+
+class PhotoCache:
+    """Memory LRU (capped by total bytes) in front of a directory of photo files.
+
+    Users without a photo are cached as negative entries for `negative_ttl`
+    seconds so we don't ask Graph again on every render.
+    """
+
+    def __init__(self, cache_dir: Optional[str], memory_bytes: int = 64 * 1024 * 1024,
+                 ttl: int = 7 * 24 * 3600, negative_ttl: int = 24 * 3600):
+        self.cache_dir = cache_dir
+        self.memory_bytes = memory_bytes
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, Tuple[Optional[CachedPhoto], float, int]]" = OrderedDict()
+        self._memory_used = 0
+        self._stats = {'memory_hits': 0, 'disk_hits': 0, 'negative_hits': 0, 'misses': 0, 'stores': 0}
+
+        if cache_dir:
+            try:
+                os.makedirs(cache_dir, exist_ok=True)
+            except OSError as e:
+                logger.error(f"Photo cache disk store unavailable at {cache_dir}, using memory only: {e}")
+                self.cache_dir = None
+
+    def _paths(self, key):
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.cache_dir, f"{name}.jpg"), os.path.join(self.cache_dir, f"{name}.none")
+
+    def _remember(self, key, photo, expires_at):
+        size = len(photo.data) if photo else 0
+        if size > self.memory_bytes:
+            return
+        old = self._memory.pop(key, None)
+        if old:
+            self._memory_used -= old[2]
+        self._memory[key] = (photo, expires_at, size)
+        self._memory_used += size
+        while self._memory_used > self.memory_bytes:
+            _, (_, _, evicted_size) = self._memory.popitem(last=False)
+            self._memory_used -= evicted_size
+
+    def _read_disk(self, key, now):
+        photo_path, none_path = self._paths(key)
+        try:
+            if os.path.exists(photo_path):
+                expires_at = os.path.getmtime(photo_path) + self.ttl
+                if expires_at > now:
+                    with open(photo_path, 'rb') as f:
+                        return True, CachedPhoto(f.read()), expires_at
+            elif os.path.exists(none_path):
+                expires_at = os.path.getmtime(none_path) + self.negative_ttl
+                if expires_at > now:
+                    return True, None, expires_at
+        except OSError as e:
+            logger.error(f"Photo cache read failed for {key}: {e}")
+        return False, None, 0
+
+    def get(self, key: str) -> Tuple[bool, Optional[CachedPhoto]]:
+        """Return (found, photo). photo is None when the user is cached as having no photo."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and entry[1] > now:
+                self._memory.move_to_end(key)
+                self._stats['memory_hits'] += 1
+                if entry[0] is None:
+                    self._stats['negative_hits'] += 1
+                return True, entry[0]
+
+        if self.cache_dir:
+            found, photo, expires_at = self._read_disk(key, now)
+            if found:
+                with self._lock:
+                    self._remember(key, photo, expires_at)
+                    self._stats['disk_hits'] += 1
+                    if photo is None:
+                        self._stats['negative_hits'] += 1
+                return True, photo
+
+        with self._lock:
+            self._stats['misses'] += 1
+        return False, None
+
+    def put(self, key: str, data: Optional[bytes]) -> Optional[CachedPhoto]:
+        """Store photo bytes, or None to record that the user has no photo"""
+        photo = CachedPhoto(data) if data else None
+        expires_at = time.time() + (self.ttl if photo else self.negative_ttl)
+
+        with self._lock:
+            self._remember(key, photo, expires_at)
+            self._stats['stores'] += 1
+
+        if self.cache_dir:
+            photo_path, none_path = self._paths(key)
+            try:
+                if photo:
+                    tmp_path = f"{photo_path}.{threading.get_ident()}.tmp"
+                    with open(tmp_path, 'wb') as f:
+                        f.write(photo.data)
+                    os.replace(tmp_path, photo_path)
+                    if os.path.exists(none_path):
+                        os.remove(none_path)
+                else:
+                    with open(none_path, 'wb'):
+                        pass
+                    if os.path.exists(photo_path):
+                        os.remove(photo_path)
+            except OSError as e:
+                logger.error(f"Photo cache write failed for {key}: {e}")
+
+        return photo
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['memory_entries'] = len(self._memory)
+            stats['memory_bytes'] = self._memory_used
+        lookups = stats['memory_hits'] + stats['disk_hits'] + stats['misses']
+        stats['hit_rate'] = round((lookups - stats['misses']) / lookups, 3) if lookups else None
+        return stats
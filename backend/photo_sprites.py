@@ -0,0 +1,137 @@
+"""
+Photo Sprites Module
+Sized profile-photo thumbnails and sprite atlases that pack a whole hierarchy's photos into one image
+"""
+
+import io
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from PIL import Image
+
+from photo_cache import CachedPhoto
+
+logger = logging.getLogger(__name__)
+
+# Square sizes Graph serves from /users/{id}/photos/{size}/$value
+GRAPH_PHOTO_SIZES = [48, 64, 96, 120, 240, 360, 432, 504, 648]
+
+
+def graph_photo_size(requested: int) -> int:
+    """Smallest Graph photo size at least as large as the requested size"""
+    for size in GRAPH_PHOTO_SIZES:
+        if size >= requested:
+            return size
+    return GRAPH_PHOTO_SIZES[-1]
+
+
+def resize_photo(data: bytes, size: int) -> bytes:
+    """Center-crop a photo to a square and downscale it to size x size JPEG"""
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert('RGB')
+        side = min(image.size)
+        left = (image.width - side) // 2
+        top = (image.height - side) // 2
+        image = image.crop((left, top, left + side, top + side))
+        if side != size:
+            image = image.resize((size, size), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format='JPEG', quality=85, optimize=True)
+        return output.getvalue()
+
+
+class PhotoSpriteBuilder:
+    """Builds and caches JPEG atlas sheets plus a JSON index for all photos in a hierarchy.
+
+    load_photos(user_ids, size) must return one thumbnail (bytes or None) per id.
+    Users without a photo are left out of the index so clients can draw their
+    default avatar without another request. Each sheet holds at most max_tiles
+    photos, so a large hierarchy is split across several sheets and only one
+    sheet is ever decoded in memory while building.
+    """
+
+    def __init__(self, load_photos: Callable[[List[str], int], List[Optional[bytes]]],
+                 ttl: int = 3600, max_entries: int = 32, max_tiles: int = 1024):
+        self.load_photos = load_photos
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_tiles = max_tiles
+        self._lock = threading.Lock()
+        self._sprites: "OrderedDict[Tuple[str, int], Tuple[List[CachedPhoto], Dict[str, Any], float]]" = OrderedDict()
+
+    def get_sprite(self, key: str, size: int,
+                   list_user_ids: Callable[[], Optional[List[str]]]) -> Optional[Tuple[List[CachedPhoto], Dict[str, Any]]]:
+        """Return (sheet images, index), building the sheets if they aren't cached.
+
+        list_user_ids is only called on a cache miss; returning None means the
+        hierarchy could not be found and no sprite is built.
+        """
+        cache_key = (key, size)
+        with self._lock:
+            entry = self._sprites.get(cache_key)
+            if entry and entry[2] > time.time():
+                self._sprites.move_to_end(cache_key)
+                return entry[0], entry[1]
+
+        user_ids = list_user_ids()
+        if user_ids is None:
+            return None
+        sheets, index = self._build(user_ids, size)
+
+        with self._lock:
+            self._sprites[cache_key] = (sheets, index, time.time() + self.ttl)
+            self._sprites.move_to_end(cache_key)
+            while len(self._sprites) > self.max_entries:
+                self._sprites.popitem(last=False)
+        return sheets, index
+
+    def _build_sheet(self, photos: List[Tuple[str, bytes]], size: int,
+                     sheet: int, positions: Dict[str, List[int]]) -> Tuple[CachedPhoto, int, int]:
+        columns = max(1, math.ceil(math.sqrt(len(photos))))
+        rows = max(1, math.ceil(len(photos) / columns))
+        atlas = Image.new('RGB', (columns * size, rows * size), (255, 255, 255))
+
+        for slot, (user_id, data) in enumerate(photos):
+            x, y = (slot % columns) * size, (slot // columns) * size
+            try:
+                with Image.open(io.BytesIO(data)) as photo:
+                    photo = photo.convert('RGB')
+                    if photo.size != (size, size):
+                        photo = photo.resize((size, size), Image.LANCZOS)
+                    atlas.paste(photo, (x, y))
+                positions[user_id] = [sheet, x, y]
+            except Exception as e:
+                logger.warning(f"Skipping unreadable photo for {user_id} in sprite: {e}")
+
+        output = io.BytesIO()
+        atlas.save(output, format='JPEG', quality=85, optimize=True)
+        return CachedPhoto(output.getvalue()), atlas.width, atlas.height
+
+    def _build(self, user_ids: List[str], size: int) -> Tuple[List[CachedPhoto], Dict[str, Any]]:
+        started = time.perf_counter()
+        user_ids = list(dict.fromkeys(user_ids))
+        positions: Dict[str, List[int]] = {}
+        sheets: List[CachedPhoto] = []
+        sheet_index = []
+        # Load and paste one sheet's worth of users at a time so memory stays bounded by max_tiles
+        for start in range(0, max(1, len(user_ids)), self.max_tiles):
+            batch = user_ids[start:start + self.max_tiles]
+            photos = [(user_id, data) for user_id, data in zip(batch, self.load_photos(batch, size)) if data]
+            if not photos and sheets:
+                continue
+            image, width, height = self._build_sheet(photos, size, len(sheets), positions)
+            sheets.append(image)
+            sheet_index.append({'width': width, 'height': height, 'etag': image.etag})
+
+        index = {
+            'size': size,
+            'sheets': sheet_index,
+            'positions': positions
+        }
+        logger.info(f"Built photo sprite with {len(positions)} of {len(user_ids)} users on {len(sheets)} sheets in "
+                    f"{time.perf_counter() - started:.2f}s ({sum(len(sheet.data) for sheet in sheets)} bytes)")
+        return sheets, index
@@ -0,0 +1,172 @@
+"""
+Prompt Builder Module
+Compact, token-budgeted team location context for the LLM system prompt
+"""
+
+import math
+import threading
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from team_context_store import team_context_id
+
+logger = logging.getLogger(__name__)
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding('cl100k_base')
+except Exception:
+    # tiktoken is optional; without it token counts are estimated from length
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Count tokens with tiktoken when installed, else estimate about 4 characters per token"""
+    if _encoding is not None:
+        return len(_encoding.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def tokenizer_name() -> str:
+    return 'tiktoken' if _encoding is not None else 'estimate'
+
+
+def member_region(member: Dict[str, Any]) -> str:
+    """City-level location of a team member; street addresses are never included"""
+    user = member.get('user') or {}
+    parts = [user.get(field) for field in ('city', 'state', 'country') if user.get(field)]
+    if parts:
+        return ', '.join(parts)
+
+    address = (member.get('location') or {}).get('address')
+    if not address:
+        return 'Unknown'
+    # Geocoded addresses end with "City, Region Postcode, Country"; keep the coarse tail only
+    return ', '.join(part.strip() for part in address.split(',')[-2:])
+
+
+def _cell(value) -> str:
+    return str(value or '').replace('|', '/').replace('\n', ' ').strip()
+
+
+class TeamPromptBuilder:
+    """Encodes team data into the smallest context that fits a token budget, cached by content hash.
+
+    People are grouped by region with counts. Three encodings are tried in order
+    until one fits: a table row per person (name, title, department, accuracy),
+    names only per region, then per-region aggregates, truncated to the budget.
+    """
+
+    MODES = ('rows', 'names', 'aggregates')
+
+    def __init__(self, token_budget: int = 6000, cache_size: int = 64):
+        self.token_budget = token_budget
+        self.cache_size = cache_size
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, Tuple[str, Dict[str, Any]]]" = OrderedDict()
+
+    def build(self, team_data: List[Dict[str, Any]], team_hash: Optional[str] = None) -> Tuple[str, Dict[str, Any]]:
+        """Return (context text, info) where info reports the mode chosen and the tokens used.
+
+        team_hash is the roster's team-context id when the caller already has it.
+        """
+        key = team_hash or team_context_id(team_data)
+        with self._lock:
+            entry = self._cache.get(key)
+            if entry:
+                self._cache.move_to_end(key)
+                return entry[0], dict(entry[1], cached=True)
+
+        context, info = self._encode(team_data)
+        with self._lock:
+            self._cache[key] = (context, info)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        logger.info(f"Built team context for {info['members']} members: {info['mode']} mode, "
+                    f"{info['tokens']} of {self.token_budget} tokens")
+        return context, dict(info, cached=False)
+
+    def _encode(self, team_data):
+        regions: Dict[str, List[Dict[str, Any]]] = {}
+        for member in team_data:
+            regions.setdefault(member_region(member), []).append(member)
+        # Largest groups first so truncation drops the long tail
+        groups = sorted(regions.items(), key=lambda item: (-len(item[1]), item[0]))
+
+        for mode in self.MODES:
+            context = getattr(self, f'_encode_{mode}')(groups)
+            tokens = count_tokens(context)
+            if tokens <= self.token_budget or mode == 'aggregates':
+                break
+
+        if tokens > self.token_budget:
+            context = self._truncate(groups, context)
+            tokens = count_tokens(context)
+
+        info = {
+            'mode': mode,
+            'tokens': tokens,
+            'budget': self.token_budget,
+            'members': len(team_data),
+            'regions': len(groups),
+            'tokenizer': tokenizer_name()
+        }
+        return context, info
+
+    @staticmethod
+    def _encode_rows(groups):
+        lines = ['Format: "## region (count)" then one row per person: name|title|department|accuracy']
+        for region, members in groups:
+            lines.append(f"## {region} ({len(members)})")
+            for member in members:
+                user = member.get('user') or {}
+                lines.append('|'.join([
+                    _cell(user.get('displayName') or 'Unknown'),
+                    _cell(user.get('jobTitle')),
+                    _cell(user.get('department')),
+                    _cell(member.get('location_type'))
+                ]))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _encode_names(groups):
+        lines = ['Format: "region (count): names"']
+        for region, members in groups:
+            names = ', '.join(_cell((member.get('user') or {}).get('displayName') or 'Unknown') for member in members)
+            lines.append(f"{region} ({len(members)}): {names}")
+        return '\n'.join(lines)
+
+    @staticmethod
+    def _encode_aggregates(groups):
+        lines = ['Format: region|members|top titles (individual names omitted to fit the context budget)']
+        for region, members in groups:
+            titles: Dict[str, int] = {}
+            for member in members:
+                title = (member.get('user') or {}).get('jobTitle')
+                if title:
+                    titles[title] = titles.get(title, 0) + 1
+            top_titles = ', '.join(f"{title} x{count}" for title, count in
+                                   sorted(titles.items(), key=lambda item: -item[1])[:3])
+            lines.append(f"{_cell(region)}|{len(members)}|{top_titles}")
+        return '\n'.join(lines)
+
+    def _truncate(self, groups, context):
+        """Drop the smallest regions from an aggregate context until it fits, noting what was left out"""
+        lines = context.split('\n')
+
+        def candidate(kept):
+            # lines[0] is the format header, lines[i] describes groups[i - 1]
+            omitted = groups[kept - 1:]
+            note = (f"... {len(omitted)} more regions with "
+                    f"{sum(len(members) for _, members in omitted)} members not listed")
+            return '\n'.join(lines[:kept] + [note])
+
+        low, high = 2, len(lines) - 1
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count_tokens(candidate(middle)) <= self.token_budget:
+                low = middle
+            else:
+                high = middle - 1
+        return candidate(low)
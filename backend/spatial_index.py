@@ -0,0 +1,156 @@
+"""
+Spatial Index Module
+Grid-bucketed index over geocoded team members with vectorized haversine nearest/radius queries
+"""
+
+import math
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def haversine_km(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray, cos_lats: np.ndarray) -> np.ndarray:
+    """Great-circle distance in km from one point (degrees) to arrays of points (radians, with cos(lat))"""
+    lat_r, lon_r = math.radians(lat), math.radians(lon)
+    a = np.sin((lats - lat_r) / 2) ** 2 + math.cos(lat_r) * cos_lats * np.sin((lons - lon_r) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """Members with a location, bucketed into cell_degrees x cell_degrees grid cells.
+
+    Points are stored sorted by cell so a radius query only computes distances
+    for the cells its bounding box touches. k-nearest queries compute every
+    distance in one vectorized pass and partially sort, which stays in the
+    low milliseconds for tens of thousands of members.
+    """
+
+    def __init__(self, members: List[Dict[str, Any]], cell_degrees: float = 1.0):
+        started = time.perf_counter()
+        located = [member for member in members
+                   if (member.get('location') or {}).get('latitude') is not None
+                   and (member.get('location') or {}).get('longitude') is not None]
+
+        self.cell_degrees = cell_degrees
+        self.columns = int(math.ceil(360 / cell_degrees))
+        lats = np.array([member['location']['latitude'] for member in located], dtype=np.float64)
+        lons = np.array([member['location']['longitude'] for member in located], dtype=np.float64)
+
+        cells = self._cells(lats, lons)
+        order = np.argsort(cells, kind='stable')
+        self.members = [located[i] for i in order]
+        self.cells = cells[order]
+        self.lats = np.radians(lats[order])
+        self.lons = np.radians(lons[order])
+        self.cos_lats = np.cos(self.lats)
+        self.size = len(self.members)
+        self.build_ms = round((time.perf_counter() - started) * 1000, 1)
+
+    def _cells(self, lats, lons):
+        rows = np.floor((np.clip(lats, -90, 90) + 90) / self.cell_degrees).astype(np.int64)
+        columns = np.floor((np.mod(lons + 180, 360)) / self.cell_degrees).astype(np.int64) % self.columns
+        return rows * self.columns + columns
+
+    def _results(self, positions, distances):
+        return [(self.members[position], float(distance)) for position, distance in zip(positions, distances)]
+
+    def nearest(self, lat: float, lon: float, k: int) -> List[Tuple[Dict[str, Any], float]]:
+        """The k members closest to (lat, lon) as (member, distance_km), nearest first"""
+        if not self.size or k <= 0:
+            return []
+        distances = haversine_km(lat, lon, self.lats, self.lons, self.cos_lats)
+        k = min(k, self.size)
+        positions = np.argpartition(distances, k - 1)[:k] if k < self.size else np.arange(self.size)
+        positions = positions[np.argsort(distances[positions], kind='stable')]
+        return self._results(positions, distances[positions])
+
+    def _candidates(self, lat, lon, radius_km):
+        """Positions in grid cells overlapping the query's bounding box, or None to scan everything"""
+        lat_span = radius_km / KM_PER_DEGREE
+        lat_min, lat_max = lat - lat_span, lat + lat_span
+        widest = math.cos(math.radians(min(89.9, max(abs(lat_min), abs(lat_max)))))
+        lon_span = lat_span / widest
+        # Once the box is within a cell of the whole globe its two edges land in the same or
+        # adjacent cells and the column range would collapse instead of covering every column
+        if lat_min <= -90 or lat_max >= 90 or 2 * lon_span + self.cell_degrees >= 360:
+            return None
+
+        row_start = int((lat_min + 90) // self.cell_degrees)
+        row_end = int((lat_max + 90) // self.cell_degrees)
+        column_start = int(((lon - lon_span + 180) % 360) // self.cell_degrees)
+        column_end = int(((lon + lon_span + 180) % 360) // self.cell_degrees)
+        # A box crossing the antimeridian wraps into two column ranges
+        column_ranges = ([(column_start, column_end)] if column_start <= column_end
+                         else [(column_start, self.columns - 1), (0, column_end)])
+
+        slices = []
+        for row in range(row_start, row_end + 1):
+            for first, last in column_ranges:
+                low = np.searchsorted(self.cells, row * self.columns + first, side='left')
+                high = np.searchsorted(self.cells, row * self.columns + last, side='right')
+                if high > low:
+                    slices.append(np.arange(low, high))
+        return np.concatenate(slices) if slices else np.array([], dtype=np.int64)
+
+    def within(self, lat: float, lon: float, radius_km: float,
+               limit: Optional[int] = None) -> List[Tuple[Dict[str, Any], float]]:
+        """Every member within radius_km of (lat, lon) as (member, distance_km), nearest first"""
+        if not self.size or radius_km < 0:
+            return []
+        positions = self._candidates(lat, lon, radius_km)
+        if positions is None:
+            positions = np.arange(self.size)
+        if not len(positions):
+            return []
+
+        distances = haversine_km(lat, lon, self.lats[positions], self.lons[positions], self.cos_lats[positions])
+        inside = distances <= radius_km
+        positions, distances = positions[inside], distances[inside]
+        order = np.argsort(distances, kind='stable')
+        if limit:
+            order = order[:limit]
+        return self._results(positions[order], distances[order])
+
+
+class SpatialIndexCache:
+    """Small LRU of spatial indexes keyed by team-context id (the content hash of the roster)"""
+
+    def __init__(self, max_entries: int = 16, cell_degrees: float = 1.0):
+        self.max_entries = max_entries
+        self.cell_degrees = cell_degrees
+        self._lock = threading.Lock()
+        self._indexes: "OrderedDict[str, SpatialIndex]" = OrderedDict()
+        self._stats = {'hits': 0, 'builds': 0}
+
+    def get_or_build(self, key: str, load_members: Callable[[], List[Dict[str, Any]]]) -> SpatialIndex:
+        with self._lock:
+            index = self._indexes.get(key)
+            if index:
+                self._indexes.move_to_end(key)
+                self._stats['hits'] += 1
+                return index
+
+        index = SpatialIndex(load_members(), self.cell_degrees)
+        logger.info(f"Built spatial index over {index.size} located members in {index.build_ms}ms")
+        with self._lock:
+            self._indexes[key] = index
+            self._stats['builds'] += 1
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['indexes'] = len(self._indexes)
+            stats['members'] = sum(index.size for index in self._indexes.values())
+        return stats
@@ -0,0 +1,79 @@
+"""
+Team Context Store Module
+Content-addressed server-side rosters so chat requests can refer to map data by id
+"""
+
+import hashlib
+import json
+import threading
+import time
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def team_context_id(team_data: List[Dict[str, Any]]) -> str:
+    """Content address of a roster: the same map data always gets the same id"""
+    payload = json.dumps(team_data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()[:32]
+
+
+class TeamContextStore:
+    """LRU of rosters keyed by content hash, with a TTL and a bound on the total number of members.
+
+    Entries live in this process only; with several workers a chat request may
+    land on one that never saw the roster, so clients fall back to sending the
+    roster when an id is unknown.
+    """
+
+    def __init__(self, ttl: int = 3600, max_members: int = 200000):
+        self.ttl = ttl
+        self.max_members = max_members
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._member_total = 0
+        self._stats = {'stores': 0, 'hits': 0, 'misses': 0, 'evictions': 0}
+
+    def _evict(self, context_id):
+        entry = self._entries.pop(context_id, None)
+        if entry:
+            self._member_total -= len(entry['team_data'])
+
+    def put(self, team_data: List[Dict[str, Any]]) -> str:
+        """Store a roster and return its id (storing the same roster again just refreshes it)"""
+        context_id = team_context_id(team_data)
+        with self._lock:
+            self._evict(context_id)
+            self._entries[context_id] = {'team_data': team_data, 'expires_at': time.time() + self.ttl}
+            self._member_total += len(team_data)
+            self._stats['stores'] += 1
+
+            now = time.time()
+            for expired_id in [key for key, entry in self._entries.items() if entry['expires_at'] <= now]:
+                self._evict(expired_id)
+            while self._member_total > self.max_members and len(self._entries) > 1:
+                self._evict(next(iter(self._entries)))
+                self._stats['evictions'] += 1
+        return context_id
+
+    def get(self, context_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Return the roster for an id, or None if it is unknown or has expired"""
+        with self._lock:
+            entry = self._entries.get(context_id)
+            if entry and entry['expires_at'] > time.time():
+                self._entries.move_to_end(context_id)
+                self._stats['hits'] += 1
+                return entry['team_data']
+            if entry:
+                self._evict(context_id)
+            self._stats['misses'] += 1
+            return None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['members'] = self._member_total
+        return stats
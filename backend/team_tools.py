@@ -0,0 +1,252 @@
+"""
+Team Tools Module
+In-process team query functions exposed to the LLM through function calling
+"""
+
+import json
+import re
+import threading
+import logging
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+import numpy as np
+
+from prompt_builder import member_region
+from spatial_index import SpatialIndex
+
+logger = logging.getLogger(__name__)
+
+MAX_RESULTS = 100
+
+# OpenAI function-calling schemas for the methods of TeamQueryTools
+TOOL_DEFINITIONS = [
+    {
+        'type': 'function',
+        'function': {
+            'name': 'count_by_location',
+            'description': 'Count team members per city or per country, largest groups first.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'group_by': {'type': 'string', 'enum': ['city', 'country']},
+                    'top': {'type': 'integer', 'description': 'Number of groups to return (default 20)'}
+                },
+                'required': []
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'members_near_place',
+            'description': 'Team members within a radius of a place (city, address or landmark), nearest first.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'place': {'type': 'string'},
+                    'radius_km': {'type': 'number', 'description': 'Search radius in km (default 100)'},
+                    'limit': {'type': 'integer', 'description': 'Maximum members to return (default 25)'}
+                },
+                'required': ['place']
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'members_in_timezone_band',
+            'description': 'Team members whose current UTC offset in hours (daylight saving included) lies between '
+                           'min_utc_offset and max_utc_offset.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'min_utc_offset': {'type': 'number'},
+                    'max_utc_offset': {'type': 'number'},
+                    'limit': {'type': 'integer', 'description': 'Maximum members to return (default 50)'}
+                },
+                'required': ['min_utc_offset', 'max_utc_offset']
+            }
+        }
+    },
+    {
+        'type': 'function',
+        'function': {
+            'name': 'find_members_by_name',
+            'description': 'Look up team members whose name contains the given text.',
+            'parameters': {
+                'type': 'object',
+                'properties': {
+                    'name': {'type': 'string'},
+                    'limit': {'type': 'integer', 'description': 'Maximum members to return (default 10)'}
+                },
+                'required': ['name']
+            }
+        }
+    }
+]
+
+
+def zone_offset_hours(zone: str, windows_zones: Optional[Dict[str, str]] = None,
+                      now: Optional[datetime] = None) -> Optional[float]:
+    """Current UTC offset of a 'UTC+HH:MM', Windows or IANA time zone name; None if unknown"""
+    match = re.match(r'^UTC([+-])(\d{1,2}):?(\d{2})?$', zone)
+    if match:
+        offset = int(match.group(2)) + int(match.group(3) or 0) / 60
+        return -offset if match.group(1) == '-' else offset
+    # Graph usually returns Windows names such as "India Standard Time"
+    name = (windows_zones or {}).get(zone.lower(), zone)
+    try:
+        tzinfo = ZoneInfo(name)
+    except (ZoneInfoNotFoundError, ValueError):
+        return None
+    return (now or datetime.now(timezone.utc)).astimezone(tzinfo).utcoffset().total_seconds() / 3600
+
+
+def utc_offset_hours(member: Dict[str, Any], windows_zones: Optional[Dict[str, str]] = None,
+                     now: Optional[datetime] = None) -> Optional[float]:
+    """UTC offset from the user's time zone, else estimated from longitude"""
+    zone = ((member.get('user') or {}).get('timeZone') or '').strip()
+    offset = zone_offset_hours(zone, windows_zones, now) if zone else None
+    if offset is not None:
+        return offset
+    longitude = (member.get('location') or {}).get('longitude')
+    if longitude is None:
+        return None
+    return float(round(longitude / 15))
+
+
+def describe_member(member: Dict[str, Any]) -> Dict[str, Any]:
+    """What a tool reveals about a member: never the street address"""
+    user = member.get('user') or {}
+    return {
+        'name': user.get('displayName') or 'Unknown',
+        'title': user.get('jobTitle'),
+        'department': user.get('department'),
+        'location': member_region(member),
+        'accuracy': member.get('location_type')
+    }
+
+
+class TeamQueryTools:
+    """Exact answers to team location questions, computed over in-memory indexes of one roster"""
+
+    def __init__(self, members: List[Dict[str, Any]], geocode: Callable[[str], Optional[Dict[str, Any]]],
+                 spatial_index: Optional[SpatialIndex] = None, windows_zones: Optional[Dict[str, str]] = None):
+        self.members = members
+        self.geocode = geocode
+        self.spatial_index = spatial_index or SpatialIndex(members)
+
+        self.by_city: Dict[str, List[Dict[str, Any]]] = {}
+        self.by_country: Dict[str, List[Dict[str, Any]]] = {}
+        for member in members:
+            region = member_region(member)
+            self.by_city.setdefault(region, []).append(member)
+            country = (member.get('user') or {}).get('country') or region.split(',')[-1].strip()
+            self.by_country.setdefault(country, []).append(member)
+
+        self.names = [((member.get('user') or {}).get('displayName') or '').lower() for member in members]
+        # windows_zones maps lower-cased Windows zone names to IANA names (OfflineLocator.windows_zones)
+        now = datetime.now(timezone.utc)
+        offsets = [utc_offset_hours(member, windows_zones, now) for member in members]
+        self.offsets = np.array([np.nan if offset is None else offset for offset in offsets], dtype=np.float64)
+
+        location_types: Dict[str, int] = {}
+        for member in members:
+            location_type = member.get('location_type', 'unknown')
+            location_types[location_type] = location_types.get(location_type, 0) + 1
+        self._summary = {
+            'members': len(members),
+            'located': self.spatial_index.size,
+            'cities': len(self.by_city),
+            'countries': len(self.by_country),
+            'location_types': location_types
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        """Team-level counts for the tool-mode system prompt"""
+        return dict(self._summary)
+
+    @staticmethod
+    def _limit(value, default):
+        return max(1, min(int(value or default), MAX_RESULTS))
+
+    def count_by_location(self, group_by: str = 'city', top: int = 20) -> Dict[str, Any]:
+        groups = self.by_country if group_by == 'country' else self.by_city
+        ranked = sorted(groups.items(), key=lambda item: (-len(item[1]), item[0]))
+        return {
+            'group_by': 'country' if group_by == 'country' else 'city',
+            'total_groups': len(groups),
+            'groups': [{'location': location, 'count': len(members)}
+                       for location, members in ranked[:self._limit(top, 20)]]
+        }
+
+    def members_near_place(self, place: str, radius_km: float = 100, limit: int = 25) -> Dict[str, Any]:
+        location = self.geocode(place)
+        if not location:
+            return {'error': f'Could not find a location for {place}'}
+        matches = self.spatial_index.within(location['latitude'], location['longitude'], float(radius_km or 100))
+        return {
+            'place': location.get('address', place),
+            'radius_km': float(radius_km or 100),
+            'total': len(matches),
+            'members': [dict(describe_member(member), distance_km=round(distance, 1))
+                        for member, distance in matches[:self._limit(limit, 25)]]
+        }
+
+    def members_in_timezone_band(self, min_utc_offset: float, max_utc_offset: float, limit: int = 50) -> Dict[str, Any]:
+        low, high = sorted((float(min_utc_offset), float(max_utc_offset)))
+        positions = np.flatnonzero((self.offsets >= low) & (self.offsets <= high))
+        return {
+            'min_utc_offset': low,
+            'max_utc_offset': high,
+            'total': len(positions),
+            'members': [dict(describe_member(self.members[position]), utc_offset=float(self.offsets[position]))
+                        for position in positions[:self._limit(limit, 50)]]
+        }
+
+    def find_members_by_name(self, name: str, limit: int = 10) -> Dict[str, Any]:
+        needle = (name or '').strip().lower()
+        if not needle:
+            return {'error': 'name is required'}
+        matches = [member for member, member_name in zip(self.members, self.names) if needle in member_name]
+        return {
+            'total': len(matches),
+            'members': [describe_member(member) for member in matches[:self._limit(limit, 10)]]
+        }
+
+    def execute(self, name: str, arguments: str) -> Dict[str, Any]:
+        """Run one tool call from the model; bad calls come back as an error result for the model to see"""
+        if name not in {tool['function']['name'] for tool in TOOL_DEFINITIONS}:
+            return {'error': f'Unknown tool {name}'}
+        try:
+            kwargs = json.loads(arguments or '{}')
+            return getattr(self, name)(**kwargs)
+        except Exception as e:
+            logger.warning(f"Tool call {name}({arguments}) failed: {e}")
+            return {'error': str(e)}
+
+
+class TeamToolsCache:
+    """Small LRU of TeamQueryTools keyed by team-context id"""
+
+    def __init__(self, max_entries: int = 16):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._tools: "OrderedDict[str, TeamQueryTools]" = OrderedDict()
+
+    def get_or_build(self, key: str, build: Callable[[], TeamQueryTools]) -> TeamQueryTools:
+        with self._lock:
+            tools = self._tools.get(key)
+            if tools:
+                self._tools.move_to_end(key)
+                return tools
+
+        tools = build()
+        with self._lock:
+            self._tools[key] = tools
+            while len(self._tools) > self.max_entries:
+                self._tools.popitem(last=False)
+        return tools
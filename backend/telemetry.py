@@ -0,0 +1,225 @@
+"""
+Telemetry Module
+Counters and latency histograms for outbound Graph, Azure Maps and OpenAI calls, Prometheus
+rendering, and per-request phase timings for the Server-Timing header
+"""
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from requests.adapters import HTTPAdapter
+
+# Seconds; spans a cached Graph call up to a slow LLM completion
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+METRIC_DESCRIPTIONS = {
+    'whereat_outbound_requests_total': ('counter', 'Outbound HTTP calls by service, operation and status code '
+                                                   '("error" when no response arrived)'),
+    'whereat_outbound_request_duration_seconds': ('histogram', 'Outbound HTTP call latency until response headers'),
+    'whereat_http_requests_total': ('counter', 'API requests served by endpoint, method and status code'),
+    'whereat_http_request_duration_seconds': ('histogram', 'API request latency until the response starts'),
+    'whereat_request_phase_duration_seconds': ('histogram', 'Time API requests spent crawling, geocoding and in the LLM'),
+    'whereat_user_locations_total': ('counter', 'User locations served, by source (store or resolved) and type'),
+}
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Graph path segments that are ids or sizes; replaced so operations stay a small fixed set
+_GRAPH_PLACEHOLDERS = {'users': '{id}', 'groups': '{id}', 'photos': '{size}'}
+_GRAPH_NAMED_SEGMENTS = {'delta', '$batch'}
+
+
+def outbound_operation(url: str) -> Tuple[str, str]:
+    """(service, operation) for an outbound URL, e.g. ('graph', 'users/{id}/directReports')"""
+    path = urlsplit(url).path
+    if '/oauth2/' in path:
+        return 'login', 'token'
+    if path.endswith('/chat/completions'):
+        return 'openai', 'chat_completions'
+    if '/search/address' in path:
+        return 'maps', 'search_address_batch' if '/batch/' in path else 'search_address'
+
+    segments = [segment for segment in path.split('/') if segment]
+    if segments and segments[0] in ('v1.0', 'beta'):
+        segments = segments[1:]
+    operation = []
+    for segment in segments:
+        placeholder = _GRAPH_PLACEHOLDERS.get(operation[-1]) if operation else None
+        operation.append(placeholder if placeholder and segment not in _GRAPH_NAMED_SEGMENTS else segment)
+    return 'graph', '/'.join(operation) or '/'
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels: Labels, extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(labels) + ([extra] if extra else [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+class Metrics:
+    """Thread-safe in-process counters and histograms, rendered in the Prometheus text format.
+
+    Each worker process keeps its own values, as prometheus_client does
+    without multiprocess mode; scrape every worker or run a single one.
+    """
+
+    def __init__(self, buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self._counters: Dict[str, Dict[Labels, float]] = {}
+        # name -> labels -> [per-bucket counts..., +Inf count], sum
+        self._histograms: Dict[str, Dict[Labels, Tuple[list, list]]] = {}
+
+    @staticmethod
+    def _labels(labels: Optional[Dict[str, str]]) -> Labels:
+        return tuple(sorted((labels or {}).items()))
+
+    def increment(self, name: str, labels: Optional[Dict[str, str]] = None, amount: float = 1):
+        key = self._labels(labels)
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            series[key] = series.get(key, 0) + amount
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict[str, str]] = None):
+        key = self._labels(labels)
+        with self._lock:
+            counts, total = self._histograms.setdefault(name, {}).setdefault(
+                key, ([0] * (len(self.buckets) + 1), [0.0]))
+            for index, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[index] += 1
+                    break
+            else:
+                counts[-1] += 1
+            total[0] += seconds
+
+    def record_outbound(self, url: str, status, seconds: float):
+        """Count and time one outbound call; status is the HTTP status code, or 'error' if none arrived"""
+        service, operation = outbound_operation(url)
+        self.increment('whereat_outbound_requests_total',
+                       {'service': service, 'operation': operation, 'status': str(status)})
+        self.observe('whereat_outbound_request_duration_seconds', seconds,
+                     {'service': service, 'operation': operation})
+
+    def render(self) -> str:
+        with self._lock:
+            counters = {name: dict(series) for name, series in self._counters.items()}
+            histograms = {name: {labels: (list(counts), total[0]) for labels, (counts, total) in series.items()}
+                          for name, series in self._histograms.items()}
+
+        lines = []
+        for name in sorted(set(counters) | set(histograms)):
+            kind, description = METRIC_DESCRIPTIONS.get(name, ('histogram' if name in histograms else 'counter', name))
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in sorted(counters.get(name, {}).items()):
+                lines.append(f'{name}{_format_labels(labels)} {value:g}')
+            for labels, (counts, total) in sorted(histograms.get(name, {}).items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{_format_labels(labels, ("le", f"{bound:g}"))} {cumulative}')
+                cumulative += counts[-1]
+                lines.append(f'{name}_bucket{_format_labels(labels, ("le", "+Inf"))} {cumulative}')
+                lines.append(f'{name}_sum{_format_labels(labels)} {total:.6f}')
+                lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+        return '\n'.join(lines) + '\n'
+
+
+metrics = Metrics()
+
+
+class InstrumentedHTTPAdapter(HTTPAdapter):
+    """requests adapter that counts and times every call, including ones that fail without a response"""
+
+    def send(self, request, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = super().send(request, *args, **kwargs)
+        except Exception:
+            metrics.record_outbound(request.url, 'error', time.perf_counter() - started)
+            raise
+        metrics.record_outbound(request.url, response.status_code, time.perf_counter() - started)
+        return response
+
+
+class InstrumentedAsyncTransport(httpx.AsyncBaseTransport):
+    """httpx transport wrapper that counts and times every call, including timeouts and connection errors"""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport):
+        self.transport = transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            metrics.record_outbound(str(request.url), 'error', time.perf_counter() - started)
+            raise
+        metrics.record_outbound(str(request.url), response.status_code, time.perf_counter() - started)
+        return response
+
+    async def aclose(self):
+        await self.transport.aclose()
+
+
+def instrumented_async_transport(limits: httpx.Limits) -> InstrumentedAsyncTransport:
+    """Pooled transport for an httpx.AsyncClient; the client ignores its own limits= once given a transport"""
+    return InstrumentedAsyncTransport(httpx.AsyncHTTPTransport(limits=limits))
+
+
+class RequestTimings:
+    """Wall time per phase of the API request running in the current context"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+        self.active = set()
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'crawl;dur=812.4, geocode;dur=95.0, total;dur=921.7'"""
+        parts = [f'{name};dur={seconds * 1000:.1f}' for name, seconds in self.phases.items()]
+        parts.append(f'total;dur={(time.perf_counter() - self.started) * 1000:.1f}')
+        return ', '.join(parts)
+
+
+_request_timings: ContextVar[Optional[RequestTimings]] = ContextVar('request_timings', default=None)
+
+
+def start_request_timings() -> RequestTimings:
+    timings = RequestTimings()
+    _request_timings.set(timings)
+    return timings
+
+
+def current_request_timings() -> Optional[RequestTimings]:
+    return _request_timings.get()
+
+
+@contextmanager
+def timed_phase(name: str) -> Iterator[None]:
+    """Add the enclosed wall time to the current request's phase (usable as a decorator).
+
+    Nested use of the same phase counts once; outside a request, or on another
+    thread, it does nothing.
+    """
+    timings = _request_timings.get()
+    if timings is None or name in timings.active:
+        yield
+        return
+    timings.active.add(name)
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.active.discard(name)
+        timings.phases[name] = timings.phases.get(name, 0.0) + time.perf_counter() - started
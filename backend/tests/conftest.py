@@ -0,0 +1,53 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# Backend modules are flat files imported by name, as app.py does
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+MOCK_USERS, MOCK_FANOUT = 60, 4
+
+
+@pytest.fixture(scope='session')
+def mock_services():
+    """The Graph, Azure Maps and OpenAI stand-in from mock_graph_server.py, serving a small tenant"""
+    from benchmark import _free_port, _serve
+    from mock_graph_server import create_app
+
+    port = _free_port()
+    mock = create_app(MOCK_USERS, MOCK_FANOUT)
+    server = _serve(mock, port)
+    mock.base_url = f'http://127.0.0.1:{port}'
+    yield mock
+    server.shutdown()
+
+
+@pytest.fixture(scope='session')
+def backend(mock_services, tmp_path_factory):
+    """app.py imported against the mock services, with its caches in a temporary directory"""
+    base_url = mock_services.base_url
+    cache_dir = tmp_path_factory.mktemp('backend')
+    os.environ.update({
+        'AZURE_TENANT_ID': 'tenant', 'AZURE_CLIENT_ID': 'client', 'AZURE_CLIENT_SECRET': 'secret',
+        'AZURE_LOGIN_BASE_URL': base_url, 'GRAPH_API_BASE_URL': f'{base_url}/v1.0',
+        'AZURE_MAPS_BASE_URL': base_url, 'AZURE_MAPS_API_KEY': 'maps-key',
+        'AZURE_OPENAI_ENDPOINT': f'{base_url}/openai', 'AZURE_OPENAI_API_KEY': 'openai-key',
+        'AZURE_OPENAI_DEPLOYMENT': 'gpt',
+        'GEOCODE_CACHE_PATH': str(cache_dir / 'geocode.sqlite3'),
+        'LOCATION_STORE_PATH': str(cache_dir / 'locations.sqlite3'),
+        'PHOTO_CACHE_DIR': str(cache_dir / 'photos'),
+        'DIRECTORY_INDEX_ENABLED': 'false', 'ASYNC_IO_ENABLED': 'false',
+    })
+    return importlib.import_module('app')
+
+
+@pytest.fixture
+def client(backend):
+    return backend.app.test_client()
+
+
+@pytest.fixture
+def mock_email():
+    return 'user0@contoso.example'
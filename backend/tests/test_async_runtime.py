@@ -0,0 +1,79 @@
+import asyncio
+import time
+
+import pytest
+
+from async_runtime import AsyncRuntime
+from geocode_cache import GeocodeCache
+from org_crawler import CrawlStats, OrgCrawler
+
+
+@pytest.fixture(scope='module')
+def runtime():
+    runtime = AsyncRuntime(max_connections=10)
+    yield runtime
+    runtime.close()
+
+
+def test_coroutines_share_the_loop(runtime):
+    async def fan_out():
+        return await asyncio.gather(*(asyncio.sleep(0.1, result=index) for index in range(20)))
+
+    started = time.perf_counter()
+    assert runtime.run(fan_out()) == list(range(20))
+    assert time.perf_counter() - started < 0.5
+
+
+def test_iterate_yields_as_items_arrive_and_closes_early_exits(runtime):
+    closed = []
+
+    async def numbers():
+        try:
+            for number in range(5):
+                await asyncio.sleep(0)
+                yield number
+        finally:
+            closed.append(True)
+
+    assert list(runtime.iterate(numbers())) == [0, 1, 2, 3, 4]
+    for number in runtime.iterate(numbers()):
+        if number == 1:
+            break
+    assert closed == [True, True]
+
+
+def test_run_refuses_to_block_the_loop_thread(runtime):
+    async def nested():
+        inner = asyncio.sleep(0)
+        try:
+            runtime.run(inner)
+        finally:
+            inner.close()
+
+    with pytest.raises(RuntimeError):
+        runtime.run(nested())
+
+
+def test_async_graph_path_matches_the_blocking_one(backend):
+    client = backend.GraphAPIClient(runtime=backend.async_runtime)
+    emails = [f'user{index}@contoso.example' for index in range(45)]
+    assert client.get_users_by_email(emails) == backend.graph_client.get_users_by_email(emails)
+
+    stats = CrawlStats()
+    hierarchy = OrgCrawler(client).crawl('user0@contoso.example', stats)
+    blocking = OrgCrawler(backend.graph_client).crawl('user0@contoso.example')
+    assert len(backend.collect_hierarchy_users(hierarchy)) == len(backend.collect_hierarchy_users(blocking))
+
+
+def test_async_geocoding_matches_the_blocking_one(backend, tmp_path, monkeypatch):
+    service = backend.location_service
+    monkeypatch.setattr(service, 'local_geocoder', None)
+    addresses = [f'{index} Qxvlorp Lane, Vrznak' for index in range(30)]
+
+    monkeypatch.setattr(service, 'cache', GeocodeCache(str(tmp_path / 'blocking.sqlite3')))
+    blocking = service.geocode_addresses(addresses)
+    monkeypatch.setattr(service, 'cache', GeocodeCache(str(tmp_path / 'async.sqlite3')))
+    monkeypatch.setattr(service, 'runtime', backend.async_runtime)
+    assert service.geocode_addresses(addresses) == blocking
+    # Results are cached from the request thread once the loop hands them back
+    assert service.cache.get(addresses[0]) == (True, blocking[addresses[0]])
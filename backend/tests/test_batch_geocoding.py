@@ -0,0 +1,62 @@
+import pytest
+import requests
+
+from geocode_cache import GeocodeCache
+
+
+@pytest.fixture
+def service(backend, tmp_path, monkeypatch):
+    """app's LocationService with a fresh cache and no offline gazetteer"""
+    monkeypatch.setattr(backend.location_service, 'cache', GeocodeCache(str(tmp_path / 'geocode.sqlite3')))
+    monkeypatch.setattr(backend.location_service, 'local_geocoder', None)
+    monkeypatch.setattr(backend.location_service, 'batch_enabled', True)
+    return backend.location_service
+
+
+def _addresses(count):
+    return [f'{index} Qxvlorp Lane, Vrznak' for index in range(count)]
+
+
+def _maps_calls(mock_services):
+    return mock_services.call_counts['maps_batch'], mock_services.call_counts['maps']
+
+
+def test_unique_addresses_go_out_in_batches(backend, service, mock_services, monkeypatch):
+    monkeypatch.setattr(backend, 'AZURE_MAPS_BATCH_SIZE', 10)
+    addresses = _addresses(25)
+    before = _maps_calls(mock_services)
+
+    results = service.geocode_addresses(addresses + addresses[:5] + [None, ''])
+
+    assert set(results) == set(addresses) and all(results.values())
+    batches, singles = _maps_calls(mock_services)
+    assert (batches - before[0], singles - before[1]) == (3, 0)
+
+    # Everything is now a cache hit
+    service.geocode_addresses(addresses)
+    assert _maps_calls(mock_services) == (batches, singles)
+
+
+def test_failed_batch_falls_back_to_single_searches(service, mock_services, monkeypatch):
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError('batch endpoint down')
+
+    monkeypatch.setattr(service.session, 'post', unreachable)
+    before = _maps_calls(mock_services)[1]
+    results = service.geocode_addresses(_addresses(4))
+    assert len(results) == 4 and all(results.values())
+    assert _maps_calls(mock_services)[1] - before == 4
+
+
+def test_offices_are_geocoded_only_where_the_address_did_not_resolve(backend, service, monkeypatch):
+    users = [{'streetAddress': '1 Qxvlorp Lane', 'city': 'Vrznak', 'officeLocation': 'Tower A'},
+             {'officeLocation': 'Tower B'}]
+    queried = []
+    geocode_addresses = service.geocode_addresses
+    monkeypatch.setattr(service, 'geocode_addresses',
+                        lambda addresses: queried.append([a for a in addresses if a]) or geocode_addresses(addresses))
+
+    geocoded = backend.geocode_users(users)
+
+    assert queried == [['1 Qxvlorp Lane, Vrznak'], ['Tower B']]
+    assert set(geocoded) == {'1 Qxvlorp Lane, Vrznak', 'Tower B'}
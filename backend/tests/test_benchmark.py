@@ -0,0 +1,59 @@
+import io
+
+import pytest
+
+from benchmark import print_summary, summarize
+from mock_graph_server import CITY_COORDINATES, create_app, generate_org, geocode_result, service_for_path
+
+
+def test_summarize_percentiles_and_throughput():
+    summary = summarize([float(ms) for ms in range(1, 101)], 2.0, errors=3)
+    assert summary['requests'] == 100 and summary['errors'] == 3
+    assert summary['p50_ms'] == pytest.approx(50.5) and summary['max_ms'] == 100.0
+    assert summary['throughput_rps'] == 50.0
+    assert summarize([], 1.0, errors=2) == {'requests': 0, 'errors': 2}
+
+
+def test_print_summary_compares_against_baseline():
+    workload = {'cold_ms': 10.0, 'p50_ms': 5.0, 'p95_ms': 8.0, 'p99_ms': 9.0, 'throughput_rps': 100.0,
+                'outbound_per_request': 1.5, 'errors': 0}
+    report = {'scenarios': [{'name': 'small', 'workloads': {'map-data': workload}}]}
+    baseline = {'scenarios': [{'name': 'small', 'workloads': {'map-data': dict(workload, p95_ms=16.0)}}]}
+    output = io.StringIO()
+    print_summary(report, baseline, file=output)
+    assert '0.50x (16.0ms)' in output.getvalue()
+
+
+@pytest.mark.parametrize('path, service', [
+    ('/tenant/oauth2/v2.0/token', 'login'),
+    ('/search/address/json', 'maps'),
+    ('/search/address/batch/json', 'maps_batch'),
+    ('/openai/deployments/gpt/chat/completions', 'openai'),
+    ('/v1.0/$batch', 'graph_batch'),
+    ('/v1.0/users/x', 'graph'),
+    ('/metrics', None),
+])
+def test_service_for_path(path, service):
+    assert service_for_path(path) == service
+
+
+def test_geocode_result_is_stable_and_knows_cities():
+    city, (latitude, longitude) = next(iter(CITY_COORDINATES.items()))
+    assert geocode_result(f'1 Main St, {city}')['results'][0]['position'] == {'lat': latitude, 'lon': longitude}
+    assert geocode_result('Nowhere at all') == geocode_result('Nowhere at all')
+
+
+def test_generated_org_is_a_tree_with_the_given_fanout():
+    users, reports = generate_org(30, 4)
+    assert len(users) == 30
+    assert all(len(report_ids) <= 4 for report_ids in reports.values())
+    assert sum(1 for user in users.values() if not user.get('_manager')) == 1
+
+
+def test_mock_counts_batch_items_separately():
+    mock = create_app(10, 3)
+    client = mock.test_client()
+    client.get('/v1.0/users/user0@contoso.example')
+    client.get('/v1.0/users/user1@contoso.example', headers={'X-Batch-Item': '1'})
+    client.get('/metrics')
+    assert dict(mock.call_counts) == {'graph': 1, 'graph_batch_items': 1}
@@ -0,0 +1,53 @@
+import json
+
+import pytest
+
+ANSWER = 'Most of the team is in Redmond.'
+
+
+def _events(response):
+    events = []
+    for frame in response.get_data(as_text=True).split('\n\n'):
+        if frame:
+            event, data = frame.split('\n', 1)
+            events.append((event[len('event: '):], json.loads(data[len('data: '):])))
+    return events
+
+
+@pytest.fixture
+def team_context_id(client, mock_email):
+    return client.get(f'/api/map-data/{mock_email}').get_json()['team_context_id']
+
+
+def test_completion_streams_as_delta_events(client, team_context_id):
+    response = client.post('/api/chat/stream', json={'userQuery': 'Where is everyone?',
+                                                     'teamContextId': team_context_id, 'mode': 'prompt'})
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['X-Accel-Buffering'] == 'no'
+
+    events = _events(response)
+    deltas = [data['content'] for event, data in events if event == 'delta']
+    assert len(deltas) > 1 and ''.join(deltas) == ANSWER
+    event, done = events[-1]
+    assert event == 'done' and done['chunks'] == len(deltas) and done['characters'] == len(ANSWER)
+    assert done['first_token_ms'] <= done['total_ms']
+
+
+def test_tool_mode_reports_its_tool_calls(client, team_context_id):
+    events = _events(client.post('/api/chat/stream', json={'userQuery': 'Which countries?',
+                                                           'teamContextId': team_context_id, 'mode': 'tools'}))
+    _, done = events[-1]
+    assert done['mode'] == 'tools' and [call['name'] for call in done['tool_calls']] == ['count_by_location']
+    assert ''.join(data['content'] for event, data in events if event == 'delta') == ANSWER
+
+
+def test_blocking_chat_gives_the_same_answer(client, team_context_id):
+    response = client.post('/api/chat', json={'userQuery': 'Where is everyone?', 'teamContextId': team_context_id})
+    assert response.get_json()['response'] == ANSWER
+
+
+def test_stream_requests_are_validated_before_streaming(client):
+    assert client.post('/api/chat/stream', json={'userQuery': ''}).status_code == 400
+    assert client.post('/api/chat/stream', json={'userQuery': 'hi', 'mode': 'psychic'}).status_code == 400
+    expired = client.post('/api/chat/stream', json={'userQuery': 'hi', 'teamContextId': 'gone'})
+    assert expired.status_code == 404 and expired.get_json()['code'] == 'team_context_expired'
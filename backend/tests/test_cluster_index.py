@@ -0,0 +1,33 @@
+import random
+
+import pytest
+
+from cluster_index import ClusterIndex
+
+
+def _members(count, seed=3):
+    rng = random.Random(seed)
+    members = [{'user': {'id': str(i), 'displayName': f'User {i}'},
+                'location': {'latitude': rng.uniform(-60, 60), 'longitude': rng.uniform(-180, 180)},
+                'location_type': 'address', 'border_color': 'green'} for i in range(count)]
+    # Two people at the same spot never split into separate cells
+    members += [{'user': {'id': user_id}, 'location': {'latitude': 10.0, 'longitude': 10.0},
+                 'location_type': 'phone', 'border_color': 'orange'} for user_id in ('same-a', 'same-b')]
+    return members
+
+
+@pytest.mark.parametrize('zoom', [3, 8, 16, 17])
+def test_point_cluster_id_pages_its_full_record(zoom):
+    index = ClusterIndex(_members(1500))
+    points = [feature for feature in index.query(-180, -85, 180, 85, zoom) if feature['type'] == 'point']
+    assert points
+    for point in points:
+        leaves = index.leaves(point['cluster_id'], limit=10)
+        assert point['id'] in [member['user']['id'] for member in leaves['members']]
+
+
+def test_world_query_covers_every_located_member():
+    index = ClusterIndex(_members(1500) + [{'user': {'id': 'nowhere'}, 'location': None}])
+    features = index.query(-180, -85, 180, 85, 4)
+    assert sum(feature.get('count', 1) for feature in features) == index.size == 1502
+    assert index.unlocated == 1
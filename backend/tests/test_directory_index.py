@@ -0,0 +1,93 @@
+from directory_index import DirectoryIndex
+
+
+def _user(index):
+    return {'id': f'id-{index}', 'mail': f'user{index}@contoso.example', 'displayName': f'User {index}'}
+
+
+class FakeGraph:
+    """/users (two pages, manager expanded) and /users/delta over user i reporting to (i - 1) // 3"""
+
+    def __init__(self, user_count):
+        self.listing = [dict(_user(index), manager={'id': f'id-{(index - 1) // 3}'} if index else None)
+                        for index in range(user_count)]
+        self.delta_pages = {}
+
+    def make_graph_request(self, endpoint, params=None):
+        if endpoint == '/users/delta':
+            return {'value': [], '@odata.deltaLink': 'delta-0'}
+        half = len(self.listing) // 2
+        return {'value': [dict(user) for user in self.listing[:half]], '@odata.nextLink': 'users-page-2'}
+
+    def follow_next_link(self, link):
+        if link == 'users-page-2':
+            return {'value': [dict(user) for user in self.listing[len(self.listing) // 2:]]}
+        return self.delta_pages.get(link)
+
+
+def _index(user_count=13):
+    graph = FakeGraph(user_count)
+    index = DirectoryIndex(graph, 'id,mail,displayName')
+    index.bootstrap()
+    return graph, index
+
+
+def _ids(node):
+    return [node['user']['id']] + [user_id for child in node['children'] for user_id in _ids(child)]
+
+
+def test_bootstrap_indexes_every_page():
+    _, index = _index()
+    assert index.ready and index.delta_link == 'delta-0'
+    assert index.lookup_id('USER4@contoso.example') == 'id-4'
+    assert len(_ids(index.build_hierarchy('user0@contoso.example'))) == 13
+    assert index.report_counts('id-0') == (3, 12)
+    assert index.report_counts('id-1') == (3, 3)
+
+
+def test_max_depth_limits_the_tree():
+    _, index = _index()
+    root = index.build_hierarchy('id-0', max_depth=1)
+    assert [child['children'] for child in root['children']] == [[], [], []]
+
+
+def test_delta_moves_renames_and_removes_users():
+    graph, index = _index()
+    before = index.build_hierarchy('user1@contoso.example')
+    graph.delta_pages['delta-0'] = {'value': [
+        {'id': 'id-4', 'manager@delta': [{'id': 'id-2'}]},
+        {'id': 'id-5', 'mail': 'renamed@contoso.example'},
+        {'id': 'id-6', '@removed': {'reason': 'deleted'}},
+    ], '@odata.nextLink': 'delta-0b'}
+    graph.delta_pages['delta-0b'] = {'value': [], '@odata.deltaLink': 'delta-1'}
+
+    index.apply_delta()
+
+    assert index.last_delta_changes == 3 and index.delta_link == 'delta-1'
+    assert index.lookup_id('renamed@contoso.example') == 'id-5'
+    assert index.lookup_id('user5@contoso.example') is None
+    assert index.report_counts('id-1') == (1, 1)
+    assert index.report_counts('id-2') == (4, 4)
+    # Trees already handed out are not changed underneath their readers
+    assert sorted(_ids(before)) == ['id-1', 'id-4', 'id-5', 'id-6']
+    assert before['children'][1]['user']['mail'] == 'user5@contoso.example'
+
+
+def test_failed_delta_rebootstraps():
+    graph, index = _index()
+    graph.listing.append(dict(_user(13), manager={'id': 'id-4'}))
+    index.apply_delta()
+    assert index.lookup_id('user13@contoso.example') == 'id-13'
+
+
+def test_app_answers_from_a_ready_index(backend, client, mock_email, mock_services, monkeypatch):
+    index = DirectoryIndex(backend.graph_client, backend.USER_SELECT_FIELDS)
+    index.bootstrap()
+    monkeypatch.setattr(backend, 'directory_index', index)
+    graph_calls = sum(mock_services.call_counts.values())
+
+    response = client.get(f'/api/org-hierarchy/{mock_email}?depth=1').get_json()
+
+    assert response['crawl_stats']['source'] == 'directory-index'
+    assert response['data']['descendant_count'] == len(index.users) - 1
+    assert sum(mock_services.call_counts.values()) == graph_calls
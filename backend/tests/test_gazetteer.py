@@ -0,0 +1,67 @@
+import pytest
+
+from gazetteer import DATA_DIR, Gazetteer, LocalGeocoder, build_gazetteer, load_office_locations, normalize_place
+from offline_locator import OfflineLocator
+
+PLACES = [
+    {'names': ['Springfield'], 'latitude': 39.8, 'longitude': -89.6, 'country': 'US', 'admin1': 'IL', 'population': 114000},
+    {'names': ['Springfield'], 'latitude': 42.1, 'longitude': -72.6, 'country': 'US', 'admin1': 'MA', 'population': 155000},
+    {'names': ['Mumbai', 'Bombay', 'BOM'], 'latitude': 19.1, 'longitude': 72.9, 'country': 'IN', 'admin1': '16',
+     'population': 12691836},
+    {'names': ['Zürich'], 'latitude': 47.4, 'longitude': 8.5, 'country': 'CH', 'admin1': 'ZH', 'population': 341730},
+]
+ADMIN1 = {('US', 'IL'): 'Illinois', ('US', 'MA'): 'Massachusetts', ('IN', '16'): 'Maharashtra'}
+
+
+@pytest.fixture(scope='module')
+def gazetteer(tmp_path_factory):
+    path = tmp_path_factory.mktemp('gazetteer') / 'gazetteer.bin'
+    assert build_gazetteer(PLACES, ADMIN1, str(path)) == (4, 5)
+    return Gazetteer(str(path))
+
+
+@pytest.fixture(scope='module')
+def geocoder(gazetteer, tmp_path_factory):
+    offices = tmp_path_factory.mktemp('offices') / 'offices.csv'
+    offices.write_text('# test offices\ncode,latitude,longitude,address\nRED-B42,47.6,-122.1,Redmond Campus\n'
+                       'Springfield,1.0,2.0,Springfield Works\n')
+    return LocalGeocoder(gazetteer, OfflineLocator(), load_office_locations(str(offices)))
+
+
+def test_lookup_prefers_population_then_region(gazetteer):
+    assert gazetteer.lookup('springfield')['admin1'] == 'MA|Massachusetts'
+    assert gazetteer.lookup('Springfield', 'US', 'Illinois')['admin1'] == 'IL|Illinois'
+    assert gazetteer.lookup('Springfield', region='IL', require_region=True)['latitude'] == pytest.approx(39.8)
+    assert gazetteer.lookup('Springfield', region='TX', require_region=True) is None
+    assert gazetteer.lookup('Springfield', 'FR') is None
+
+
+def test_names_are_accent_insensitive_and_alternates_are_indexed(gazetteer):
+    assert normalize_place(' Zürich! ') == 'zurich'
+    assert gazetteer.lookup('ZURICH')['name'] == 'Zürich'
+    assert gazetteer.lookup('bombay')['name'] == 'Mumbai'
+    # All-caps alternates are codes, not names
+    assert gazetteer.lookup('BOM') is None
+
+
+def test_place_strings_resolve_locally(geocoder):
+    assert geocoder.resolve('Springfield, IL, USA')['address'] == 'Springfield, IL, United States'
+    assert geocoder.resolve('Mumbai, India')['address'] == 'Mumbai, Maharashtra, India'
+    assert geocoder.resolve('Germany')['address'] == 'Germany'
+
+
+def test_office_codes_and_sites(geocoder):
+    assert geocoder.resolve('red b42')['address'] == 'Redmond Campus'
+    assert geocoder.resolve('Springfield/Bldg 3')['address'] == 'Springfield Works'
+    assert geocoder.resolve('Zurich Floor 2')['address'] == 'Zürich, Switzerland'
+
+
+@pytest.mark.parametrize('text', ['1 Main St, Springfield, IL', 'a, b, c, d', 'Atlantis', '', None])
+def test_street_addresses_and_unknowns_are_left_for_azure_maps(geocoder, text):
+    assert geocoder.resolve(text) is None
+
+
+def test_shipped_gazetteer_knows_the_mock_cities():
+    geocoder = LocalGeocoder(Gazetteer(f'{DATA_DIR}/gazetteer.bin'), OfflineLocator())
+    assert geocoder.resolve('Redmond, WA, United States')['address'] == 'Redmond, WA, United States'
+    assert geocoder.resolve('London/B4')['address'].startswith('London')
@@ -0,0 +1,100 @@
+import pytest
+import requests
+
+from geocode_cache import GeocodeCache, normalize_address
+
+SEATTLE = {'latitude': 47.6, 'longitude': -122.3, 'address': 'Seattle, WA'}
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return GeocodeCache(str(tmp_path / 'geocode.sqlite3'), memory_size=2)
+
+
+def test_normalized_spellings_share_an_entry(cache):
+    assert normalize_address('  Seattle ,WA. ') == normalize_address('seattle, wa') == 'seattle, wa'
+    cache.put('Seattle, WA', SEATTLE)
+    assert cache.get('SEATTLE ,  wa') == (True, SEATTLE)
+
+
+def test_entries_outlive_the_memory_tier(cache, tmp_path):
+    cache.put('Seattle, WA', SEATTLE)
+    cache.put('a', SEATTLE)
+    cache.put('b', SEATTLE)
+    assert cache.get('Seattle, WA') == (True, SEATTLE)
+    assert cache.stats()['disk_hits'] == 1
+
+    reopened = GeocodeCache(str(tmp_path / 'geocode.sqlite3'))
+    assert reopened.get('Seattle, WA') == (True, SEATTLE)
+
+
+def test_returned_locations_are_copies(cache):
+    cache.put('Seattle, WA', SEATTLE)
+    cache.get('Seattle, WA')[1]['latitude'] = 0
+    assert cache.get('Seattle, WA')[1]['latitude'] == 47.6
+
+
+def test_negative_entries_use_their_own_ttl(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'geocode.sqlite3'), ttl=3600, negative_ttl=0)
+    cache.put('Nowhere', None)
+    cache.put('Seattle, WA', SEATTLE)
+    assert cache.get('Nowhere') == (False, None)
+    assert cache.get('Seattle, WA') == (True, SEATTLE)
+
+    cache.negative_ttl = 3600
+    cache.put('Nowhere', None)
+    assert cache.get('Nowhere') == (True, None)
+    assert cache.stats()['negative_hits'] == 1
+
+
+def test_unusable_disk_path_falls_back_to_memory(tmp_path):
+    cache = GeocodeCache(str(tmp_path / 'missing' / 'geocode.sqlite3'))
+    cache.put('Seattle, WA', SEATTLE)
+    assert cache.get('Seattle, WA') == (True, SEATTLE)
+    assert 'disk_entries' not in cache.stats()
+
+
+class _Response:
+    def __init__(self, payload):
+        self.payload = payload
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.payload
+
+
+@pytest.fixture
+def service(backend, cache, monkeypatch):
+    """app's LocationService with a fresh cache and no offline gazetteer"""
+    monkeypatch.setattr(backend.location_service, 'cache', cache)
+    monkeypatch.setattr(backend.location_service, 'local_geocoder', None)
+    return backend.location_service
+
+
+def test_no_match_is_cached_but_transport_errors_are_not(service, cache, monkeypatch):
+    calls = []
+
+    def search(url, params=None, **kwargs):
+        calls.append(params['query'])
+        if params['query'] == 'Unreachable':
+            raise requests.ConnectionError('Azure Maps unreachable')
+        return _Response({'results': []})
+
+    monkeypatch.setattr(service.session, 'get', search)
+    assert service.geocode_address('Nowhere') is None
+    assert service.geocode_address('Nowhere') is None
+    assert service.geocode_address('Unreachable') is None
+    assert service.geocode_address('Unreachable') is None
+
+    assert calls == ['Nowhere', 'Unreachable', 'Unreachable']
+    assert cache.get('Nowhere') == (True, None)
+    assert cache.get('Unreachable') == (False, None)
+
+
+def test_found_addresses_are_served_from_the_cache(service, cache, mock_services):
+    before = mock_services.call_counts['maps']
+    first = service.geocode_address('12 Qxvlorp Lane, Vrznak')
+    assert first and service.geocode_address('12 qxvlorp lane ,vrznak') == first
+    assert mock_services.call_counts['maps'] - before == 1
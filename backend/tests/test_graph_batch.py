@@ -0,0 +1,27 @@
+def _calls(mock_services, service):
+    return mock_services.call_counts[service]
+
+
+def test_batch_results_come_back_in_order(backend, mock_services):
+    emails = [f'user{index}@contoso.example' for index in range(25)] + ['nobody@contoso.example']
+    batches_before = _calls(mock_services, 'graph_batch')
+
+    users = backend.graph_client.get_users_by_email(emails)
+
+    assert [user['mail'] for user in users[:-1]] == emails[:-1]
+    assert users[-1] is None
+    # 26 sub-requests at 20 per $batch
+    assert _calls(mock_services, 'graph_batch') - batches_before == 2
+
+
+def test_raw_results_carry_the_item_status(backend):
+    results = backend.graph_client.batch_graph_requests(
+        [('/users/user1@contoso.example', {'$select': 'id'}), ('/users/nobody@contoso.example', None)], raw=True)
+    assert results[0] == (200, {'id': '00000000-0000-0000-0000-000000000001'})
+    assert results[1][0] == 404
+
+
+def test_empty_batch_sends_nothing(backend, mock_services):
+    before = _calls(mock_services, 'graph_batch')
+    assert backend.graph_client.batch_graph_requests([]) == []
+    assert _calls(mock_services, 'graph_batch') == before
@@ -0,0 +1,122 @@
+import threading
+import time
+from email.utils import formatdate
+
+import pytest
+import requests
+
+from graph_transport import GraphTransport, RateLimiter, TokenProvider, parse_retry_after
+
+
+def _response(status, json_body=None, headers=None):
+    response = requests.Response()
+    response.status_code = status
+    response.headers.update(headers or {})
+    response._content = requests.compat.json.dumps(json_body or {}).encode()
+    return response
+
+
+class FakeSession:
+    """Hands out tokens on POST and replays scripted responses for every other request"""
+
+    def __init__(self, responses=(), expires_in=3599):
+        self.responses = list(responses)
+        self.expires_in = expires_in
+        self.token_posts = 0
+        self.sent = []
+        self._lock = threading.Lock()
+
+    def post(self, url, data=None, headers=None):
+        with self._lock:
+            self.token_posts += 1
+            token = f'token-{self.token_posts}'
+        time.sleep(0.01)
+        return _response(200, {'access_token': token, 'expires_in': self.expires_in})
+
+    def request(self, method, url, headers=None, **kwargs):
+        self.sent.append(headers['Authorization'])
+        return self.responses.pop(0)
+
+
+def _provider(session, refresh_margin=300):
+    return TokenProvider(session, 'https://login/token', 'client', 'secret', 'scope', refresh_margin)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('7') == 7.0
+    assert parse_retry_after('-3') == 0.0
+    assert 50 < parse_retry_after(formatdate(time.time() + 60, usegmt=True)) <= 60
+    assert parse_retry_after('soon') is None and parse_retry_after(None) is None
+
+
+def test_token_is_shared_and_refreshed_before_expiry():
+    session = FakeSession()
+    provider = _provider(session)
+    threads = [threading.Thread(target=provider.get_token) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert session.token_posts == 1 and provider.cached_token() == 'token-1'
+
+    # A token inside the refresh margin is replaced before Graph can reject it
+    expiring = FakeSession(expires_in=60)
+    provider = _provider(expiring, refresh_margin=300)
+    assert provider.get_token() == 'token-1'
+    assert provider.cached_token() is None
+    assert provider.get_token() == 'token-2'
+
+
+def test_rejected_token_is_refreshed_once():
+    session = FakeSession([_response(401), _response(200, {'ok': True})])
+    transport = GraphTransport(session, _provider(session), RateLimiter())
+    assert transport.request('GET', 'https://graph/users').json() == {'ok': True}
+    assert session.sent == ['Bearer token-1', 'Bearer token-2']
+
+    session.responses = [_response(401), _response(401)]
+    assert transport.request('GET', 'https://graph/users').status_code == 401
+
+
+def test_throttles_are_retried_after_retry_after():
+    session = FakeSession([_response(429, headers={'Retry-After': '0'}), _response(503), _response(200)])
+    limiter = RateLimiter(base_backoff=0.01)
+    transport = GraphTransport(session, _provider(session), limiter, max_retries=4)
+    assert transport.request('GET', 'https://graph/users').status_code == 200
+    assert limiter.throttle_count == 2 and len(session.sent) == 3
+
+    session.responses = [_response(429, headers={'Retry-After': '0'})] * 3
+    transport.max_retries = 2
+    assert transport.request('GET', 'https://graph/users').status_code == 429
+
+
+def test_backoff_grows_without_retry_after_and_resets_on_success():
+    limiter = RateLimiter(base_backoff=1.0, max_backoff=3.0)
+    assert [limiter.throttled(None) for _ in range(3)] == [1.0, 2.0, 3.0]
+    limiter.succeeded()
+    assert limiter.throttled(None) == 1.0
+
+
+def test_rate_cap_spaces_out_requests():
+    limiter = RateLimiter(max_rps=50)
+    started = time.perf_counter()
+    for _ in range(6):
+        limiter.wait()
+    assert time.perf_counter() - started == pytest.approx(0.1, abs=0.05)
+
+
+def test_throttled_batch_items_are_resent_alone(backend, monkeypatch):
+    bodies = []
+
+    def batch(method, url, headers=None, json=None):
+        bodies.append([item['url'] for item in json['requests']])
+        return _response(200, {'responses': [
+            {'id': item['id'], 'status': 429 if len(bodies) == 1 and item['id'] == '1' else 200,
+             'headers': {'Retry-After': '0'}, 'body': {'url': item['url']}}
+            for item in json['requests']]})
+
+    monkeypatch.setattr(backend.graph_client.transport, 'request', batch)
+    monkeypatch.setattr(backend.graph_client, 'rate_limiter', RateLimiter())
+    results = backend.graph_client.batch_graph_requests([('/users/a', None), ('/users/b', None), ('/users/c', None)])
+
+    assert bodies == [['/users/a', '/users/b', '/users/c'], ['/users/b']]
+    assert [result['url'] for result in results] == ['/users/a', '/users/b', '/users/c']
@@ -0,0 +1,85 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from hierarchy_cache import HierarchyCache
+
+
+def _tree():
+    """root -> a -> b, root -> c"""
+    b = {'user': {'id': 'id-b', 'mail': 'b@contoso.example'}, 'children': []}
+    a = {'user': {'id': 'id-a', 'mail': 'a@contoso.example', 'userPrincipalName': 'a.upn@contoso.example'},
+         'children': [b]}
+    c = {'user': {'id': 'id-c', 'mail': 'c@contoso.example'}, 'children': []}
+    return {'user': {'id': 'id-root', 'mail': 'root@contoso.example'}, 'children': [a, c]}
+
+
+def test_concurrent_requests_share_one_build():
+    cache = HierarchyCache()
+    builds = []
+    release = threading.Event()
+
+    def build(email):
+        builds.append(email)
+        release.wait(5)
+        return _tree()
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.get_or_build, 'Root@contoso.example', build) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        results = [future.result() for future in futures]
+
+    assert len(builds) == 1
+    assert sorted(from_cache for _, from_cache in results) == [False, True, True, True]
+    assert all(hierarchy is results[0][0] for hierarchy, _ in results)
+    assert cache.stats()['shared_builds'] == 3
+
+
+def test_members_are_answered_with_their_subtree():
+    cache = HierarchyCache()
+    cache.get_or_build('root@contoso.example', lambda email: _tree())
+    never = lambda email: pytest.fail('subtree rebuilt')
+
+    subtree, from_cache = cache.get_or_build('A.UPN@contoso.example', never)
+    assert from_cache and subtree['user']['id'] == 'id-a'
+    assert cache.peek('id-b')['user']['mail'] == 'b@contoso.example'
+    assert cache.stats()['subtree_hits'] == 2
+
+
+def test_failed_builds_are_not_cached():
+    cache = HierarchyCache()
+
+    def broken(email):
+        raise RuntimeError('Graph down')
+
+    with pytest.raises(RuntimeError):
+        cache.get_or_build('root@contoso.example', broken)
+    assert cache.get_or_build('root@contoso.example', lambda email: _tree())[1] is False
+
+
+def test_ttl_and_node_bound():
+    expired = HierarchyCache(ttl=0)
+    expired.get_or_build('root@contoso.example', lambda email: _tree())
+    assert expired.peek('root@contoso.example') is None
+
+    bounded = HierarchyCache(max_nodes=4)
+    bounded.get_or_build('root@contoso.example', lambda email: _tree())
+    assert bounded.peek('root@contoso.example') is not None
+    bounded.get_or_build('other@contoso.example',
+                         lambda email: {'user': {'id': 'id-x', 'mail': 'other@contoso.example'}, 'children': []})
+    assert bounded.peek('root@contoso.example') is None and bounded.peek('id-a') is None
+    assert bounded.stats()['evictions'] == 1
+
+
+def test_map_data_and_org_hierarchy_share_the_crawl(backend, client, mock_email, mock_services, monkeypatch):
+    monkeypatch.setattr(backend, 'hierarchy_cache', HierarchyCache())
+    client.get(f'/api/org-hierarchy/{mock_email}')
+    graph_calls = mock_services.call_counts['graph'] + mock_services.call_counts['graph_batch']
+
+    response = client.get('/api/org-hierarchy/user1@contoso.example').get_json()
+    assert response['crawl_stats']['source'] == 'cache'
+    assert client.get(f'/api/map-data/{mock_email}').get_json()['success']
+    assert mock_services.call_counts['graph'] + mock_services.call_counts['graph_batch'] == graph_calls
@@ -0,0 +1,51 @@
+import pytest
+
+from hierarchy_cache import HierarchyCache
+
+# The mock tenant gives user i the manager (i - 1) // 4, so user1 has 4 reports and 20 people below
+USER_1_ID = '00000000-0000-0000-0000-000000000001'
+
+
+@pytest.fixture
+def cold_cache(backend, monkeypatch):
+    cache = HierarchyCache()
+    monkeypatch.setattr(backend, 'hierarchy_cache', cache)
+    return cache
+
+
+def _child(node, user_id):
+    return next(child for child in node['children'] if child['user']['id'] == user_id)
+
+
+def test_cold_crawl_counts_reports_at_the_cut(client, mock_email, cold_cache):
+    root = client.get(f'/api/org-hierarchy/{mock_email}?depth=1').get_json()['data']
+
+    assert root['direct_report_count'] == 4 and root['descendant_count'] is None
+    for child in root['children']:
+        assert child['children'] == [] and not child['children_loaded']
+        assert child['direct_report_count'] == 4 and child['descendant_count'] is None
+
+
+def test_cut_uses_cached_subtrees_for_descendants(backend, client, mock_email, cold_cache):
+    backend.build_org_hierarchy('user1@contoso.example')
+    root = client.get(f'/api/org-hierarchy/{mock_email}?depth=1').get_json()['data']
+
+    assert _child(root, USER_1_ID)['descendant_count'] == 20
+    assert {child['descendant_count'] for child in root['children'] if child['user']['id'] != USER_1_ID} == {None}
+
+
+def test_cached_tree_gives_exact_counts(backend, client, mock_email, cold_cache):
+    backend.build_org_hierarchy(mock_email)
+    subtree = client.get(f'/api/org-subtree/{USER_1_ID}?depth=1').get_json()
+
+    assert subtree['crawl_stats']['source'] == 'cache'
+    node = subtree['data']
+    assert (node['direct_report_count'], node['descendant_count']) == (4, 20)
+    leaves = [grandchild for child in node['children'] for grandchild in child.get('children') or []]
+    assert leaves == []
+    assert all(child['children_loaded'] is False for child in node['children'] if child['direct_report_count'])
+
+
+def test_depth_is_validated(client, mock_email):
+    assert client.get(f'/api/org-hierarchy/{mock_email}?depth=x').status_code == 400
+    assert client.get(f'/api/org-subtree/{USER_1_ID}?depth=0').status_code == 400
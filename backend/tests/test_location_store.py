@@ -0,0 +1,97 @@
+import sqlite3
+import time
+
+import pytest
+import requests
+
+from location_store import LocationStore, location_fingerprint
+
+
+def _user(index, **fields):
+    user = {'id': f'user-{index}', 'displayName': f'User {index}', 'streetAddress': f'{index} Qxvlorp Lane',
+            'city': 'Vrznak', 'country': 'Zyxland', 'officeLocation': f'Qxv Tower {index}',
+            'businessPhones': ['+44 20 7946 0100'], 'timeZone': None}
+    user.update(fields)
+    return user
+
+
+def _record(user, location_type='address'):
+    return {'user': user, 'location': {'latitude': 1.0, 'longitude': 2.0, 'address': 'x'},
+            'location_type': location_type, 'border_color': 'green'}
+
+
+def _expires_at(store, user_id):
+    with sqlite3.connect(store.db_path) as db:
+        return db.execute('SELECT expires_at FROM user_location WHERE user_id = ?', (user_id,)).fetchone()[0]
+
+
+@pytest.fixture
+def store(tmp_path):
+    return LocationStore(str(tmp_path / 'locations.sqlite3'), ttl=3600, degraded_ttl=60)
+
+
+def test_fingerprint_tracks_location_fields_only():
+    user = _user(1)
+    assert location_fingerprint(user) == location_fingerprint(dict(user, jobTitle='CEO'))
+    assert location_fingerprint(user) != location_fingerprint(dict(user, city='Elsewhere'))
+
+
+def test_stored_location_is_reused_until_fields_change(store):
+    user = _user(1)
+    store.put_many([_record(user)])
+    assert store.get_many([user])[user['id']]['location_type'] == 'address'
+    assert store.get_many([dict(user, officeLocation='Moved')]) == {}
+    assert store.stats()['changed'] == 1
+
+
+def test_degraded_entries_expire_sooner(store):
+    store.put_many([_record(_user(1)), _record(_user(2), 'phone')], degraded_ids=['user-2'])
+    now = time.time()
+    assert _expires_at(store, 'user-1') > now + 3000
+    assert _expires_at(store, 'user-2') < now + 61
+
+
+def test_invalidate_by_type(store):
+    store.put_many([_record(_user(1)), _record(_user(2), 'phone')])
+    assert store.invalidate(location_types=['phone']) == 1
+    assert set(store.get_many([_user(1), _user(2)])) == {'user-1'}
+
+
+@pytest.fixture
+def isolated_locations(backend, store, monkeypatch):
+    """app's location resolution with a fresh store and no geocode cache"""
+    monkeypatch.setattr(backend, 'location_store', store)
+    monkeypatch.setattr(backend.location_service, 'cache', None)
+    return backend
+
+
+def test_transport_errors_are_not_stored(isolated_locations, store, monkeypatch):
+    backend = isolated_locations
+    users = [_user(index) for index in range(5)]
+
+    def unreachable(*args, **kwargs):
+        raise requests.ConnectionError('Azure Maps unreachable')
+
+    with monkeypatch.context() as outage:
+        outage.setattr(backend.location_service.session, 'get', unreachable)
+        outage.setattr(backend.location_service.session, 'post', unreachable)
+        during = backend.resolve_user_locations(users)
+    assert {info['location_type'] for info in during} == {'phone'}
+    assert store.stats()['stores'] == 0
+
+    after = backend.resolve_user_locations(users)
+    assert {info['location_type'] for info in after} == {'address'}
+    assert store.stats()['stores'] == len(users)
+
+
+def test_office_fallback_is_stored_as_degraded(isolated_locations, store, monkeypatch):
+    backend = isolated_locations
+    user = _user(7)
+    office = {'latitude': 3.0, 'longitude': 4.0, 'address': user['officeLocation']}
+    # The address is a definite no-match; the office resolves
+    monkeypatch.setattr(backend, 'geocode_users', lambda users: {
+        backend.build_user_address(user): None, user['officeLocation']: office})
+
+    [info] = backend.resolve_user_locations([user])
+    assert info['location_type'] == 'office'
+    assert _expires_at(store, user['id']) < time.time() + 61
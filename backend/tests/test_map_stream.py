@@ -0,0 +1,48 @@
+import json
+
+from conftest import MOCK_USERS
+
+
+def _ndjson(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines() if line]
+
+
+def test_stream_registers_the_streamed_roster_without_a_second_pass(backend, client, mock_email, monkeypatch):
+    def second_pass(*args, **kwargs):
+        raise AssertionError('the stream summary must not crawl or flatten the tree again')
+
+    monkeypatch.setattr(backend, 'build_org_hierarchy', second_pass)
+    monkeypatch.setattr(backend, 'flatten_hierarchy_for_map', second_pass)
+    records = _ndjson(client.get(f'/api/map-data/{mock_email}/stream'))
+
+    summary = records[-1]
+    assert summary['type'] == 'summary' and summary['count'] == MOCK_USERS
+    roster = backend.team_context_store.get(summary['team_context_id'])
+    assert [member['user']['id'] for member in roster] == [record['data']['user']['id'] for record in records[:-1]]
+
+
+def test_levels_arrive_root_first(client, mock_email):
+    records = _ndjson(client.get(f'/api/map-data/{mock_email}/stream'))
+    users = [record for record in records if record['type'] == 'user']
+
+    assert users[0]['depth'] == 0 and users[0]['data']['user']['mail'] == mock_email
+    depths = [record['depth'] for record in users]
+    assert depths == sorted(depths)
+    # 60 users with 4 reports each: levels of 1, 4, 16 and 39
+    assert records[-1]['levels'] == 4 == len(set(depths))
+    assert sum(records[-1]['location_types'].values()) == len(users)
+
+
+def test_sse_format_and_projection(client, mock_email):
+    response = client.get(f'/api/map-data/{mock_email}/stream?format=sse&fields=user.id,location_type')
+    assert response.mimetype == 'text/event-stream'
+    frames = [frame for frame in response.get_data(as_text=True).split('\n\n') if frame]
+    assert frames[0].startswith('event: user\n') and frames[-1].startswith('event: summary\n')
+    first = json.loads(frames[0].split('data: ', 1)[1])
+    assert set(first['data']) == {'user', 'location_type'} and set(first['data']['user']) == {'id'}
+
+
+def test_bad_requests_fail_before_streaming(client, mock_email):
+    assert client.get(f'/api/map-data/{mock_email}/stream?format=xml').status_code == 400
+    assert client.get(f'/api/map-data/{mock_email}/stream?fields=password').status_code == 400
+    assert client.get('/api/map-data/nobody@contoso.example/stream').status_code == 404
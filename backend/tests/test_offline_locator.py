@@ -0,0 +1,56 @@
+import pytest
+
+from offline_locator import OfflineLocator, _parse_iso6709, build_timezone_table
+
+
+@pytest.fixture(scope='module')
+def locator():
+    return OfflineLocator()
+
+
+def test_countries_resolve_by_name_code_or_alias(locator):
+    assert locator.country_code('United Kingdom') == locator.country_code('uk') == locator.country_code('GB') == 'GB'
+    assert locator.country_code('United States of America') == 'US'
+    assert locator.country_code('Atlantis') is None and locator.country_code(None) is None
+    assert locator.region_location('us')['address'] == 'United States'
+
+
+@pytest.mark.parametrize('zone, place', [
+    ('Pacific Standard Time', 'Los Angeles, United States'),
+    ('Asia/Calcutta', 'Kolkata, India'),
+    ('UTC+05:30', 'Delhi'),
+    ('GMT-8', 'Pacific Time'),
+    ('Etc/GMT+5', 'Eastern Time'),
+    ('UTC', 'London'),
+])
+def test_time_zones_resolve_offline(locator, zone, place):
+    assert locator.timezone_location(zone)['address'] == place
+
+
+def test_unknown_time_zones(locator):
+    assert locator.timezone_location('Mars Standard Time') is None
+    assert locator.timezone_location('  ') is None
+    assert locator.timezone_location('UTC+30') is None
+
+
+def test_lookups_return_copies(locator):
+    locator.region_location('US')['latitude'] = 0
+    assert locator.region_location('US')['latitude'] != 0
+
+
+def test_timezone_table_is_built_from_zone_tab(tmp_path):
+    (tmp_path / 'zone.tab').write_text('# comment\nGB\t+513030-0000731\tEurope/London\n')
+    (tmp_path / 'tzdata.zi').write_text('L Europe/London GB-Eire\n')
+    output = tmp_path / 'timezone_centroids.csv'
+    assert build_timezone_table(str(tmp_path), str(output)) == 2
+    assert 'GB-Eire,51.5083,-0.1253,GB,London' in output.read_text()
+    assert _parse_iso6709('-3352+15113') == (-33.8667, 151.2167)
+
+
+def test_phone_fallback_needs_no_network(backend, mock_services):
+    maps_calls = mock_services.call_counts['maps'] + mock_services.call_counts['maps_batch']
+    location = backend.location_service.get_location_from_phone('+44 20 7946 0100')
+    assert location['address'] == 'United Kingdom'
+    assert backend.location_service.get_location_from_phone('4255550100')['address'] == 'United States'
+    assert backend.location_service.get_location_from_phone('not a number') is None
+    assert mock_services.call_counts['maps'] + mock_services.call_counts['maps_batch'] == maps_calls
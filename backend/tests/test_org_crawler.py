@@ -0,0 +1,124 @@
+import threading
+import time
+
+from org_crawler import CrawlStats, OrgCrawler
+
+
+def _user(index):
+    return {'id': f'id-{index}', 'mail': f'user{index}@contoso.example', 'displayName': f'User {index}'}
+
+
+class FakeGraph:
+    """directReports over a tree where user i reports to (i - 1) // fanout, served a $batch chunk at a time"""
+
+    def __init__(self, user_count, fanout, batch_size=4, delay=0.0):
+        self.batch_size = batch_size
+        self.delay = delay
+        self.reports = {f'id-{index}': [] for index in range(user_count)}
+        for index in range(1, user_count):
+            self.reports[f'id-{(index - 1) // fanout}'].append(_user(index))
+        self.batches = []
+        self.in_flight = self.peak = 0
+        self._lock = threading.Lock()
+
+    def get_user_by_email(self, email):
+        index = email[len('user'):email.index('@')]
+        return _user(int(index)) if f'id-{index}' in self.reports else None
+
+    def get_direct_reports_for_users(self, user_ids):
+        with self._lock:
+            self.batches.append(list(user_ids))
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+        time.sleep(self.delay)
+        with self._lock:
+            self.in_flight -= 1
+        return [{'value': list(self.reports[user_id])} for user_id in user_ids]
+
+
+def _ids(node):
+    return [node['user']['id']] + [user_id for child in node['children'] for user_id in _ids(child)]
+
+
+def test_crawl_builds_the_whole_tree_level_by_level():
+    graph = FakeGraph(40, 3)
+    stats = CrawlStats()
+    levels = []
+    root = OrgCrawler(graph, max_concurrency=4).crawl('user0@contoso.example', stats, on_level=levels.append)
+
+    assert sorted(_ids(root)) == sorted(graph.reports)
+    assert [len(level) for level in levels] == [1, 3, 9, 27]
+    assert [level['users'] for level in stats.levels] == [1, 3, 9, 27]
+    assert stats.graph_calls == 1 + sum(len(range(0, level['users'], 4)) for level in stats.levels)
+
+
+def test_level_batches_run_concurrently_within_the_bound():
+    graph = FakeGraph(200, 50, batch_size=2, delay=0.02)
+    OrgCrawler(graph, max_concurrency=3).crawl('user0@contoso.example')
+    assert all(len(batch) <= 2 for batch in graph.batches)
+    assert graph.peak == 3
+
+
+def test_unknown_root_returns_none():
+    stats = CrawlStats()
+    assert OrgCrawler(FakeGraph(5, 2)).crawl('user99@contoso.example', stats) is None
+    assert stats.graph_calls == 1
+
+
+def test_max_depth_stops_early():
+    graph = FakeGraph(40, 3)
+    root = OrgCrawler(graph).crawl('user0@contoso.example', max_depth=1)
+    assert len(root['children']) == 3
+    assert all(child['children'] == [] for child in root['children'])
+
+
+class PagedGraph(FakeGraph):
+    """FakeGraph serving directReports one report per page, with @odata.nextLink for the rest"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.next_page_calls = 0
+
+    def _page(self, user_id, offset):
+        reports = self.reports[user_id]
+        page = {'value': reports[offset:offset + 1]}
+        if offset + 1 < len(reports):
+            page['@odata.nextLink'] = f'{user_id}|{offset + 1}'
+        return page
+
+    def get_direct_reports_for_users(self, user_ids):
+        super().get_direct_reports_for_users(user_ids)
+        return [self._page(user_id, 0) for user_id in user_ids]
+
+    def get_next_pages(self, links):
+        self.next_page_calls += 1
+        return [self._page(*link.split('|')[:1], int(link.split('|')[1])) for link in links]
+
+
+def test_paged_direct_reports_are_followed_in_batches():
+    graph = PagedGraph(40, 3)
+    stats = CrawlStats()
+    root = OrgCrawler(graph).crawl('user0@contoso.example', stats)
+
+    assert sorted(_ids(root)) == sorted(graph.reports)
+    assert [child['user']['id'] for child in root['children']] == ['id-1', 'id-2', 'id-3']
+    # Managers' second and third pages go out as two $batch rounds per level, chunked by batch_size:
+    # 1, 3 and 9 managers make 1, 1 and 3 chunks
+    assert graph.next_page_calls == 2 * (1 + 1 + 3)
+
+
+def test_children_come_from_direct_reports_payloads():
+    graph = FakeGraph(13, 3)
+    lookups = []
+    get_user = graph.get_user_by_email
+    graph.get_user_by_email = lambda email: lookups.append(email) or get_user(email)
+    # A contact among the reports, and a report listed under two managers
+    graph.reports['id-1'].append({'@odata.type': '#microsoft.graph.orgContact', 'id': 'contact-1'})
+    graph.reports['id-2'].append(_user(4))
+
+    root = OrgCrawler(graph).crawl('user0@contoso.example')
+
+    assert lookups == ['user0@contoso.example']
+    assert sorted(_ids(root)) == sorted(graph.reports)
+    first = root['children'][0]
+    assert first['children'][0]['user'] is graph.reports['id-1'][0]
@@ -0,0 +1,71 @@
+import pytest
+
+from photo_cache import PhotoCache
+
+
+@pytest.fixture
+def fresh_photo_cache(backend, tmp_path, monkeypatch):
+    cache = PhotoCache(str(tmp_path / 'photos'))
+    monkeypatch.setattr(backend, 'photo_cache', cache)
+    return cache
+
+
+def test_memory_tier_is_capped_by_bytes(tmp_path):
+    cache = PhotoCache(str(tmp_path), memory_bytes=10)
+    cache.put('a', b'123456')
+    cache.put('b', b'123456')
+    assert cache.stats()['memory_bytes'] == 6
+    # Evicted from memory, still on disk
+    assert cache.get('a')[1].data == b'123456'
+    assert cache.stats()['disk_hits'] == 1
+
+
+def test_negative_entries_persist_and_are_replaced_by_a_photo(tmp_path):
+    cache = PhotoCache(str(tmp_path))
+    cache.put('a', None)
+    assert PhotoCache(str(tmp_path)).get('a') == (True, None)
+    cache.put('a', b'photo')
+    reopened = PhotoCache(str(tmp_path))
+    assert reopened.get('a')[1].data == b'photo'
+
+
+def test_etag_follows_the_content(tmp_path):
+    cache = PhotoCache(None)
+    assert cache.put('a', b'one').etag == cache.put('b', b'one').etag != cache.put('c', b'two').etag
+
+
+def _user_id(index):
+    return f'00000000-0000-0000-0000-{index:012d}'
+
+
+def test_photo_is_served_with_etag_and_revalidated(client, mock_services, fresh_photo_cache):
+    url = f'/api/user-photo/{_user_id(1)}?size=40'
+    first = client.get(url)
+    assert first.status_code == 200 and first.mimetype == 'image/jpeg'
+    assert first.headers['Cache-Control'].startswith('public, max-age=')
+
+    graph_calls = mock_services.call_counts['graph']
+    revalidated = client.get(url, headers={'If-None-Match': first.headers['ETag']})
+    assert revalidated.status_code == 304
+    assert mock_services.call_counts['graph'] == graph_calls
+
+
+def test_missing_photo_is_cached_as_a_negative_entry(client, mock_services, fresh_photo_cache):
+    # The mock has no photo for every third user
+    url = f'/api/user-photo/{_user_id(2)}'
+    assert client.get(url).status_code == 404
+    graph_calls = mock_services.call_counts['graph']
+    assert client.get(url).status_code == 404
+    assert mock_services.call_counts['graph'] == graph_calls
+
+
+@pytest.mark.parametrize('status, expected', [(None, 503), (429, 503), (403, 502)])
+def test_graph_failures_are_not_cached(backend, client, fresh_photo_cache, monkeypatch, status, expected):
+    monkeypatch.setattr(backend.graph_client, 'get_user_photo', lambda user_id, size=None: (None, status))
+    response = client.get(f'/api/user-photo/{_user_id(1)}')
+    assert response.status_code == expected and response.headers['Cache-Control'] == 'no-store'
+    assert fresh_photo_cache.get(backend.photo_cache_key(_user_id(1), None)) == (False, None)
+
+
+def test_invalid_size_is_rejected(client):
+    assert client.get(f'/api/user-photo/{_user_id(1)}?size=big').status_code == 400
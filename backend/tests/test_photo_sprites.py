@@ -0,0 +1,61 @@
+import io
+
+import pytest
+from PIL import Image
+
+from photo_sprites import PhotoSpriteBuilder, graph_photo_size, resize_photo
+
+
+def _jpeg(size, color=(200, 0, 0)):
+    output = io.BytesIO()
+    Image.new('RGB', (size, size), color).save(output, format='JPEG')
+    return output.getvalue()
+
+
+def test_graph_photo_size_rounds_up():
+    assert graph_photo_size(50) == 64
+    assert graph_photo_size(96) == 96
+    assert graph_photo_size(5000) == 648
+
+
+def test_resize_photo_crops_to_a_square():
+    with Image.open(io.BytesIO(resize_photo(_jpeg(120), 48))) as image:
+        assert image.size == (48, 48)
+
+
+def test_large_hierarchies_are_split_into_capped_sheets():
+    calls = []
+
+    def load_photos(user_ids, size):
+        calls.append(len(user_ids))
+        return [None if user_id.endswith('3') else _jpeg(size) for user_id in user_ids]
+
+    builder = PhotoSpriteBuilder(load_photos, max_tiles=4)
+    user_ids = [f'user-{index}' for index in range(10)]
+    sheets, index = builder.get_sprite('root', 16, lambda: user_ids)
+
+    assert max(calls) <= 4
+    assert len(sheets) == len(index['sheets']) == 3
+    assert all(sheet['width'] * sheet['height'] <= 4 * 16 * 16 for sheet in index['sheets'])
+    assert 'user-3' not in index['positions'] and len(index['positions']) == 9
+    sheet, x, y = index['positions']['user-9']
+    assert sheet == 2 and index['sheets'][sheet]['etag'] == sheets[sheet].etag
+    with Image.open(io.BytesIO(sheets[sheet].data)) as image:
+        assert image.size == (index['sheets'][sheet]['width'], index['sheets'][sheet]['height'])
+
+    assert builder.get_sprite('root', 16, lambda: pytest.fail('cached sprite rebuilt')) == (sheets, index)
+
+
+def test_sprite_image_checks_the_index_version(backend, client, mock_email, monkeypatch):
+    monkeypatch.setattr(backend.photo_sprites, 'max_tiles', 16)
+    monkeypatch.setattr(backend.photo_sprites, '_sprites', type(backend.photo_sprites._sprites)())
+    index = client.get(f'/api/photo-sprite/{mock_email}?size=32').get_json()['data']
+    assert len(index['sheets']) > 1
+
+    last = index['sheets'][-1]
+    image = client.get(last['image_url'])
+    assert image.status_code == 200 and image.headers['ETag'] == f'"{last["etag"]}"'
+
+    stale = client.get(last['image_url'].replace(last['etag'], 'stale'))
+    assert stale.status_code == 409 and stale.headers['Cache-Control'] == 'no-store'
+    assert client.get(f'/api/photo-sprite/{mock_email}/image?size=32&sheet=999').status_code == 404
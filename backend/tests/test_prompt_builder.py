@@ -0,0 +1,51 @@
+import pytest
+
+from conftest import MOCK_USERS
+from prompt_builder import TeamPromptBuilder, count_tokens, member_region
+
+
+def _member(index, city, title='Engineer'):
+    return {'user': {'id': f'id-{index}', 'displayName': f'Person {index}', 'jobTitle': title,
+                     'department': 'R&D', 'city': city, 'country': 'Nowhere',
+                     'streetAddress': f'{index} Secret Street'},
+            'location': {'latitude': 0, 'longitude': 0, 'address': 'x'}, 'location_type': 'address'}
+
+
+def _team(size, regions=3):
+    return [_member(index, f'City {index % regions}') for index in range(size)]
+
+
+def test_region_is_city_level_only():
+    assert member_region(_member(1, 'Redmond')) == 'Redmond, Nowhere'
+    assert member_region({'location': {'address': '1 Main St, Redmond, WA 98052, United States'}}) == \
+        'WA 98052, United States'
+    assert member_region({}) == 'Unknown'
+
+
+@pytest.mark.parametrize('size, budget, mode', [(6, 1000, 'rows'), (60, 300, 'names'), (600, 200, 'aggregates')])
+def test_the_richest_encoding_that_fits_is_chosen(size, budget, mode):
+    context, info = TeamPromptBuilder(token_budget=budget).build(_team(size))
+    assert info['mode'] == mode and info['members'] == size
+    assert info['tokens'] == count_tokens(context) <= budget
+    assert 'Secret Street' not in context
+
+
+def test_aggregates_are_truncated_to_the_budget():
+    context, info = TeamPromptBuilder(token_budget=60).build(_team(400, regions=40))
+    assert info['tokens'] <= 60
+    assert context.splitlines()[-1].startswith('... ') and 'members not listed' in context
+
+
+def test_contexts_are_cached_by_roster():
+    builder = TeamPromptBuilder()
+    team = _team(10)
+    assert builder.build(team)[1]['cached'] is False
+    assert builder.build(list(team))[1]['cached'] is True
+    assert builder.build(team, team_hash='other')[1]['cached'] is False
+
+
+def test_chat_reports_the_prompt_it_built(client, mock_email):
+    team_context_id = client.get(f'/api/map-data/{mock_email}').get_json()['team_context_id']
+    prompt = client.post('/api/chat', json={'userQuery': 'Where is everyone?', 'teamContextId': team_context_id,
+                                            'mode': 'prompt'}).get_json()['prompt']
+    assert prompt['members'] == MOCK_USERS and prompt['tokens'] <= prompt['budget']
@@ -0,0 +1,53 @@
+import numpy as np
+import pytest
+
+from spatial_index import SpatialIndex, haversine_km
+
+
+def _members(count=5000, seed=7):
+    rng = np.random.default_rng(seed)
+    lats = np.degrees(np.arcsin(rng.uniform(-1, 1, count)))
+    lons = rng.uniform(-180, 180, count)
+    return [{'user': {'id': str(i)}, 'location': {'latitude': float(lat), 'longitude': float(lon)}}
+            for i, (lat, lon) in enumerate(zip(lats, lons))]
+
+
+def _brute_force(members, lat, lon, radius_km):
+    lats = np.radians([m['location']['latitude'] for m in members])
+    lons = np.radians([m['location']['longitude'] for m in members])
+    distances = haversine_km(lat, lon, lats, lons, np.cos(lats))
+    return {members[i]['user']['id'] for i in np.flatnonzero(distances <= radius_km)}
+
+
+MEMBERS = _members()
+
+
+@pytest.fixture(scope='module', params=[1.0, 5.0])
+def index(request):
+    return SpatialIndex(MEMBERS, request.param)
+
+
+@pytest.mark.parametrize('lat, lon', [(0, 0.5), (47.6, -122.3), (-33.9, 151.2), (10, 179.8), (-5, -179.9), (80, 20)])
+@pytest.mark.parametrize('radius_km', [0, 50, 500, 2000, 7530, 7540, 9000, 15000, 19990, 20100])
+def test_within_matches_brute_force(index, lat, lon, radius_km):
+    found = {member['user']['id'] for member, _ in index.within(lat, lon, radius_km)}
+    assert found == _brute_force(MEMBERS, lat, lon, radius_km)
+
+
+def test_within_near_wrap_radius_finds_members(index):
+    # Boxes spanning almost every longitude used to collapse to a single column
+    assert len(index.within(0, 0.5, 7540)) == len(_brute_force(MEMBERS, 0, 0.5, 7540)) > 0
+
+
+def test_within_is_sorted_and_limited(index):
+    results = index.within(47.6, -122.3, 5000, limit=10)
+    distances = [distance for _, distance in results]
+    assert len(results) == 10 and distances == sorted(distances)
+
+
+def test_nearest_matches_brute_force(index):
+    results = index.nearest(51.5, -0.1, 25)
+    lats = np.radians([m['location']['latitude'] for m in MEMBERS])
+    lons = np.radians([m['location']['longitude'] for m in MEMBERS])
+    expected = np.sort(haversine_km(51.5, -0.1, lats, lons, np.cos(lats)))[:25]
+    assert np.allclose([distance for _, distance in results], expected)
@@ -0,0 +1,47 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from offline_locator import OfflineLocator
+from team_tools import TeamQueryTools, utc_offset_hours, zone_offset_hours
+
+WINDOWS_ZONES = OfflineLocator().windows_zones
+WINTER = datetime(2025, 1, 15, 12, tzinfo=timezone.utc)
+SUMMER = datetime(2025, 7, 15, 12, tzinfo=timezone.utc)
+
+
+@pytest.mark.parametrize('zone, now, expected', [
+    ('India Standard Time', WINTER, 5.5),
+    ('China Standard Time', WINTER, 8),
+    ('Romance Standard Time', WINTER, 1),
+    ('Romance Standard Time', SUMMER, 2),
+    ('Pacific Standard Time', SUMMER, -7),
+    ('Asia/Kathmandu', WINTER, 5.75),
+    ('UTC-11', WINTER, -11),
+    ('UTC+05:30', SUMMER, 5.5),
+    ('Not A Zone', WINTER, None),
+])
+def test_zone_offset_hours(zone, now, expected):
+    assert zone_offset_hours(zone, WINDOWS_ZONES, now) == expected
+
+
+def test_zone_beats_longitude():
+    # Xinjiang sits at ~87E (5.8h by longitude) but keeps Beijing time
+    member = {'user': {'timeZone': 'China Standard Time'}, 'location': {'latitude': 43.8, 'longitude': 87.6}}
+    assert utc_offset_hours(member, WINDOWS_ZONES, WINTER) == 8
+
+
+def test_unknown_zone_falls_back_to_longitude():
+    member = {'user': {'timeZone': None}, 'location': {'latitude': 40.4, 'longitude': -3.7}}
+    assert utc_offset_hours(member, WINDOWS_ZONES, WINTER) == 0
+
+
+def test_members_in_timezone_band_uses_zone_names():
+    members = [
+        {'user': {'displayName': 'Asha', 'timeZone': 'India Standard Time'}, 'location': {'latitude': 19.1, 'longitude': 72.9}},
+        {'user': {'displayName': 'Lucía', 'timeZone': 'Romance Standard Time'}, 'location': {'latitude': 40.4, 'longitude': -3.7}},
+    ]
+    tools = TeamQueryTools(members, lambda place: None, windows_zones=WINDOWS_ZONES)
+    names = [member['name'] for member in tools.members_in_timezone_band(5.5, 5.5)['members']]
+    assert names == ['Asha']
+    assert tools.members_in_timezone_band(-0.5, 0.5)['total'] == 0
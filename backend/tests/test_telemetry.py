@@ -0,0 +1,50 @@
+import asyncio
+import socket
+
+import httpx
+import pytest
+import requests
+
+from graph_transport import create_session
+from telemetry import Metrics, instrumented_async_transport, metrics, outbound_operation
+
+
+def _closed_port_url() -> str:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+    return f'http://127.0.0.1:{port}/v1.0/users/abc/directReports'
+
+
+def _error_count(url: str) -> float:
+    service, operation = outbound_operation(url)
+    counters = metrics._counters.get('whereat_outbound_requests_total', {})
+    return counters.get(Metrics._labels({'service': service, 'operation': operation, 'status': 'error'}), 0)
+
+
+def test_outbound_operation_collapses_ids():
+    assert outbound_operation('https://graph.microsoft.com/v1.0/users/abc/directReports') == \
+        ('graph', 'users/{id}/directReports')
+    assert outbound_operation('https://atlas.microsoft.com/search/address/batch/json') == \
+        ('maps', 'search_address_batch')
+
+
+def test_session_counts_connection_failures():
+    url = _closed_port_url()
+    before = _error_count(url)
+    with pytest.raises(requests.ConnectionError):
+        create_session(2).get(url, timeout=2)
+    assert _error_count(url) == before + 1
+
+
+def test_async_transport_counts_connection_failures():
+    url = _closed_port_url()
+    before = _error_count(url)
+
+    async def call():
+        async with httpx.AsyncClient(transport=instrumented_async_transport(httpx.Limits(max_connections=2))) as client:
+            await client.get(url, timeout=2)
+
+    with pytest.raises(httpx.ConnectError):
+        asyncio.run(call())
+    assert _error_count(url) == before + 1
@@ -0,0 +1,83 @@
+import copy
+import gzip
+
+import msgpack
+import pytest
+from werkzeug.http import parse_accept_header
+
+from wire_format import compress, data_etag, parse_fields, project_record, to_columnar
+
+RECORD = {
+    'user': {'id': 'u1', 'displayName': 'Ada', 'mail': 'ada@contoso.example', 'mobilePhone': '+1 555'},
+    'location': {'latitude': 47.6, 'longitude': -122.1, 'address': 'Redmond'},
+    'location_type': 'address',
+    'border_color': 'green',
+}
+
+
+def test_parse_fields():
+    assert parse_fields(None) is None
+    assert parse_fields(' user.id , location ') == ['user.id', 'location']
+    with pytest.raises(ValueError):
+        parse_fields('user.id,password')
+
+
+def test_projection_keeps_nested_shape():
+    projected = project_record(RECORD, ['user.id', 'user.displayName', 'location_type'])
+    assert projected == {'user': {'id': 'u1', 'displayName': 'Ada'}, 'location_type': 'address'}
+
+
+def test_missing_location_stays_null():
+    record = dict(RECORD, location=None)
+    assert project_record(record, ['location.latitude'])['location'] is None
+
+
+@pytest.mark.parametrize('fields', [['user', 'user.bogus'], ['user.bogus', 'user'], ['user.id', 'user', 'location']])
+def test_overlapping_paths_do_not_touch_the_record(fields):
+    original = copy.deepcopy(RECORD)
+    projected = project_record(RECORD, fields)
+    assert RECORD == original
+    assert projected['user'] == RECORD['user']
+
+
+def test_columnar_lists_each_field_once():
+    columnar = to_columnar([RECORD, dict(RECORD, location=None)], ['user.id', 'location.latitude'])
+    assert columnar == {'count': 2, 'fields': ['user.id', 'location.latitude'],
+                        'columns': [['u1', 'u1'], [47.6, None]]}
+
+
+def test_etag_varies_with_projection_and_format():
+    assert data_etag('ctx', None, 'json') == data_etag('ctx', None, 'json')
+    assert data_etag('ctx', ['user.id'], 'json') != data_etag('ctx', None, 'json')
+    assert data_etag('ctx', None, 'columnar') != data_etag('ctx', None, 'json')
+
+
+def test_compress_honours_accept_encoding():
+    body = b'{"data": []}' * 100
+    compressed, encoding = compress(body, parse_accept_header('gzip'))
+    assert encoding == 'gzip' and gzip.decompress(compressed) == body
+    assert compress(body, parse_accept_header('identity')) == (body, None)
+
+
+def test_map_data_projection_leaves_cached_roster_alone(client, mock_email):
+    plain = client.get(f'/api/map-data/{mock_email}').get_json()
+    projected = client.get(f'/api/map-data/{mock_email}?fields=user,user.bogus').get_json()
+    assert all('bogus' not in record['user'] for record in projected['data'])
+
+    again = client.get(f'/api/map-data/{mock_email}').get_json()
+    assert again['team_context_id'] == plain['team_context_id']
+    assert all('bogus' not in record['user'] for record in again['data'])
+
+
+def test_map_data_formats_and_revalidation(client, mock_email):
+    response = client.get(f'/api/map-data/{mock_email}?format=columnar&fields=user.id,location_type')
+    columns = response.get_json()['data']
+    assert columns['fields'] == ['user.id', 'location_type']
+    assert len(columns['columns'][0]) == columns['count'] > 0
+
+    packed = client.get(f'/api/map-data/{mock_email}?format=msgpack&fields=user.id')
+    assert msgpack.unpackb(packed.data)['data']['count'] == columns['count']
+
+    etag = response.headers['ETag']
+    assert client.get(f'/api/map-data/{mock_email}?format=columnar&fields=user.id,location_type',
+                      headers={'If-None-Match': etag}).status_code == 304
@@ -0,0 +1,117 @@
+"""
+Wire Format Module
+Field projection, columnar and MessagePack encodings, and response compression for map data
+"""
+
+import gzip
+import hashlib
+import re
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+try:
+    import msgpack
+except ImportError:
+    # msgpack is optional; without it only the JSON encodings are offered
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    # brotli is optional; without it responses are gzip-compressed
+    brotli = None
+
+FORMATS = ('json', 'columnar', 'msgpack')
+MSGPACK_MIMETYPE = 'application/msgpack'
+COMPRESSIBLE_MIMETYPES = ('application/json', MSGPACK_MIMETYPE)
+
+# Everything the map draws and the chat prompt summarizes; used when a columnar format has no fields=
+DEFAULT_FIELDS = [
+    'user.id', 'user.displayName', 'user.jobTitle', 'user.department', 'user.mail', 'user.userPrincipalName',
+    'user.city', 'user.state', 'user.country', 'user.timeZone',
+    'location.latitude', 'location.longitude', 'location.address',
+    'location_type', 'border_color'
+]
+
+_FIELD_PATTERN = re.compile(r'^(user|location)(\.\w+)?$|^(location_type|border_color)$')
+
+
+def parse_fields(value: Optional[str]) -> Optional[List[str]]:
+    """Parse fields= (comma-separated paths such as user.displayName or location); None means everything"""
+    if not value:
+        return None
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    invalid = [field for field in fields if not _FIELD_PATTERN.match(field)]
+    if invalid:
+        raise ValueError(f"Unknown fields: {', '.join(invalid)}")
+    return fields
+
+
+def _lookup(record, field):
+    value = record
+    for part in field.split('.'):
+        value = value.get(part) if isinstance(value, dict) else None
+    return value
+
+
+def project_record(record: Dict[str, Any], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Copy of a map-data record keeping only the given paths, in the same nested shape.
+
+    Records are shared with the hierarchy cache and team-context store, so the
+    copy never writes into their nested dicts: a child path (user.mail) next to
+    its whole parent (user) is already covered by the parent and skipped.
+    """
+    if fields is None:
+        return record
+    whole = {field for field in fields if '.' not in field}
+    projected: Dict[str, Any] = {}
+    for field in fields:
+        parent, _, child = field.partition('.')
+        if not child:
+            projected[parent] = record.get(parent)
+        elif parent in whole:
+            continue
+        elif isinstance(record.get(parent), dict):
+            projected.setdefault(parent, {})[child] = record[parent].get(child)
+        else:
+            # A member without a location keeps location: null rather than a dict of nulls
+            projected.setdefault(parent, None)
+    return projected
+
+
+def to_columnar(records: List[Dict[str, Any]], fields: Optional[List[str]]) -> Dict[str, Any]:
+    """Parallel arrays, one per field path, so field names are sent once instead of once per member"""
+    fields = fields or DEFAULT_FIELDS
+    return {
+        'count': len(records),
+        'fields': fields,
+        'columns': [[_lookup(record, field) for record in records] for field in fields]
+    }
+
+
+def msgpack_available() -> bool:
+    return msgpack is not None
+
+
+def encode_msgpack(payload: Any) -> bytes:
+    if msgpack is None:
+        raise RuntimeError('msgpack is not installed')
+    return msgpack.packb(payload, use_bin_type=True, default=str)
+
+
+def data_etag(team_context_id: str, *variant: Any) -> str:
+    """Validator for a roster in one projection/encoding; the roster's content hash already covers the data"""
+    return hashlib.sha256(repr((team_context_id,) + variant).encode('utf-8')).hexdigest()[:32]
+
+
+def compress(body: bytes, accept_encoding, level: int = 6) -> Tuple[bytes, Optional[str]]:
+    """Compress a body with the best encoding the client accepts: brotli if available, else gzip"""
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    encoding = accept_encoding.best_match(offered)
+    if encoding == 'br':
+        return brotli.compress(body, quality=min(level, 11)), 'br'
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=min(level, 9)), 'gzip'
+    return body, None
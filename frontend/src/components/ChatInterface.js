@@ -4,7 +4,21 @@ import remarkGfm from 'remark-gfm';
 import rehypeRaw from 'rehype-raw';
 import { getConfig } from '../config';
 
-const ChatInterface = ({ mapData }) => {
+// Parse one Server-Sent Events frame ("event: ...\ndata: ...") from /api/chat/stream
+const parseSseFrame = (frame) => {
+  let type = 'message';
+  const dataLines = [];
+  frame.split('\n').forEach((line) => {
+    if (line.startsWith('event:')) {
+      type = line.slice(6).trim();
+    } else if (line.startsWith('data:')) {
+      dataLines.push(line.slice(5).trimStart());
+    }
+  });
+  return { type, data: dataLines.length ? JSON.parse(dataLines.join('\n')) : null };
+};
+
+const ChatInterface = ({ teamSize, teamContextId, refreshTeamContext }) => {
   const [messages, setMessages] = useState([]);
   const [inputMessage, setInputMessage] = useState('');
   const [isLoading, setIsLoading] = useState(false);
@@ -189,24 +203,36 @@ const ChatInterface = ({ mapData }) => {
       // Call the backend API
       const backendUrl = getConfig().backendUrl;
       console.log('Backend URL:', backendUrl);
-      console.log('Sending chat request with data:', {
-        userQuery: userMessage,
-        teamData: mapData,
-        provider: 'azure'
-      });
-      
-      const response = await fetch(`${backendUrl}/api/chat`, {
+      console.log('Sending chat request:', { userQuery: userMessage, teamContextId, teamSize });
+
+      // Stream the answer so tokens show up as soon as they are generated
+      const postChat = (teamFields) => fetch(`${backendUrl}/api/chat/stream`, {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
         body: JSON.stringify({
           userQuery: userMessage,
-          teamData: mapData,
+          ...teamFields,
           provider: 'azure'  // Always use Azure OpenAI
         })
       });
 
+      // The server keeps the team's roster under teamContextId, so only the question is sent;
+      // if the server no longer has it, the map registers the team again and the question is resent
+      let response = teamContextId
+        ? await postChat({ teamContextId })
+        : await postChat({ teamData: [] });
+      if (teamContextId && response.status === 404) {
+        const body = await response.clone().json().catch(() => ({}));
+        if (body.code === 'team_context_expired') {
+          const refreshedContextId = await refreshTeamContext();
+          if (refreshedContextId) {
+            response = await postChat({ teamContextId: refreshedContextId });
+          }
+        }
+      }
+
       console.log('Response status:', response.status);
       console.log('Response ok:', response.ok);
 
@@ -216,17 +242,52 @@ const ChatInterface = ({ mapData }) => {
         throw new Error(`HTTP error! status: ${response.status}, message: ${errorText}`);
       }
 
-      const data = await response.json();
-      console.log('Response data:', data);
-      
-      const assistantMessage = {
-        id: Date.now() + 1,
-        role: 'assistant',
-        content: data.response || 'I apologize, but I received an empty response.',
-        timestamp: new Date().toLocaleTimeString()
+      const assistantId = Date.now() + 1;
+      const assistantTimestamp = new Date().toLocaleTimeString();
+      const showAssistantContent = (content) => {
+        setMessages(prev => {
+          const assistantMessage = { id: assistantId, role: 'assistant', content, timestamp: assistantTimestamp };
+          return prev.some(message => message.id === assistantId)
+            ? prev.map(message => (message.id === assistantId ? assistantMessage : message))
+            : [...prev, assistantMessage];
+        });
       };
-      
-      setMessages(prev => [...prev, assistantMessage]);
+
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let content = '';
+      let streamError = null;
+
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+
+        buffer += decoder.decode(value, { stream: true });
+        const frames = buffer.split('\n\n');
+        buffer = frames.pop();
+
+        for (const frame of frames) {
+          if (!frame.trim()) continue;
+          const event = parseSseFrame(frame);
+          if (event.type === 'delta') {
+            content += event.data.content;
+            setIsLoading(false);
+            showAssistantContent(content);
+          } else if (event.type === 'error') {
+            streamError = event.data.error;
+          } else if (event.type === 'done') {
+            console.log('Chat stream finished:', event.data);
+          }
+        }
+      }
+
+      if (streamError) {
+        throw new Error(streamError);
+      }
+      if (!content) {
+        showAssistantContent('I apologize, but I received an empty response.');
+      }
     } catch (error) {
       console.error('Error sending message to LLM:', error);
       console.error('Error details:', {
@@ -386,7 +447,7 @@ const ChatInterface = ({ mapData }) => {
         </button>
       </div>
       
-      {mapData.length === 0 && (
+      {teamSize === 0 && (
         <div className="no-data-message">
           Search for a team member first to enable location-based chat assistance.
         </div>
@@ -4,16 +4,36 @@ import * as atlas from 'azure-maps-control';
 import { getConfig } from '../config';
 import ChatInterface from './ChatInterface';
 
+// The user fields the list view uses when the map can't be shown; the rest (phones, street address, ...) is left out
+const MAP_DATA_FIELDS = [
+  'user.id', 'user.displayName', 'user.jobTitle', 'user.department', 'location', 'location_type', 'border_color'
+].join(',');
+
+// The whole world, as a /api/map-clusters bbox (west,south,east,north)
+const WORLD_BBOX = '-180,-85,180,85';
+// Zoom of the first, whole-team query: fine enough to frame the team, coarse enough to stay small
+const OVERVIEW_ZOOM = 4;
+// Fetch a little beyond the visible map so pins at the edges are already there while panning
+const VIEWPORT_PADDING = 0.1;
+// Cluster member rows shown in a cluster tooltip
+const CLUSTER_TOOLTIP_LIMIT = 50;
+
 const MapViewTab = ({ teamsContext, getAuthToken }) => {
   const [userEmail, setUserEmail] = useState('');
-  const [mapData, setMapData] = useState([]);
+  // Totals for the legend: { total, located, unlocated, locationTypes }
+  const [teamSummary, setTeamSummary] = useState(null);
+  // Full records, loaded only for the list shown when the map can't render
+  const [teamList, setTeamList] = useState([]);
+  const [teamContextId, setTeamContextId] = useState(null);
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState(null);
   const mapRef = useRef(null);
   const mapInstanceRef = useRef(null);
   const popupRef = useRef(null);
+  // The team the map shows ({ email, teamContextId }); read by the viewport handlers, which outlive renders
+  const teamRef = useRef(null);
   const [mapReady, setMapReady] = useState(false);
-  const [pendingMapData, setPendingMapData] = useState(null);
+  const [pendingTeam, setPendingTeam] = useState(null);
   const [currentZoom, setCurrentZoom] = useState(3);
 
   // Get current user's email from Teams context
@@ -398,13 +418,13 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         
         setMapReady(true);
         
-        // If we have pending data, display it now
-        if (pendingMapData && pendingMapData.length > 0) {
-          console.log('Displaying pending map data...');
+        // If we have a pending team, display it now
+        if (pendingTeam) {
+          console.log('Displaying pending team...');
           setTimeout(() => {
             try {
-              displayUsersOnMap(pendingMapData);
-              setPendingMapData(null);
+              showTeam(pendingTeam);
+              setPendingTeam(null);
             } catch (mapError) {
               console.error('Error displaying pending data:', mapError);
               setError(`Map display error: ${mapError.message}`);
@@ -427,6 +447,29 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
     }
   };
 
+  // Without a map, list everyone instead; this is the only path that downloads every record
+  const loadTeamList = async (email) => {
+    try {
+      const backendUrl = getConfig().backendUrl;
+      const response = await axios.get(`${backendUrl}/api/map-data/${encodeURIComponent(email)}`, {
+        params: { fields: MAP_DATA_FIELDS }
+      });
+      setTeamList(response.data.data || []);
+    } catch (listError) {
+      console.warn('Error loading the team list:', listError);
+    }
+  };
+
+  const showTeam = (team) => {
+    try {
+      displayTeamOnMap(team);
+    } catch (mapError) {
+      console.error('Error displaying team on map:', mapError);
+      setError(`Map display error: ${mapError.message}. Data was fetched successfully.`);
+      loadTeamList(team.email);
+    }
+  };
+
   const fetchMapData = async (email) => {
     if (!email) {
       setError('Please enter a valid email address');
@@ -435,55 +478,73 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
 
     setLoading(true);
     setError(null);
+    setTeamSummary(null);
+    setTeamList([]);
+    setTeamContextId(null);
+    teamRef.current = null;
 
     try {
-      console.log('Fetching map data for:', email);
+      console.log('Fetching map clusters for:', email);
       const config = getConfig();
       const backendUrl = config.backendUrl;
-      const response = await axios.get(`${backendUrl}/api/map-data/${encodeURIComponent(email)}`);
-      
-      if (response.data.success) {
-        console.log('Map data received:', response.data.data.length, 'users');
-        setMapData(response.data.data);
-        
-        // Check if map is ready before trying to display users
-        if (mapReady && mapInstanceRef.current) {
-          console.log('Map is ready, displaying users immediately...');
-          try {
-            displayUsersOnMap(response.data.data);
-          } catch (mapError) {
-            console.error('Error displaying users on map:', mapError);
-            setError(`Map display error: ${mapError.message}. Data was fetched successfully.`);
-          }
+      // The team clustered over the whole world: this registers the roster on the server (team_context_id)
+      // and gives the legend totals and the area to show, without sending every record to the browser.
+      // Clusters and pins for each viewport are then fetched as the map moves.
+      const response = await axios.get(`${backendUrl}/api/map-clusters`, {
+        params: { email, bbox: WORLD_BBOX, zoom: OVERVIEW_ZOOM }
+      });
+      const overview = response.data;
+
+      const locationTypes = {};
+      overview.data.forEach((feature) => {
+        if (feature.type === 'cluster') {
+          Object.entries(feature.location_types).forEach(([type, count]) => {
+            locationTypes[type] = (locationTypes[type] || 0) + count;
+          });
         } else {
-          console.log('Map not ready yet, storing data for later display...');
-          setPendingMapData(response.data.data);
-          
-          // If map exists but not ready, wait a bit more
-          if (mapInstanceRef.current) {
-            setTimeout(() => {
-              if (mapReady) {
-                try {
-                  displayUsersOnMap(response.data.data);
-                  setPendingMapData(null);
-                } catch (mapError) {
-                  console.error('Error displaying users on map (delayed):', mapError);
-                  setError(`Map display error: ${mapError.message}. Data was fetched successfully.`);
-                }
-              }
-            }, 3000);
-          }
+          locationTypes[feature.location_type] = (locationTypes[feature.location_type] || 0) + 1;
         }
+      });
+      const team = {
+        email,
+        teamContextId: overview.team_context_id,
+        total: overview.indexed_members + overview.unlocated_members,
+        located: overview.indexed_members,
+        unlocated: overview.unlocated_members,
+        locationTypes,
+        overview: overview.data
+      };
+
+      console.log('Map clusters received:', team.total, 'users', locationTypes);
+      setTeamSummary(team);
+      setTeamContextId(team.teamContextId);
+
+      // Check if map is ready before trying to display the team
+      if (mapReady && mapInstanceRef.current) {
+        console.log('Map is ready, displaying team immediately...');
+        showTeam(team);
       } else {
-        setError(response.data.error || 'Failed to fetch map data');
+        console.log('Map not ready yet, storing team for later display...');
+        setPendingTeam(team);
+
+        // If map exists but not ready, wait a bit more
+        if (mapInstanceRef.current) {
+          setTimeout(() => {
+            if (mapReady) {
+              showTeam(team);
+              setPendingTeam(null);
+            }
+          }, 3000);
+        }
       }
     } catch (err) {
       console.error('Error fetching map data:', err);
-      if (err.code === 'ERR_NETWORK' || err.message.includes('Network Error')) {
+      if (err.response) {
+        const body = err.response.data || {};
+        setError(`Server error: ${err.response.status} - ${body.error || err.response.statusText}`);
+      } else if (err.request) {
         const config = getConfig();
         setError(`Failed to connect to the server. Please check if the backend is running on ${config.backendUrl}`);
-      } else if (err.response) {
-        setError(`Server error: ${err.response.status} - ${err.response.data?.error || err.response.statusText}`);
       } else {
         setError(`Network error: ${err.message}`);
       }
@@ -492,7 +553,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
     }
   };
 
-  const displayUsersOnMap = (users) => {
+  const displayTeamOnMap = (team) => {
     const map = mapInstanceRef.current;
     const popup = popupRef.current;
     
@@ -516,13 +577,24 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
       throw new Error('Map popup not initialized.');
     }
 
-    if (!users || users.length === 0) {
-      throw new Error('No user data to display on map.');
+    if (!team || team.located === 0) {
+      // Set to US view
+      map.setCamera({
+        center: [-98.5795, 39.8283], // Center of US
+        zoom: 3
+      });
+      throw new Error('No users have valid location data to display on the map.');
     }
 
     try {
-      console.log('Starting to display users on map...');
+      console.log('Starting to display team on map...');
       
+      // Drop the previous team's event handlers before its layers and sources
+      if (map._clusterEventCleanup) {
+        map._clusterEventCleanup();
+        map._clusterEventCleanup = null;
+      }
+
       // Clear existing custom layers first (before sources)
       try {
         const layers = map.layers.getLayers();
@@ -571,117 +643,22 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         console.warn('Error clearing sources:', e);
       }
 
-      const coordinates = [];
-      const features = [];
-      let validLocationCount = 0;
-
-      users.forEach((userLocationData, index) => {
-        const { user, location, border_color, location_type } = userLocationData;
-
-        // Enhanced validation for user and location data
-        if (!user || !location) {
-          console.warn(`Missing user or location data for index ${index}`);
-          return;
-        }
-
-        if (!location.latitude || !location.longitude) {
-          console.warn(`No valid location for user: ${user.displayName || 'Unknown'}`);
-          return;
-        }
-
-        // Validate coordinates are within reasonable bounds and not null
-        const lat = parseFloat(location.latitude);
-        const lng = parseFloat(location.longitude);
-        
-        console.log(`Validating coordinates for ${user.displayName || 'Unknown'}:`, {
-          rawLat: location.latitude,
-          rawLng: location.longitude,
-          parsedLat: lat,
-          parsedLng: lng,
-          isValidLat: !isNaN(lat) && lat !== null && lat >= -85 && lat <= 85,
-          isValidLng: !isNaN(lng) && lng !== null && lng >= -180 && lng <= 180,
-          locationType: location_type
-        });
-        
-        if (isNaN(lat) || isNaN(lng) || lat === null || lng === null || 
-            lat < -85 || lat > 85 || lng < -180 || lng > 180) {
-          console.warn(`Invalid coordinates for user ${user.displayName || 'Unknown'}: lat=${lat}, lng=${lng}`);
-          return;
-        }
-
-        const coordinate = [lng, lat];
-        coordinates.push(coordinate);
-        validLocationCount++;
-
-        // Enhanced validation for user properties
-        const feature = new atlas.data.Feature(new atlas.data.Point(coordinate), {
-          userId: user.id || `user_${index}`,
-          userName: user.displayName || 'Unknown User',
-          userTitle: user.jobTitle || '',
-          userDepartment: user.department || '',
-          userEmail: user.mail || user.userPrincipalName || '',
-          locationAddress: location.address || 'Unknown Location',
-          locationType: location_type || 'unknown',
-          borderColor: border_color || 'gray',
-          photoUrl: `user-photo-${user.id || `user_${index}`}`, // This will be the custom pin image ID
-          originalPhotoUrl: `${getConfig().backendUrl}/api/user-photo/${user.id || 'default'}` // Keep original for popup
-        });
-
-        features.push(feature);
-      });
-
-      if (validLocationCount === 0) {
-        // No valid locations found - let's debug what we received
-        console.log('No users with valid locations found, debugging data:');
-        users.forEach((userLocationData, index) => {
-          const { user, location, location_type } = userLocationData;
-          console.log(`User ${index + 1}:`, {
-            name: user?.displayName || 'Unknown',
-            locationType: location_type,
-            location: location,
-            hasLatLng: !!(location?.latitude && location?.longitude),
-            lat: location?.latitude,
-            lng: location?.longitude
-          });
-        });
-        
-        // Set to US view
-        map.setCamera({
-          center: [-98.5795, 39.8283], // Center of US
-          zoom: 3
-        });
-        throw new Error('No users have valid location data to display on the map.');
-      }
+      // The overview's cluster centroids and lone pins frame the whole team
+      const coordinates = team.overview.map(feature => [feature.longitude, feature.latitude]);
+      const backendUrl = getConfig().backendUrl;
+      teamRef.current = { email: team.email, teamContextId: team.teamContextId };
 
-      console.log(`Displaying ${validLocationCount} users on map`);
+      console.log(`Displaying ${team.located} located users on map`);
+      let loadViewport = null;
 
       // Create data source and add features with better error handling
       try {
         // Create a unique data source ID to avoid conflicts
         const dataSourceId = `user-data-${Date.now()}`;
-        const dataSource = new atlas.source.DataSource(dataSourceId, {
-          // Optimize clustering settings to handle decimal zoom levels and identical coordinates
-          cluster: true,
-          clusterRadius: 60, // Increased radius to ensure clustering at decimal zooms
-          clusterMaxZoom: 24, // Allow clustering at all zoom levels to prevent data loss for identical coordinates
-          clusterMinPoints: 2, // Require 2+ points to form cluster
-          // Add buffer to prevent clustering inconsistencies at decimal zoom levels
-          clusterProperties: {
-            // Create aggregated properties for clusters
-            'userNames': ['concat', ['concat', '', ['get', 'userName']], ['literal', '\n']],
-            'userCount': ['+', ['case', ['has', 'point_count'], ['get', 'point_count'], 1]],
-            'locationTypes': ['concat', ['concat', '', ['get', 'locationType']], ['literal', ',']]
-          }
-        });
+        // Clustering is done by the server; the source holds only the clusters and pins in view
+        const dataSource = new atlas.source.DataSource(dataSourceId);
         
         map.sources.add(dataSource);
-        
-        if (features.length > 0) {
-          dataSource.add(features);
-          console.log(`Added ${features.length} features to data source ${dataSourceId}`);
-        } else {
-          throw new Error('No valid features to add to map');
-        }
 
         // Create symbol layer for user pins with custom profile photos
         const layerId = `user-symbols-${Date.now()}`;
@@ -690,10 +667,10 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
           maxZoom: 24,
           iconOptions: {
             image: ['case',
-              ['has', 'point_count'],
+              ['==', ['get', 'type'], 'cluster'],
               ['case',
-                ['<', ['get', 'point_count'], 21],
-                ['concat', 'cluster-', ['to-string', ['get', 'point_count']]],
+                ['<', ['get', 'count'], 21],
+                ['concat', 'cluster-', ['to-string', ['get', 'count']]],
                 'cluster-large'
               ],
               ['get', 'photoUrl']
@@ -702,15 +679,15 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
             allowOverlap: true,
             ignorePlacement: true,
             size: ['case', 
-              ['has', 'point_count'], 
-              ['interpolate', ['linear'], ['get', 'point_count'], 2, 0.9, 10, 1.3, 20, 1.5],
+              ['==', ['get', 'type'], 'cluster'], 
+              ['interpolate', ['linear'], ['get', 'count'], 2, 0.9, 10, 1.3, 20, 1.5],
               0.8
             ],
             offset: [0, 0]
           },
           textOptions: {
             textField: ['case',
-              ['has', 'point_count'],
+              ['==', ['get', 'type'], 'cluster'],
               '', // No text for clusters (count is in the image)
               ['get', 'userName'] // Show name for individual pins
             ],
@@ -724,59 +701,58 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
           }
         });
 
-        // Add profile photos as custom images to the map
-        const addProfilePhotos = async () => {
-          const getBorderColor = (borderColor) => {
-            switch (borderColor) {
-              case 'green': return '#107c10';
-              case 'orange': return '#ff8c00';
-              case 'gray':
-              default: return '#8a8886';
-            }
-          };
+        const getBorderColor = (borderColor) => {
+          switch (borderColor) {
+            case 'green': return '#107c10';
+            case 'orange': return '#ff8c00';
+            case 'gray':
+            default: return '#8a8886';
+          }
+        };
 
-          // Create cluster images first
-          const createClusterImage = async (count, size = 120) => {
-            const canvas = document.createElement('canvas');
-            const ctx = canvas.getContext('2d');
-            canvas.width = size;
-            canvas.height = size;
-
-            // Draw cluster circle with shadow
-            ctx.save();
-            ctx.translate(3, 3);
-            ctx.globalAlpha = 0.3;
-            ctx.fillStyle = '#000000';
-            ctx.beginPath();
-            ctx.arc(size/2, size/2, size/2 - 5, 0, 2 * Math.PI);
-            ctx.fill();
-            ctx.restore();
-
-            // Draw main cluster circle
-            ctx.fillStyle = '#6264a7';
-            ctx.strokeStyle = '#ffffff';
-            ctx.lineWidth = 4;
-            ctx.beginPath();
-            ctx.arc(size/2, size/2, size/2 - 8, 0, 2 * Math.PI);
-            ctx.fill();
-            ctx.stroke();
-
-            // Draw inner circle
-            ctx.fillStyle = '#ffffff';
-            ctx.beginPath();
-            ctx.arc(size/2, size/2, size/2 - 20, 0, 2 * Math.PI);
-            ctx.fill();
-
-            // Draw count text
-            ctx.fillStyle = '#6264a7';
-            ctx.font = `bold ${Math.min(size/4, 24)}px Arial`;
-            ctx.textAlign = 'center';
-            ctx.textBaseline = 'middle';
-            ctx.fillText(count.toString(), size/2, size/2);
-
-            return canvas.toDataURL('image/png');
-          };
+        // Create cluster images first
+        const createClusterImage = async (count, size = 120) => {
+          const canvas = document.createElement('canvas');
+          const ctx = canvas.getContext('2d');
+          canvas.width = size;
+          canvas.height = size;
+
+          // Draw cluster circle with shadow
+          ctx.save();
+          ctx.translate(3, 3);
+          ctx.globalAlpha = 0.3;
+          ctx.fillStyle = '#000000';
+          ctx.beginPath();
+          ctx.arc(size/2, size/2, size/2 - 5, 0, 2 * Math.PI);
+          ctx.fill();
+          ctx.restore();
+
+          // Draw main cluster circle
+          ctx.fillStyle = '#6264a7';
+          ctx.strokeStyle = '#ffffff';
+          ctx.lineWidth = 4;
+          ctx.beginPath();
+          ctx.arc(size/2, size/2, size/2 - 8, 0, 2 * Math.PI);
+          ctx.fill();
+          ctx.stroke();
+
+          // Draw inner circle
+          ctx.fillStyle = '#ffffff';
+          ctx.beginPath();
+          ctx.arc(size/2, size/2, size/2 - 20, 0, 2 * Math.PI);
+          ctx.fill();
+
+          // Draw count text
+          ctx.fillStyle = '#6264a7';
+          ctx.font = `bold ${Math.min(size/4, 24)}px Arial`;
+          ctx.textAlign = 'center';
+          ctx.textBaseline = 'middle';
+          ctx.fillText(count.toString(), size/2, size/2);
+
+          return canvas.toDataURL('image/png');
+        };
 
+        const addClusterImages = async () => {
           // Create cluster images for different sizes
           for (let i = 2; i <= 20; i++) {
             const clusterImage = await createClusterImage(i);
@@ -786,204 +762,324 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
           // Create a generic large cluster image
           const largeClusterImage = await createClusterImage('20+', 140);
           await map.imageSprite.add('cluster-large', largeClusterImage);
+        };
 
-          // Create custom cluster image for our manual clustering
-          const customClusterImage = await createClusterImage('●', 100);
-          await map.imageSprite.add('cluster-custom', customClusterImage);
+        // Every pin photo comes from the sprite sheets, indexed the first time pins are in view
+        // and each sheet fetched the first time a pin on it is drawn
+        const spriteSize = 96;
+        let photoSpritePromise = null;
+        const loadPhotoSprite = () => {
+          if (!photoSpritePromise) {
+            photoSpritePromise = (async () => {
+              try {
+                const spriteResponse = await axios.get(`${backendUrl}/api/photo-sprite/${encodeURIComponent(team.email)}?size=${spriteSize}`);
+                if (!spriteResponse.data.success) {
+                  return null;
+                }
+                const spriteIndex = spriteResponse.data.data;
+                const sheetImages = {};
+                const loadSheet = (sheet) => {
+                  if (!sheetImages[sheet]) {
+                    sheetImages[sheet] = new Promise((resolve, reject) => {
+                      const sheetImage = new Image();
+                      sheetImage.crossOrigin = 'anonymous';
+                      sheetImage.onload = () => resolve(sheetImage);
+                      sheetImage.onerror = reject;
+                      sheetImage.src = `${backendUrl}${spriteIndex.sheets[sheet].image_url}`;
+                    });
+                  }
+                  return sheetImages[sheet];
+                };
+                return { loadSheet, positions: spriteIndex.positions, size: spriteIndex.size };
+              } catch (error) {
+                console.warn('Photo sprite unavailable, loading photos individually:', error);
+                return null;
+              }
+            })();
+          }
+          return photoSpritePromise;
+        };
 
-          for (let i = 0; i < features.length; i++) {
-            const feature = features[i];
-            const userId = feature.properties.userId;
-            const originalPhotoUrl = feature.properties.originalPhotoUrl; // Use original URL for loading
-            
+        // Create a custom teardrop pin with profile photo, as a data URL
+        const createPinImage = async (userId, borderColor, photoSprite) => {
+          // Sprite position is [sheet, x, y]; a sheet that fails to load falls back to the single photo
+          const spritePosition = photoSprite ? photoSprite.positions[userId] : null;
+          let spriteImage = null;
+          if (spritePosition) {
             try {
-              // Create a custom teardrop pin with profile photo
-              const canvas = document.createElement('canvas');
-              const ctx = canvas.getContext('2d');
-              const pinWidth = 120;
-              const pinHeight = 150;
-              canvas.width = pinWidth;
-              canvas.height = pinHeight;
-
-              // Get border color
-              const borderColor = feature.properties.borderColor || 'gray';
-              const borderHex = getBorderColor(borderColor);
-              
-              // Create teardrop/pin shape
-              const centerX = pinWidth / 2;
-              const centerY = pinWidth / 2; // Circle center
-              const radius = (pinWidth - 20) / 2; // Leave margin for border
-              const pointY = pinHeight - 10; // Bottom point of teardrop
-
-              // Draw pin shadow first (slightly offset)
-              ctx.save();
-              ctx.translate(3, 3);
-              ctx.globalAlpha = 0.3;
-              ctx.fillStyle = '#000000';
+              spriteImage = await photoSprite.loadSheet(spritePosition[0]);
+            } catch (error) {
+              console.warn('Photo sprite sheet unavailable, loading photo individually:', error);
+              photoSprite = null;
+            }
+          }
+          const canvas = document.createElement('canvas');
+          const ctx = canvas.getContext('2d');
+          const pinWidth = 120;
+          const pinHeight = 150;
+          canvas.width = pinWidth;
+          canvas.height = pinHeight;
+
+          const borderHex = getBorderColor(borderColor || 'gray');
+          
+          // Create teardrop/pin shape
+          const centerX = pinWidth / 2;
+          const centerY = pinWidth / 2; // Circle center
+          const radius = (pinWidth - 20) / 2; // Leave margin for border
+          const pointY = pinHeight - 10; // Bottom point of teardrop
+
+          // Draw pin shadow first (slightly offset)
+          ctx.save();
+          ctx.translate(3, 3);
+          ctx.globalAlpha = 0.3;
+          ctx.fillStyle = '#000000';
+          
+          // Shadow teardrop shape
+          ctx.beginPath();
+          ctx.arc(centerX, centerY, radius + 2, 0, 2 * Math.PI);
+          ctx.moveTo(centerX, centerY + radius + 2);
+          ctx.lineTo(centerX - 8, pointY);
+          ctx.lineTo(centerX + 8, pointY);
+          ctx.closePath();
+          ctx.fill();
+          ctx.restore();
+
+          // Draw main pin border
+          ctx.fillStyle = borderHex;
+          ctx.strokeStyle = '#ffffff';
+          ctx.lineWidth = 3;
+          
+          // Main teardrop shape
+          ctx.beginPath();
+          ctx.arc(centerX, centerY, radius, 0, 2 * Math.PI);
+          ctx.moveTo(centerX, centerY + radius);
+          ctx.lineTo(centerX - 6, pointY);
+          ctx.lineTo(centerX + 6, pointY);
+          ctx.closePath();
+          ctx.fill();
+          ctx.stroke();
+
+          // Draw inner white circle for photo
+          const photoRadius = radius - 8;
+          ctx.beginPath();
+          ctx.arc(centerX, centerY, photoRadius, 0, 2 * Math.PI);
+          ctx.fillStyle = '#ffffff';
+          ctx.fill();
+          ctx.stroke();
+
+          // Create clipping path for circular photo
+          ctx.save();
+          ctx.beginPath();
+          ctx.arc(centerX, centerY, photoRadius - 2, 0, 2 * Math.PI);
+          ctx.clip();
+
+          // Load and draw profile photo
+          const img = new Image();
+          img.crossOrigin = 'anonymous';
+          
+          await new Promise((resolve) => {
+            img.onload = () => {
+              // Calculate photo dimensions to fill circle
+              const photoSize = (photoRadius - 2) * 2;
+              const photoX = centerX - (photoRadius - 2);
+              const photoY = centerY - (photoRadius - 2);
               
-              // Shadow teardrop shape
-              ctx.beginPath();
-              ctx.arc(centerX, centerY, radius + 2, 0, 2 * Math.PI);
-              ctx.moveTo(centerX, centerY + radius + 2);
-              ctx.lineTo(centerX - 8, pointY);
-              ctx.lineTo(centerX + 8, pointY);
-              ctx.closePath();
-              ctx.fill();
+              // Draw the profile photo to fill the circle
+              ctx.drawImage(img, photoX, photoY, photoSize, photoSize);
               ctx.restore();
-
-              // Draw main pin border
-              ctx.fillStyle = borderHex;
-              ctx.strokeStyle = '#ffffff';
-              ctx.lineWidth = 3;
+              resolve();
+            };
+            
+            img.onerror = () => {
+              // Draw default avatar if photo fails to load
+              const photoSize = (photoRadius - 2) * 2;
+              const photoX = centerX - (photoRadius - 2);
+              const photoY = centerY - (photoRadius - 2);
+              
+              ctx.fillStyle = '#6264a7';
+              ctx.fillRect(photoX, photoY, photoSize, photoSize);
               
-              // Main teardrop shape
+              // Draw person icon in white
+              ctx.fillStyle = '#ffffff';
+              // Head
               ctx.beginPath();
-              ctx.arc(centerX, centerY, radius, 0, 2 * Math.PI);
-              ctx.moveTo(centerX, centerY + radius);
-              ctx.lineTo(centerX - 6, pointY);
-              ctx.lineTo(centerX + 6, pointY);
-              ctx.closePath();
+              ctx.arc(centerX, centerY - 15, 18, 0, 2 * Math.PI);
               ctx.fill();
-              ctx.stroke();
-
-              // Draw inner white circle for photo
-              const photoRadius = radius - 8;
+              
+              // Body
               ctx.beginPath();
-              ctx.arc(centerX, centerY, photoRadius, 0, 2 * Math.PI);
-              ctx.fillStyle = '#ffffff';
+              ctx.arc(centerX, centerY + 20, 25, Math.PI, 0, true);
               ctx.fill();
-              ctx.stroke();
+              
+              ctx.restore();
+              resolve();
+            };
+            
+            if (photoSprite) {
+              if (spriteImage) {
+                const photoSize = (photoRadius - 2) * 2;
+                ctx.drawImage(
+                  spriteImage,
+                  spritePosition[1], spritePosition[2], photoSprite.size, photoSprite.size,
+                  centerX - (photoRadius - 2), centerY - (photoRadius - 2), photoSize, photoSize
+                );
+                ctx.restore();
+                resolve();
+              } else {
+                // Users left out of the sprite have no photo
+                img.onerror();
+              }
+              return;
+            }
+            
+            // Set timeout for image loading
+            setTimeout(() => {
+              if (!img.complete) {
+                img.onerror();
+              }
+            }, 3000);
+            
+            img.src = `${backendUrl}/api/user-photo/${userId}?size=${spriteSize}`; // Thumbnail sized for the pin
+          });
 
-              // Create clipping path for circular photo
-              ctx.save();
-              ctx.beginPath();
-              ctx.arc(centerX, centerY, photoRadius - 2, 0, 2 * Math.PI);
-              ctx.clip();
+          return canvas.toDataURL('image/png');
+        };
 
-              // Load and draw profile photo
-              const img = new Image();
-              img.crossOrigin = 'anonymous';
-              
-              await new Promise((resolve) => {
-                img.onload = () => {
-                  // Calculate photo dimensions to fill circle
-                  const photoSize = (photoRadius - 2) * 2;
-                  const photoX = centerX - (photoRadius - 2);
-                  const photoY = centerY - (photoRadius - 2);
-                  
-                  // Draw the profile photo to fill the circle
-                  ctx.drawImage(img, photoX, photoY, photoSize, photoSize);
-                  ctx.restore();
-                  resolve();
-                };
-                
-                img.onerror = () => {
-                  // Draw default avatar if photo fails to load
-                  const photoSize = (photoRadius - 2) * 2;
-                  const photoX = centerX - (photoRadius - 2);
-                  const photoY = centerY - (photoRadius - 2);
-                  
-                  ctx.fillStyle = '#6264a7';
-                  ctx.fillRect(photoX, photoY, photoSize, photoSize);
-                  
-                  // Draw person icon in white
-                  ctx.fillStyle = '#ffffff';
-                  // Head
-                  ctx.beginPath();
-                  ctx.arc(centerX, centerY - 15, 18, 0, 2 * Math.PI);
-                  ctx.fill();
-                  
-                  // Body
-                  ctx.beginPath();
-                  ctx.arc(centerX, centerY + 20, 25, Math.PI, 0, true);
-                  ctx.fill();
-                  
-                  ctx.restore();
-                  resolve();
-                };
-                
-                // Set timeout for image loading
-                setTimeout(() => {
-                  if (!img.complete) {
-                    img.onerror();
-                  }
-                }, 3000);
-                
-                img.src = originalPhotoUrl; // Use original photo URL
-              });
+        // Pin images already added to the map's sprite (loaded), or being made (requested)
+        const loadedPinImages = new Set();
+        const requestedPinImages = new Set();
 
-              // Convert canvas to data URL and add to map
-              const dataUrl = canvas.toDataURL('image/png');
-              const imageId = `user-photo-${userId}`;
-              
-              // Add the custom image to the map's image sprite
-              await new Promise((resolve) => {
-                map.imageSprite.add(imageId, dataUrl).then(() => {
-                  // Update the feature to use the custom image
-                  feature.properties.photoUrl = imageId;
-                  resolve();
-                }).catch((error) => {
-                  console.warn(`Failed to add image ${imageId} to sprite:`, error);
-                  feature.properties.photoUrl = 'pin-round-blue';
-                  resolve();
-                });
-              });
-              
+        const addPinImages = async (points) => {
+          const photoSprite = await loadPhotoSprite();
+          for (const point of points) {
+            const imageId = `user-photo-${point.id}`;
+            try {
+              const dataUrl = await createPinImage(point.id, point.border_color, photoSprite);
+              await map.imageSprite.add(imageId, dataUrl);
+              loadedPinImages.add(point.id);
             } catch (error) {
-              console.warn(`Failed to create profile photo pin for user ${userId}:`, error);
-              // Fallback to default pin
-              feature.properties.photoUrl = 'pin-round-blue';
+              // The pin keeps the default image
+              console.warn(`Failed to create profile photo pin for user ${point.id}:`, error);
             }
           }
-          
-          // Update the data source with the modified features
-          dataSource.clear();
-          dataSource.add(features);
         };
 
-        // Add the layer first, then load photos
-        map.layers.add(symbolLayer);
-        console.log(`Added symbol layer ${layerId} to map`);
-        
-        // Create a backup layer for individual pins to ensure they're always visible
-        // This layer shows individual pins at high zoom levels only when they're not clustered
-        const individualPinLayer = new atlas.layer.SymbolLayer(dataSource, `${layerId}-individual`, {
-          minZoom: 18, // Show individual pins only at very high zoom levels
-          maxZoom: 24,
-          filter: [
-            'all',
-            ['!', ['has', 'point_count']], // Only show non-clustered points
-            // Additional filter to ensure we don't show duplicate pins for identical coordinates
-            ['!=', ['get', 'clustered'], true]
-          ],
-          iconOptions: {
-            image: ['get', 'photoUrl'],
-            anchor: 'bottom',
-            allowOverlap: true,
-            ignorePlacement: true,
-            size: 0.8,
-            offset: [0, 0]
-          },
-          textOptions: {
-            textField: ['get', 'userName'],
-            anchor: 'top',
-            offset: [0, 0],
-            size: 16,
-            color: '#000000',
-            haloColor: '#ffffff',
-            haloWidth: 3,
-            font: ['StandardFont-Bold']
+        // A /api/map-clusters feature as a map shape
+        const toShape = (feature) => {
+          const position = new atlas.data.Point([feature.longitude, feature.latitude]);
+          if (feature.type === 'cluster') {
+            return new atlas.data.Feature(position, {
+              type: 'cluster',
+              clusterId: feature.cluster_id,
+              count: feature.count,
+              expansionZoom: feature.expansion_zoom,
+              locationTypes: feature.location_types
+            });
           }
+          return new atlas.data.Feature(position, {
+            type: 'point',
+            clusterId: feature.cluster_id,
+            userId: feature.id,
+            userName: feature.displayName || 'Unknown User',
+            userTitle: feature.jobTitle || '',
+            locationType: feature.location_type || 'unknown',
+            borderColor: feature.border_color || 'gray',
+            photoUrl: loadedPinImages.has(feature.id) ? `user-photo-${feature.id}` : 'pin-round-blue',
+            originalPhotoUrl: `${backendUrl}/api/user-photo/${feature.id || 'default'}` // Keep original for popup
+          });
+        };
+
+        // Popup fields of a full map-data record
+        const recordProperties = ({ user, location, location_type, border_color }) => ({
+          userId: user.id,
+          userName: user.displayName || 'Unknown User',
+          userTitle: user.jobTitle || '',
+          userDepartment: user.department || '',
+          userEmail: user.mail || user.userPrincipalName || '',
+          locationAddress: (location && location.address) || 'Unknown Location',
+          locationType: location_type || 'unknown',
+          borderColor: border_color || 'gray',
+          originalPhotoUrl: `${backendUrl}/api/user-photo/${user.id || 'default'}`
         });
+
+        // The server falls back to the email if the team context has expired and returns the new id
+        const teamParams = () => ({
+          email: teamRef.current.email,
+          team_context_id: teamRef.current.teamContextId
+        });
+
+        const rememberTeamContext = (responseData) => {
+          if (responseData.team_context_id && responseData.team_context_id !== teamRef.current.teamContextId) {
+            teamRef.current = { ...teamRef.current, teamContextId: responseData.team_context_id };
+            setTeamContextId(responseData.team_context_id);
+          }
+        };
+
+        const fetchClusterLeaves = async (clusterId, limit) => {
+          const response = await axios.get(`${backendUrl}/api/map-clusters/leaves`, {
+            params: { ...teamParams(), cluster_id: clusterId, limit }
+          });
+          rememberTeamContext(response.data);
+          return response.data;
+        };
+
+        // Load the clusters and pins for the current viewport; the newest request wins
+        let viewportKey = null;
+        let viewportRequest = 0;
+        const loadViewportClusters = async () => {
+          if (!teamRef.current) return;
+          const camera = map.getCamera();
+          if (!camera.bounds) return;
+          const [west, south, east, north] = camera.bounds;
+          const padLongitude = (east - west) * VIEWPORT_PADDING;
+          const padLatitude = (north - south) * VIEWPORT_PADDING;
+          const bbox = [
+            west - padLongitude,
+            Math.max(south - padLatitude, -85),
+            east + padLongitude,
+            Math.min(north + padLatitude, 85)
+          ].map(value => value.toFixed(5)).join(',');
+          const zoom = Math.floor(camera.zoom);
+          const key = `${bbox}@${zoom}`;
+          if (key === viewportKey) return;
+          viewportKey = key;
+          const requestId = ++viewportRequest;
+
+          try {
+            const response = await axios.get(`${backendUrl}/api/map-clusters`, {
+              params: { ...teamParams(), bbox, zoom }
+            });
+            if (requestId !== viewportRequest) return;
+            rememberTeamContext(response.data);
+
+            const features = response.data.data;
+            dataSource.setShapes(features.map(toShape));
+            debugClusterVisibility();
+
+            // Make photo pins for people seen for the first time, then redraw with them
+            const newPoints = features.filter(feature => feature.type === 'point' && !requestedPinImages.has(feature.id));
+            if (newPoints.length > 0) {
+              newPoints.forEach(point => requestedPinImages.add(point.id));
+              await addPinImages(newPoints);
+              if (requestId === viewportRequest) {
+                dataSource.setShapes(features.map(toShape));
+              }
+            }
+          } catch (error) {
+            // Let the next move retry this viewport
+            viewportKey = null;
+            console.warn('Error loading map clusters for the viewport:', error);
+          }
+        };
+
+        // Add the layer first, then load the cluster images
+        map.layers.add(symbolLayer);
+        console.log(`Added symbol layer ${layerId} to map`);
         
-        map.layers.add(individualPinLayer);
-        console.log(`Added individual pin backup layer ${layerId}-individual to map`);
-        
-        // Load profile photos asynchronously
-        addProfilePhotos().then(() => {
-          console.log('Profile photos loaded for map pins');
+        addClusterImages().then(() => {
+          console.log('Cluster images loaded');
         }).catch((error) => {
-          console.warn('Error loading profile photos:', error);
+          console.warn('Error loading cluster images:', error);
         });
 
         // Add click event for user info popup and cluster tooltip
@@ -996,7 +1092,6 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               e.originalEvent.stopPropagation();
             }
             
-            // Get properties differently for clusters vs individual features
             let properties;
             if (shape.getProperties) {
               properties = shape.getProperties();
@@ -1007,7 +1102,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               return;
             }
             
-            if (properties.cluster || properties.point_count) {
+            if (properties.type === 'cluster') {
               // This is a cluster, show cluster tooltip on click
               console.log('Showing cluster tooltip on click');
               showClusterTooltip(shape, properties);
@@ -1018,7 +1113,14 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               // Get the pin's actual coordinates (not the click position)
               const pinPosition = shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]];
               console.log('Pin position:', pinPosition);
-              showUserPopup(properties, pinPosition);
+              // Pins carry only what the map draws; the popup shows the full record
+              fetchClusterLeaves(properties.clusterId, 10).then((leaves) => {
+                const record = leaves.data.find(leaf => leaf.user && leaf.user.id === properties.userId);
+                showUserPopup(record ? recordProperties(record) : properties, pinPosition);
+              }).catch((error) => {
+                console.warn('Error loading user details:', error);
+                showUserPopup(properties, pinPosition);
+              });
             }
           }
         });
@@ -1033,7 +1135,6 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               e.originalEvent.stopPropagation();
             }
             
-            // Get properties differently for clusters vs individual features
             let properties;
             if (shape.getProperties) {
               properties = shape.getProperties();
@@ -1043,30 +1144,15 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               return;
             }
             
-            if (properties.cluster || properties.point_count) {
-              // This is a cluster, zoom in on double-click
+            if (properties.type === 'cluster') {
+              // This is a cluster, zoom in to where it splits (sent with the cluster)
               console.log('Double-click detected on cluster, zooming in');
-              const clusterId = properties.cluster_id;
-              if (clusterId && dataSource.getClusterExpansionZoom) {
-                dataSource.getClusterExpansionZoom(clusterId).then((zoom) => {
-                  map.setCamera({
-                    center: shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]],
-                    zoom: zoom,
-                    type: 'ease',
-                    duration: 500
-                  });
-                }).catch((error) => {
-                  console.warn('Error getting cluster expansion zoom:', error);
-                  // Fallback: just zoom in a bit
-                  const currentZoom = map.getCamera().zoom;
-                  map.setCamera({
-                    center: shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]],
-                    zoom: Math.min(currentZoom + 3, 18),
-                    type: 'ease',
-                    duration: 500
-                  });
-                });
-              }
+              map.setCamera({
+                center: shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]],
+                zoom: Math.min(properties.expansionZoom, 22),
+                type: 'ease',
+                duration: 500
+              });
             }
           }
         });
@@ -1075,179 +1161,175 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         let currentClusterPopup = null;
 
         const showClusterTooltip = (shape, properties) => {
-          const clusterId = properties.cluster_id;
-          if (clusterId && dataSource.getClusterLeaves) {
-            dataSource.getClusterLeaves(clusterId, properties.point_count, 0).then((leaves) => {
-              const popup = popupRef.current;
-              
-              // Store cluster world coordinates for positioning calculations
-              const clusterPosition = shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]];
-              
-              // Static positioning: always center popup above the cluster
-              const pixelOffset = [0, -100]; // Fixed position: centered above cluster, 100px offset
-              
-              // Create detailed member list with profile images
-              const memberRows = leaves.map(leaf => {
-                const leafProps = leaf.getProperties ? leaf.getProperties() : leaf.properties;
-                const userName = leafProps.userName || 'Unknown User';
-                const userEmail = leafProps.userEmail || '';
-                const originalPhotoUrl = leafProps.originalPhotoUrl || `${getConfig().backendUrl}/api/user-photo/${leafProps.userId || 'default'}`;
-                
-                return `
-                  <div style="
-                    display: flex;
-                    align-items: center;
-                    padding: 12px;
-                    border-bottom: 1px solid #f3f2f1;
-                    gap: 15px;
-                    user-select: text;
-                  ">
-                    <img 
-                      src="${originalPhotoUrl}" 
-                      alt="${userName}"
-                      style="
-                        width: 60px;
-                        height: 60px;
-                        border-radius: 50%;
-                        object-fit: cover;
-                        border: 3px solid #e1dfdd;
-                        flex-shrink: 0;
-                        user-select: none;
-                      "
-                      onerror="this.src='data:image/svg+xml;base64,${getDefaultAvatarBase64()}'"
-                    />
-                    <div style="flex: 1; min-width: 0; text-align: left; user-select: text;">
-                      <div style="
-                        font-weight: 600;
-                        font-size: 14px;
-                        color: #323130;
-                        white-space: nowrap;
-                        overflow: hidden;
-                        text-overflow: ellipsis;
-                        text-align: left;
-                        margin-bottom: 4px;
-                        user-select: text;
-                      ">${userName}</div>
-                      <div style="
-                        font-size: 12px;
-                        color: #605e5c;
-                        white-space: nowrap;
-                        overflow: hidden;
-                        text-overflow: ellipsis;
-                        text-align: left;
-                        user-select: text;
-                      ">${userEmail}</div>
-                    </div>
-                  </div>
-                `;
-              }).join('');
-              
-              // Check if all cluster members have identical coordinates
-              const firstCoord = leaves[0].getCoordinates ? leaves[0].getCoordinates() : leaves[0].geometry.coordinates;
-              const hasIdenticalCoordinates = leaves.every(leaf => {
-                const coord = leaf.getCoordinates ? leaf.getCoordinates() : leaf.geometry.coordinates;
-                return coord[0] === firstCoord[0] && coord[1] === firstCoord[1];
-              });
+          fetchClusterLeaves(properties.clusterId, CLUSTER_TOOLTIP_LIMIT).then(({ data: leaves, total }) => {
+            const popup = popupRef.current;
+            if (!leaves || leaves.length === 0) return;
+            
+            // Store cluster world coordinates for positioning calculations
+            const clusterPosition = shape.getCoordinates ? shape.getCoordinates() : [shape.geometry.coordinates[0], shape.geometry.coordinates[1]];
+            
+            // Static positioning: always center popup above the cluster
+            const pixelOffset = [0, -100]; // Fixed position: centered above cluster, 100px offset
+            
+            // Create detailed member list with profile images
+            const memberRows = leaves.map(({ user }) => {
+              const userName = user.displayName || 'Unknown User';
+              const userEmail = user.mail || user.userPrincipalName || '';
+              const originalPhotoUrl = `${backendUrl}/api/user-photo/${user.id || 'default'}`;
               
-              const tooltipId = `cluster-tooltip-content-${Date.now()}`;
-              const clusterContent = `
-                <div id="${tooltipId}" class="cluster-tooltip-content" style="
-                  font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
-                  max-width: 300px;
-                  min-width: 250px;
+              return `
+                <div style="
+                  display: flex;
+                  align-items: center;
+                  padding: 12px;
+                  border-bottom: 1px solid #f3f2f1;
+                  gap: 15px;
                   user-select: text;
-                  cursor: default;
                 ">
-                  <div style="
-                    display: flex;
-                    justify-content: space-between;
-                    align-items: center;
-                    font-weight: bold; 
-                    padding: 12px;
-                    color: #323130;
-                    background-color: #f8f7ff;
-                    border-bottom: 2px solid #6264a7;
-                    user-select: text;
-                  ">
-                    <span>${properties.point_count} Team Members${hasIdenticalCoordinates ? ' (Same Location)' : ''}</span>
-                    <button class="cluster-tooltip-close-btn" data-close-cluster-tooltip="true" style="
-                      background: #f3f2f1;
-                      border: 1px solid #8a8886;
+                  <img 
+                    src="${originalPhotoUrl}" 
+                    alt="${userName}"
+                    style="
+                      width: 60px;
+                      height: 60px;
                       border-radius: 50%;
-                      width: 24px;
-                      height: 24px;
-                      display: flex;
-                      align-items: center;
-                      justify-content: center;
-                      cursor: pointer;
+                      object-fit: cover;
+                      border: 3px solid #e1dfdd;
+                      flex-shrink: 0;
+                      user-select: none;
+                    "
+                    onerror="this.src='data:image/svg+xml;base64,${getDefaultAvatarBase64()}'"
+                  />
+                  <div style="flex: 1; min-width: 0; text-align: left; user-select: text;">
+                    <div style="
+                      font-weight: 600;
                       font-size: 14px;
-                      font-weight: bold;
                       color: #323130;
-                      padding: 0;
-                      margin: 0;
-                      pointer-events: auto;
-                      user-select: none;
-                    " onmouseover="this.style.background='#e1dfdd'" onmouseout="this.style.background='#f3f2f1'">×</button>
-                  </div>
-                  <div style="
-                    max-height: 240px;
-                    overflow-y: auto;
-                    overflow-x: hidden;
-                    user-select: text;
-                  ">
-                    ${memberRows}
-                  </div>
-                  <div style="
-                    font-size: 11px; 
-                    color: #8a8886; 
-                    padding: 8px;
-                    text-align: center;
-                    font-style: italic;
-                    background-color: #faf9f8;
-                    border-top: 1px solid #f3f2f1;
-                    user-select: none;
-                  ">
-                    ${hasIdenticalCoordinates ? 'Users at identical location - cluster persists at all zoom levels' : 'Click to zoom in and expand'}
+                      white-space: nowrap;
+                      overflow: hidden;
+                      text-overflow: ellipsis;
+                      text-align: left;
+                      margin-bottom: 4px;
+                      user-select: text;
+                    ">${userName}</div>
+                    <div style="
+                      font-size: 12px;
+                      color: #605e5c;
+                      white-space: nowrap;
+                      overflow: hidden;
+                      text-overflow: ellipsis;
+                      text-align: left;
+                      user-select: text;
+                    ">${userEmail}</div>
                   </div>
                 </div>
               `;
-              
-              popup.setOptions({
-                content: clusterContent,
-                position: clusterPosition,
-                closeButton: false,
-                fillColor: 'white',
-                pixelOffset: pixelOffset,
-                anchor: 'bottom', // Force popup to appear above the pin
-                positioning: 'fixed' // Disable automatic repositioning
-              });
-              
-              popup.open(map);
-              currentClusterPopup = popup;
-
-              // Set initial popup state and add close button functionality
-              setTimeout(() => {
-                console.log('Cluster tooltip opened');
-                
-                // Add close button functionality
-                const closeButton = document.querySelector('[data-close-cluster-tooltip="true"]');
-                if (closeButton) {
-                  closeButton.addEventListener('click', (e) => {
-                    e.preventDefault();
-                    e.stopPropagation();
-                    console.log('Cluster tooltip close button clicked');
-                    if (currentClusterPopup) {
-                      currentClusterPopup.close();
-                      currentClusterPopup = null;
-                    }
-                  });
-                }
-              }, 10);
-              
-            }).catch((error) => {
-              console.warn('Error getting cluster leaves:', error);
+            }).join('');
+            
+            // Check if all cluster members have identical coordinates (only knowable when all are listed)
+            const firstLocation = leaves[0].location || {};
+            const hasIdenticalCoordinates = leaves.length === total && leaves.every(({ location }) =>
+              location && location.latitude === firstLocation.latitude && location.longitude === firstLocation.longitude);
+            const moreMembers = total - leaves.length;
+            
+            const tooltipId = `cluster-tooltip-content-${Date.now()}`;
+            const clusterContent = `
+              <div id="${tooltipId}" class="cluster-tooltip-content" style="
+                font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
+                max-width: 300px;
+                min-width: 250px;
+                user-select: text;
+                cursor: default;
+              ">
+                <div style="
+                  display: flex;
+                  justify-content: space-between;
+                  align-items: center;
+                  font-weight: bold; 
+                  padding: 12px;
+                  color: #323130;
+                  background-color: #f8f7ff;
+                  border-bottom: 2px solid #6264a7;
+                  user-select: text;
+                ">
+                  <span>${total} Team Members${hasIdenticalCoordinates ? ' (Same Location)' : ''}</span>
+                  <button class="cluster-tooltip-close-btn" data-close-cluster-tooltip="true" style="
+                    background: #f3f2f1;
+                    border: 1px solid #8a8886;
+                    border-radius: 50%;
+                    width: 24px;
+                    height: 24px;
+                    display: flex;
+                    align-items: center;
+                    justify-content: center;
+                    cursor: pointer;
+                    font-size: 14px;
+                    font-weight: bold;
+                    color: #323130;
+                    padding: 0;
+                    margin: 0;
+                    pointer-events: auto;
+                    user-select: none;
+                  " onmouseover="this.style.background='#e1dfdd'" onmouseout="this.style.background='#f3f2f1'">×</button>
+                </div>
+                <div style="
+                  max-height: 240px;
+                  overflow-y: auto;
+                  overflow-x: hidden;
+                  user-select: text;
+                ">
+                  ${memberRows}
+                </div>
+                <div style="
+                  font-size: 11px; 
+                  color: #8a8886; 
+                  padding: 8px;
+                  text-align: center;
+                  font-style: italic;
+                  background-color: #faf9f8;
+                  border-top: 1px solid #f3f2f1;
+                  user-select: none;
+                ">
+                  ${moreMembers > 0 ? `and ${moreMembers} more - ` : ''}${hasIdenticalCoordinates ? 'Users at identical location - cluster persists at all zoom levels' : 'Click to zoom in and expand'}
+                </div>
+              </div>
+            `;
+            
+            popup.setOptions({
+              content: clusterContent,
+              position: clusterPosition,
+              closeButton: false,
+              fillColor: 'white',
+              pixelOffset: pixelOffset,
+              anchor: 'bottom', // Force popup to appear above the pin
+              positioning: 'fixed' // Disable automatic repositioning
             });
-          }
+            
+            popup.open(map);
+            currentClusterPopup = popup;
+
+            // Set initial popup state and add close button functionality
+            setTimeout(() => {
+              console.log('Cluster tooltip opened');
+              
+              // Add close button functionality
+              const closeButton = document.querySelector('[data-close-cluster-tooltip="true"]');
+              if (closeButton) {
+                closeButton.addEventListener('click', (e) => {
+                  e.preventDefault();
+                  e.stopPropagation();
+                  console.log('Cluster tooltip close button clicked');
+                  if (currentClusterPopup) {
+                    currentClusterPopup.close();
+                    currentClusterPopup = null;
+                  }
+                });
+              }
+            }, 10);
+            
+          }).catch((error) => {
+            console.warn('Error getting cluster leaves:', error);
+          });
         };
 
         // User popup function - moved inside scope to access map variable
@@ -1354,8 +1436,8 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         const debugClusterVisibility = () => {
           const currentZoom = map.getCamera().zoom;
           const features = dataSource.getShapes();
-          const clusterCount = features.filter(f => f.getProperties().cluster).length;
-          const individualCount = features.filter(f => !f.getProperties().cluster).length;
+          const clusterCount = features.filter(f => f.getProperties().type === 'cluster').length;
+          const individualCount = features.length - clusterCount;
           
           console.log(`Zoom ${currentZoom.toFixed(1)}: ${clusterCount} clusters, ${individualCount} individual pins, ${features.length} total features`);
         };
@@ -1369,28 +1451,15 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
           }
           
           // Update zoom level in state for debug display
-          const newZoom = map.getCamera().zoom;
-          setCurrentZoom(newZoom);
-          
-          // Force data source refresh to ensure consistent clustering at decimal zoom levels
-          // This prevents the issue where pins disappear at decimal zooms like 4.8
-          const currentFeatures = dataSource.toJson();
-          if (currentFeatures && currentFeatures.features && currentFeatures.features.length > 0) {
-            // Small delay to allow zoom to settle, then refresh
-            setTimeout(() => {
-              dataSource.clear();
-              dataSource.add(currentFeatures.features);
-              console.log(`Refreshed clustering for zoom ${newZoom.toFixed(1)} with ${currentFeatures.features.length} features`);
-            }, 50);
-          }
-          
-          // Debug cluster visibility
-          debugClusterVisibility();
+          setCurrentZoom(map.getCamera().zoom);
         };
 
         map.events.add('zoom', handleMapChange);
         // Note: Removed 'move' event handler to prevent closing popup during drag operations
 
+        // Ask the server for what the new viewport shows once the map stops moving
+        map.events.add('moveend', loadViewportClusters);
+        map.events.add('zoomend', loadViewportClusters);
         map.events.add('mousemove', symbolLayer, (e) => {
           map.getCanvasContainer().style.cursor = 'pointer';
           
@@ -1576,7 +1645,10 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         // Cleanup function to remove event listeners
         const cleanupClusterEvents = () => {
           map.events.remove('zoom', handleMapChange);
-          // Note: No move event to remove since we don't use it anymore
+          map.events.remove('moveend', loadViewportClusters);
+          map.events.remove('zoomend', loadViewportClusters);
+          // Drop viewport responses still in flight
+          viewportRequest++;
           map.events.remove('click'); // Remove general map click handler
           map.events.remove('mousedown'); // Remove mousedown handler
           map.events.remove('mousemove'); // Remove mousemove handler
@@ -1591,6 +1663,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
 
         // Store cleanup function for later use
         map._clusterEventCleanup = cleanupClusterEvents;
+        loadViewport = loadViewportClusters;
 
       } catch (sourceError) {
         console.error('Error creating data source or layer:', sourceError);
@@ -1625,12 +1698,13 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
       if (coordinates.length > 0) {
         try {
           if (coordinates.length === 1) {
-            // Single user - center on their location with appropriate zoom
+            // Single user or one cluster - center on it, zoomed in to where a cluster splits
             const [lng, lat] = coordinates[0];
-            console.log(`Centering map on single user at [${lng}, ${lat}]`);
+            const [feature] = team.overview;
+            console.log(`Centering map on single location at [${lng}, ${lat}]`);
             map.setCamera({
               center: [lng, lat],
-              zoom: 10, // City-level zoom for single user
+              zoom: feature.type === 'cluster' ? Math.min(feature.expansion_zoom, 15) : 10, // City-level zoom for single user
               duration: 1000
             });
           } else {
@@ -1672,10 +1746,12 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         });
       }
 
-      console.log('Successfully displayed users on map');
+      // Load the fitted viewport now in case the camera did not move
+      loadViewport();
+      console.log('Successfully displayed team on map');
 
     } catch (error) {
-      console.error('Error in displayUsersOnMap:', error);
+      console.error('Error in displayTeamOnMap:', error);
       throw new Error(`Map display failed: ${error.message}`);
     }
   };
@@ -1749,22 +1825,28 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
     }
   };
 
-  const getLocationStats = () => {
-    const stats = {
-      address: 0,
-      phone: 0,
-      timezone: 0
-    };
+  const stats = teamSummary ? teamSummary.locationTypes : {};
+  const teamSize = teamSummary ? teamSummary.total : 0;
 
-    mapData.forEach((userLocationData) => {
-      stats[userLocationData.location_type] = (stats[userLocationData.location_type] || 0) + 1;
-    });
-
-    return stats;
+  // Registers the team on the server again after its team context expired; returns the new id
+  const refreshTeamContext = async () => {
+    if (!teamSummary) return null;
+    try {
+      const response = await axios.get(`${getConfig().backendUrl}/api/map-clusters`, {
+        params: { email: teamSummary.email, bbox: WORLD_BBOX, zoom: 0 }
+      });
+      const refreshedContextId = response.data.team_context_id;
+      if (teamRef.current) {
+        teamRef.current = { ...teamRef.current, teamContextId: refreshedContextId };
+      }
+      setTeamContextId(refreshedContextId);
+      return refreshedContextId;
+    } catch (refreshError) {
+      console.warn('Error refreshing the team context:', refreshError);
+      return null;
+    }
   };
 
-  const stats = getLocationStats();
-
   // Initialize map when component mounts
   useEffect(() => {
     // Add a small delay to ensure the DOM is fully rendered
@@ -1890,7 +1972,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               <strong>Debug Info:</strong> Map Instance: {mapInstanceRef.current ? '✓' : '✗'} | 
               Map Ready: {mapReady ? '✓' : '✗'} | 
               Zoom Level: {currentZoom.toFixed(1)} |
-              Pending Data: {pendingMapData ? pendingMapData.length : 0} users |
+              Pending Team: {pendingTeam ? pendingTeam.total : 0} users |
               API Key: {getConfig().azureMapsApiKey ? 'Configured' : 'Missing'}
             </div>
           )}
@@ -1901,7 +1983,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
             </div>
           )}
 
-          {!mapData.length && !loading && !error && (
+          {!teamSize && !loading && !error && (
             <div className="info-message">
               Enter a user's email address above to view their team's locations on the map.
               Team members will be displayed with colored borders based on location accuracy.
@@ -1916,7 +1998,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
           )}
 
           <div className="map-container" style={{ flex: 1, display: 'flex', flexDirection: 'column', position: 'relative' }}>
-            {mapData.length > 0 && (
+            {teamSize > 0 && (
               <div className="map-controls">
                 <div className="legend">
                   <h4 style={{ margin: 0, color: '#323130' }}>Location Accuracy:</h4>
@@ -1934,7 +2016,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
                   </div>
                 </div>
                 <div style={{ fontSize: '12px', color: '#605e5c' }}>
-                  Total team members: {mapData.length}
+                  Total team members: {teamSize}
                 </div>
               </div>
             )}
@@ -1946,14 +2028,14 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
                 flex: 1,
                 width: '100%',
                 backgroundColor: '#f3f2f1',
-                minHeight: mapData.length > 0 ? '600px' : '500px',
+                minHeight: teamSize > 0 ? '600px' : '500px',
                 position: 'relative',
                 zIndex: 1
               }}
             ></div>
             
             {/* Fallback: Show users in list format if map fails */}
-            {mapData.length > 0 && error && error.includes('Map') && (
+            {teamList.length > 0 && error && error.includes('Map') && (
               <div style={{ 
                 position: 'absolute', 
                 top: '80px', 
@@ -1968,7 +2050,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
               }}>
                 <h3>Team Members (Map View Unavailable)</h3>
                 <div style={{ display: 'grid', gridTemplateColumns: 'repeat(auto-fill, minmax(250px, 1fr))', gap: '15px' }}>
-                  {mapData.map((userLocationData, index) => {
+                  {teamList.map((userLocationData, index) => {
                     const { user, location, border_color, location_type } = userLocationData;
                     return (
                       <div 
@@ -1981,7 +2063,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
                         }}
                       >
                         <img
-                          src={`${getConfig().backendUrl}/api/user-photo/${user.id}`}
+                          src={`${getConfig().backendUrl}/api/user-photo/${user.id}?size=96`}
                           alt={user.displayName}
                           style={{
                             width: '40px',
@@ -2013,7 +2095,7 @@ const MapViewTab = ({ teamsContext, getAuthToken }) => {
         </div>
         
         {/* Chat Interface */}
-        <ChatInterface mapData={mapData} />
+        <ChatInterface teamSize={teamSize} teamContextId={teamContextId} refreshTeamContext={refreshTeamContext} />
       </div>
     </div>
   );
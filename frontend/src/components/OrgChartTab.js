@@ -3,6 +3,8 @@ import axios from 'axios';
 import TreeNode from './TreeNode';
 import { getConfig } from '../config';
 
+const ORG_CHART_INITIAL_DEPTH = 2;
+
 const OrgChartTab = ({ teamsContext, getAuthToken }) => {
   const [userEmail, setUserEmail] = useState('');
   const [orgData, setOrgData] = useState(null);
@@ -28,7 +30,10 @@ const OrgChartTab = ({ teamsContext, getAuthToken }) => {
     try {
       const config = getConfig();
       const backendUrl = config.backendUrl;
-      const response = await axios.get(`${backendUrl}/api/org-hierarchy/${encodeURIComponent(email)}`);
+      const response = await axios.get(`${backendUrl}/api/org-hierarchy/${encodeURIComponent(email)}`, {
+        // Two levels paint right away; deeper nodes load their reports when expanded
+        params: { depth: ORG_CHART_INITIAL_DEPTH }
+      });
       
       if (response.data.success) {
         setOrgData(response.data.data);
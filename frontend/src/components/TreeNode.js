@@ -2,19 +2,57 @@ import React, { useState } from 'react';
 import { getConfig } from '../config';
 
 const TreeNode = ({ node, level = 0 }) => {
-  const [isExpanded, setIsExpanded] = useState(true);
+  // Nodes at the edge of a depth-limited tree (children_loaded === false) start collapsed
+  const [isExpanded, setIsExpanded] = useState(node?.children_loaded !== false);
+  const [loadedChildren, setLoadedChildren] = useState(null);
+  const [loadingChildren, setLoadingChildren] = useState(false);
+  const [loadError, setLoadError] = useState(null);
   
   if (!node || !node.user) {
     return null;
   }
 
-  const { user, children = [] } = node;
-  const hasChildren = children && children.length > 0;
+  const { user } = node;
+  const children = loadedChildren || node.children || [];
+  const needsFetch = node.children_loaded === false && !loadedChildren;
+  const reportCount = needsFetch ? node.direct_report_count : children.length;
+  const hasChildren = children.length > 0 || needsFetch;
 
-  const toggleExpanded = () => {
+  const fetchChildren = async () => {
+    setLoadingChildren(true);
+    setLoadError(null);
+    try {
+      const response = await fetch(`${getConfig().backendUrl}/api/org-subtree/${encodeURIComponent(user.id)}?depth=1`);
+      const body = await response.json();
+      if (!response.ok || !body.success) {
+        throw new Error(body.error || response.statusText);
+      }
+      setLoadedChildren(body.data.children || []);
+      return true;
+    } catch (err) {
+      console.error('Error fetching reports:', err);
+      setLoadError('Could not load reports');
+      return false;
+    } finally {
+      setLoadingChildren(false);
+    }
+  };
+
+  const toggleExpanded = async () => {
+    if (!isExpanded && needsFetch && !(await fetchChildren())) {
+      return;
+    }
     setIsExpanded(!isExpanded);
   };
 
+  const reportLabel = () => {
+    if (loadingChildren) {
+      return 'Loading...';
+    }
+    const noun = reportCount == null ? 'Reports' : `${reportCount} Report${reportCount !== 1 ? 's' : ''}`;
+    return `${isExpanded ? 'Hide' : 'Show'} ${noun}`;
+  };
+
   const getDefaultPhotoUrl = () => {
     // Return a default avatar SVG
     return `data:image/svg+xml;base64,${btoa(`
@@ -50,7 +88,7 @@ const TreeNode = ({ node, level = 0 }) => {
       <div className="user-node">
         <img
           className="user-photo"
-          src={`${getConfig().backendUrl}/api/user-photo/${user.id}`}
+          src={`${getConfig().backendUrl}/api/user-photo/${user.id}?size=96`}
           alt={user.displayName}
           onError={(e) => {
             e.target.src = getDefaultPhotoUrl();
@@ -73,9 +111,16 @@ const TreeNode = ({ node, level = 0 }) => {
           </div>
         )}
 
+        {node.descendant_count > 0 && (
+          <div className="user-org-size" style={{ fontSize: '11px', color: '#8a8886', marginTop: '4px' }}>
+            {node.descendant_count} in org
+          </div>
+        )}
+
         {hasChildren && (
           <button
             onClick={toggleExpanded}
+            disabled={loadingChildren}
             style={{
               marginTop: '8px',
               padding: '4px 8px',
@@ -87,12 +132,16 @@ const TreeNode = ({ node, level = 0 }) => {
               cursor: 'pointer'
             }}
           >
-            {isExpanded ? `Hide ${children.length} Report${children.length !== 1 ? 's' : ''}` : `Show ${children.length} Report${children.length !== 1 ? 's' : ''}`}
+            {reportLabel()}
           </button>
         )}
+
+        {loadError && (
+          <div style={{ fontSize: '11px', color: '#a4262c', marginTop: '4px' }}>{loadError}</div>
+        )}
       </div>
 
-      {hasChildren && isExpanded && (
+      {children.length > 0 && isExpanded && (
         <div className="children-container">
           {children.map((child, index) => (
             <TreeNode